@@ -89,4 +89,10 @@ def integrate(results: List[AgentResult], ctx: Dict) -> FusedOutput:
     if not np.isfinite(disagreement):
         disagreement = 0.0
     disagreement = float(max(0.0, min(1.0, disagreement)))
-    return FusedOutput(differential=diffs, next_best_test=nbt, disagreement_score=disagreement, test_plans=test_plans)
+    # How clearly the leading diagnosis beats the runner-up (1.0 when unopposed)
+    if len(diffs) >= 2:
+        margin = diffs[0].score_global - diffs[1].score_global
+    else:
+        margin = 1.0 if diffs else 0.0
+    return FusedOutput(differential=diffs, next_best_test=nbt, disagreement_score=disagreement,
+                       top_margin=float(round(margin, 3)), test_plans=test_plans)
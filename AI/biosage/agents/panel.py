@@ -0,0 +1,117 @@
+from typing import Callable, Dict, List, Optional
+import os
+import json
+from dotenv import load_dotenv
+from ..core.schemas import AgentResult, Candidate
+from ..core.llm import areason, LLMUnavailableError
+from ..core.prompts import PANEL_SYSTEM_PROMPT, build_panel_user_prompt
+from ..core.casebase import format_case_snippets
+from ..core.retrieval import AGENTS, RetrievalBundle, abuild_retrieval_bundle
+from ..core.metrics import span, ERRORS
+from .streaming import parse_candidates
+
+load_dotenv()
+OPENAI_REAS_MODEL = os.getenv("OPENAI_REAS_MODEL", "gpt-4o")
+# Literature passages shared by the whole panel (each specialist alone sees 8)
+PANEL_MAX_DOCS = int(os.getenv("PANEL_MAX_DOCS", "12"))
+
+
+def _build_context(ctx: Dict) -> Dict:
+    norm = ctx.get("norm", {})
+    return {
+        "demographics": norm.get("intake", {}).get("demographics", {}),
+        "vitals": norm.get("intake", {}).get("vitals", {}),
+        "symptoms_normalized": norm.get("symptoms_normalized", []),
+        "duration_days": norm.get("intake", {}).get("duration_days"),
+        "initial_labs": norm.get("intake", {}).get("initial_labs", {}),
+        "exposures": norm.get("intake", {}).get("exposures", []),
+        "travel": norm.get("intake", {}).get("travel", []),
+    }
+
+
+def _panel_passages(retrieval: RetrievalBundle, agents: List[str]) -> List[Dict]:
+    # Interleave each domain's view so every specialty keeps its best passages, listed once
+    views = [retrieval.passages_for(a, k=8) for a in agents]
+    seen = set()
+    out: List[Dict] = []
+    for rank in range(max((len(v) for v in views), default=0)):
+        for view in views:
+            if rank < len(view):
+                p = view[rank]
+                key = (p.get("doc_id"), p.get("text", "")[:80])
+                if key not in seen:
+                    seen.add(key)
+                    out.append(p)
+    return out[:PANEL_MAX_DOCS]
+
+
+def _format_doc_snippets(passages: List[Dict]) -> str:
+    return "\n".join(f"- {p.get('doc_id')}: {p.get('text','')[:350]}" for p in passages)
+
+
+async def run_panel(ctx: Dict, retrieval: Optional[RetrievalBundle] = None, agents: Optional[List[str]] = None,
+                    model: Optional[str] = None,
+                    on_candidate: Optional[Callable[[str, Candidate], None]] = None) -> List[AgentResult]:
+    """Ask every specialist in `agents` in one LLM call; returns one AgentResult per agent, in order.
+
+    The case context, literature, previous cases and KG facts go into the prompt
+    once, followed by a scoped section per specialty. A domain whose section is
+    missing or malformed degrades to an empty candidate list, like a failed agent.
+    """
+    agents = list(agents or AGENTS)
+    c = _build_context(ctx)
+    symptoms = c.get("symptoms_normalized", [])
+    with span("agent.retrieval", agent="panel"):
+        if retrieval is None:
+            retrieval = await abuild_retrieval_bundle(symptoms, agents=agents)
+        passages = _panel_passages(retrieval, agents)
+        prev_cases = retrieval.prev_cases
+        kg_snips = "\n".join(retrieval.kg_lines[:20])
+
+    user_prompt = build_panel_user_prompt(
+        agents=agents,
+        context=c,
+        doc_snips=_format_doc_snippets(passages),
+        kg_snips=kg_snips,
+        case_snips=format_case_snippets(prev_cases),
+        k_docs=len(passages),
+        k_cases=min(5, len(prev_cases)),
+    )
+
+    try:
+        with span("agent.llm", agent="panel"):
+            content = await areason(
+                messages=[
+                    {"role": "system", "content": PANEL_SYSTEM_PROMPT},
+                    {"role": "user", "content": user_prompt},
+                ],
+                model=model or OPENAI_REAS_MODEL,
+                temperature=0.2,
+                response_format={"type": "json_object"},
+            )
+        data = json.loads(content)
+    except LLMUnavailableError:
+        raise  # reported by the orchestrator as missing domains
+    except Exception:
+        ERRORS.inc(stage="agent.parse", agent="panel")
+        data = {}
+
+    results = []
+    for agent in agents:
+        try:
+            section = data.get(agent) or {}
+            cand_list = parse_candidates(section.get("candidates", []))
+            if not cand_list:
+                raise ValueError("Empty candidates")
+        except Exception:
+            ERRORS.inc(stage="agent.parse", agent=agent)
+            cand_list = []
+        results.append(AgentResult(agent=agent, candidates=cand_list))
+        if on_candidate is not None:
+            # The panel answer is one JSON document, so candidates are handed on once it is parsed
+            for cand in cand_list:
+                try:
+                    on_candidate(agent, cand)
+                except Exception as e:
+                    print(f"Candidate callback failed: {e}")
+    return results
@@ -0,0 +1,83 @@
+from typing import Any, Callable, Dict, List, Optional
+import os
+import json
+from contextlib import aclosing
+from dotenv import load_dotenv
+from ..core.schemas import Candidate, Citation
+from ..core.llm import areason, astream_reason
+from ..core.jsonstream import CandidateStream
+from ..core.metrics import LLM_CALLS
+
+load_dotenv()
+# Stream specialist answers and parse candidates as each JSON object closes
+AGENT_STREAMING = os.getenv("AGENT_STREAMING", "off").lower() in ("1", "on", "true", "yes")
+# Candidates read per specialist; a streamed answer is cut off once this many have closed
+AGENT_MAX_CANDIDATES = int(os.getenv("AGENT_MAX_CANDIDATES", "6"))
+
+
+def candidate_from_item(item: Dict, idx: int) -> Candidate:
+    """A model candidate item as a Candidate, with the specialists' local scoring and defaults."""
+    citations = [Citation(doc_id=str(c.get("doc_id","")), span=str(c.get("span",""))) for c in item.get("citations", [])]
+    conf_str = str(item.get("confidence_qual", "low")).lower()
+    conf_map = {"low": 0.55, "medium": 0.7, "high": 0.85}
+    conf_w = conf_map.get(conf_str, 0.55)
+    rank_w = max(0.4, 1.0 - 0.1 * float(idx))  # 1.0, 0.9, ..., min 0.4
+    score_local = max(0.0, min(1.0, round(0.5 * conf_w + 0.5 * rank_w, 3)))
+    return Candidate(
+        diagnosis=str(item.get("diagnosis","")),
+        rationale=str(item.get("rationale","")),
+        citations=citations or [Citation(doc_id='default', span='default')],
+        graph_paths=item.get("graph_paths", []) or [['default', 'path']],
+        confidence_qual=str(item.get("confidence_qual", "low")),
+        score_local=score_local,
+    )
+
+
+def parse_candidates(items: List[Dict]) -> List[Candidate]:
+    return [candidate_from_item(item, idx) for idx, item in enumerate(items[:AGENT_MAX_CANDIDATES])]
+
+
+def _emit(on_candidate: Optional[Callable[[Candidate], None]], item: Any, idx: int) -> None:
+    if on_candidate is None:
+        return
+    try:
+        on_candidate(candidate_from_item(item, idx))
+    except Exception as e:
+        print(f"Candidate callback failed: {e}")
+
+
+async def request_candidates(messages: List[Dict[str, str]], model: str,
+                             on_candidate: Optional[Callable[[Candidate], None]] = None,
+                             max_candidates: int = AGENT_MAX_CANDIDATES, **kwargs) -> Dict:
+    """Ask a specialist prompt for its JSON answer ({"candidates": [...]}).
+
+    With AGENT_STREAMING on, the completion is consumed as it streams in: each
+    candidate is handed to on_candidate as soon as its object closes, and the
+    stream is closed once max_candidates have been read, so no more output is
+    generated. Otherwise the whole answer is awaited and on_candidate sees the
+    candidates afterwards. Parse errors and LLMUnavailableError propagate.
+    """
+    if not AGENT_STREAMING:
+        data = json.loads(await areason(messages=messages, model=model, **kwargs))
+        for idx, item in enumerate(data.get("candidates", [])[:max_candidates]):
+            _emit(on_candidate, item, idx)
+        return data
+
+    parser = CandidateStream()
+    items: List[Dict] = []
+    async with aclosing(astream_reason(messages, model=model, **kwargs)) as stream:
+        async for piece in stream:
+            for owner, item in parser.feed(piece):
+                if owner is not None:
+                    continue  # nested "candidates" key, not the answer's own list
+                _emit(on_candidate, item, len(items))
+                items.append(item)
+                if len(items) >= max_candidates:
+                    break
+            if len(items) >= max_candidates:
+                LLM_CALLS.inc(kind='chat', outcome='early_stop')
+                break
+    if items:
+        return {"candidates": items}
+    # Nothing closed inside a "candidates" array: decode whatever arrived
+    return json.loads(parser.text)
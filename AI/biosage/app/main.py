@@ -1,12 +1,28 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse, StreamingResponse
 import os
+import time
+import asyncio
 from pydantic import BaseModel
 from ..core.schemas import PatientData
-from ..core.orchestrator import diagnose_patient
+from ..core.orchestrator import diagnose_patient, diagnose_batch, diagnose_stream, prepare_intake, run_pipeline, BATCH_CONCURRENCY
+from ..core.jobs import JOBS, JOB_WORKERS, JobWorkerPool
 from ..core.evidence import EVIDENCE
+from ..core.casebase import CASE_INDEX
+from ..core.llm import aclose_clients
+from ..core.admission import llm_priority
+from ..core.metrics import (
+    HTTP_SECONDS,
+    SERVER_TIMING_ENABLED,
+    start_request_timings,
+    end_request_timings,
+    server_timing_header,
+    render_prometheus,
+)
 import math
-from typing import Any
+import json
+from typing import Any, Dict, List, Optional, Tuple
 
 app = FastAPI(title="BioSage API")
 
@@ -22,6 +38,48 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def _timing_middleware(request: Request, call_next):
+    # Collect pipeline spans for this request and record route latency
+    token = start_request_timings()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        elapsed = time.perf_counter() - start
+        timings = end_request_timings(token)
+        route = request.scope.get("route")
+        HTTP_SECONDS.observe(elapsed, method=request.method,
+                             route=getattr(route, "path", "unmatched"), status=str(status))
+    if SERVER_TIMING_ENABLED:
+        response.headers["Server-Timing"] = server_timing_header(timings + [("total", elapsed)])
+    return response
+
+
+@app.get('/metrics')
+async def metrics_endpoint():
+    return PlainTextResponse(render_prometheus(), media_type="text/plain; version=0.0.4")
+
+
+@app.on_event("startup")
+async def _startup():
+    # Index previously stored cases for casebase search without holding up the first request
+    CASE_INDEX.start_sync()
+    if JOB_WORKERS > 0:
+        JOB_POOL.start()
+
+
+@app.on_event("shutdown")
+async def _shutdown():
+    # Stop job workers (unfinished jobs are re-claimed after their lease lapses),
+    # release pooled LLM connections and flush queued evidence writes
+    await JOB_POOL.stop()
+    await aclose_clients()
+    await asyncio.to_thread(EVIDENCE.close)
+
+
 class DiagnoseRequest(PatientData):
     pass
 
@@ -42,55 +100,181 @@ def _sanitize_for_response(obj: Any) -> Any:
     return obj
 
 
-@app.post('/diagnose')
-async def diagnose_endpoint(req: DiagnoseRequest):
+def _case_keys(req: PatientData) -> Tuple[Optional[str], Optional[str], Optional[str]]:
+    """(mrn, patient_id, case_id) from a request, accepting dicts or models."""
+    basic = getattr(req, 'patient', None)
+    mrn = None
+    if isinstance(basic, dict):
+        mrn = basic.get('mrn')
+    else:
+        mrn = getattr(basic, 'mrn', None) if basic is not None else None
+
+    case_info = getattr(req, 'case', None)
+    patient_id = None
+    case_id = None
+    if isinstance(case_info, dict):
+        patient_id = case_info.get('patient_id')
+        case_id = case_info.get('case_id')
+    else:
+        patient_id = getattr(case_info, 'patient_id', None) if case_info is not None else None
+        case_id = getattr(case_info, 'case_id', None) if case_info is not None else None
+    return mrn, patient_id, case_id
+
+
+async def _store_result(req: PatientData, data: Any) -> None:
+    # Store the exact returned payload in Mongo results collection (best-effort)
+    mrn, patient_id, _ = _case_keys(req)
     try:
-        # Determine identifiers early and mark diagnosed in Mongo 'cases' (best-effort)
-        basic = getattr(req, 'patient', None)
-        mrn = None
-        if isinstance(basic, dict):
-            mrn = basic.get('mrn')
-        else:
-            mrn = getattr(basic, 'mrn', None) if basic is not None else None
-
-        case_info = getattr(req, 'case', None)
-        patient_id = None
-        case_id = None
-        if isinstance(case_info, dict):
-            patient_id = case_info.get('patient_id')
-            case_id = case_info.get('case_id')
-        else:
-            patient_id = getattr(case_info, 'patient_id', None) if case_info is not None else None
-            case_id = getattr(case_info, 'case_id', None) if case_info is not None else None
+        result_key = patient_id or mrn or 'unknown'
+        # The evidence store can block (durable writes, read-after-write flushes): call it off the event loop
+        await asyncio.to_thread(EVIDENCE.put_result, result_key, data)
+    except Exception:
+        pass
+
+
+async def _mark_diagnosed(req: PatientData) -> None:
+    # Mark diagnosed in Mongo 'cases' (best-effort)
+    _, patient_id, case_id = _case_keys(req)
+    try:
+        await asyncio.to_thread(EVIDENCE.mark_case_diagnosed, patient_id=patient_id, case_id=case_id)
+    except Exception:
+        pass
+
+
+async def diagnose_job(payload: Dict[str, Any], on_partial) -> Dict[str, Any]:
+    """Job handler: diagnose one queued PatientData, storing each agent's output as it lands."""
+    req = PatientData.model_validate(payload)
+    intake, norm = prepare_intake(req)
+    # Queued jobs are not waited on by a client: admit their LLM calls behind /diagnose
+    with llm_priority("batch"):
+        result = await run_pipeline(
+            intake, norm,
+            on_agent=lambda r: on_partial(r.agent, _sanitize_for_response(r.model_dump())),
+        )
+    data = _sanitize_for_response(result.model_dump())
+    await _mark_diagnosed(req)
+    await _store_result(req, data)
+    return data
+
+
+JOB_POOL = JobWorkerPool(diagnose_job, queue=JOBS, workers=JOB_WORKERS)
 
-        try:
-            EVIDENCE.mark_case_diagnosed(patient_id=patient_id, case_id=case_id)
-        except Exception:
-            pass
 
-        result = await diagnose_patient(req)
-        print(result)
+@app.post('/diagnose')
+async def diagnose_endpoint(req: DiagnoseRequest, deadline_seconds: Optional[float] = None,
+                            all_agents: bool = False):
+    try:
+        # Mark diagnosed in Mongo 'cases' early (best-effort)
+        await _mark_diagnosed(req)
+
+        result = await diagnose_patient(req, deadline_seconds=deadline_seconds, all_agents=all_agents)
         data = result.model_dump()
         data = _sanitize_for_response(data)
-        # Store the exact returned payload in Mongo results collection (best-effort)
-        try:
-            result_key = patient_id or mrn or 'unknown'
-            EVIDENCE.put_result(result_key, data)
-        except Exception:
-            pass
+        await _store_result(req, data)
         return data
     except Exception as e:
         raise HTTPException(500, detail=str(e))
 
+
+def _stream_line(event: str, data: Any, sse: bool) -> str:
+    if sse:
+        return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+    return json.dumps({"event": event, "data": data}) + "\n"
+
+
+@app.post('/diagnose/stream')
+async def diagnose_stream_endpoint(req: DiagnoseRequest, request: Request, format: Optional[str] = None,
+                                   deadline_seconds: Optional[float] = None, all_agents: bool = False):
+    """Streaming /diagnose: `triage` (the specialists that will run), `candidate` events as each
+    specialist's candidates are parsed (mid-answer with AGENT_STREAMING on), one `agent` event per
+    specialist as it finishes, `missing` for specialists that ran out of time, `escalate` (cascade
+    mode) before the contested specialists' reasoning-tier `agent` events, then `fused`,
+    `recommendations` and `done`. NDJSON by default; SSE with ?format=sse or Accept: text/event-stream."""
+    sse = format == "sse" or (format is None and "text/event-stream" in request.headers.get("accept", ""))
+    await _mark_diagnosed(req)
+
+    async def events():
+        try:
+            async for event, payload in diagnose_stream(req, deadline_seconds=deadline_seconds,
+                                                        all_agents=all_agents):
+                if event == "triage":
+                    yield _stream_line("triage", payload, sse)
+                elif event == "candidate":
+                    yield _stream_line("candidate", {"agent": payload["agent"],
+                                                     "candidate": _sanitize_for_response(payload["candidate"].model_dump())}, sse)
+                elif event == "agent":
+                    yield _stream_line("agent", _sanitize_for_response(payload.model_dump()), sse)
+                elif event in ("missing", "escalate"):
+                    yield _stream_line(event, payload, sse)
+                elif event == "fused":
+                    yield _stream_line("fused", _sanitize_for_response(payload.model_dump()), sse)
+                elif event == "recommendations":
+                    yield _stream_line("recommendations", [_sanitize_for_response(r.model_dump()) for r in payload], sse)
+                elif event == "result":
+                    await _store_result(req, _sanitize_for_response(payload.model_dump()))
+                    yield _stream_line("done", {}, sse)
+        except Exception as e:
+            yield _stream_line("error", {"detail": str(e)}, sse)
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream" if sse else "application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@app.post('/diagnose/jobs', status_code=202)
+async def create_diagnose_job(req: DiagnoseRequest):
+    """Queue a diagnosis and return its job id immediately; poll GET /diagnose/jobs/{job_id}."""
+    try:
+        job_id = await asyncio.to_thread(JOBS.enqueue, req.model_dump(mode='json'))
+    except Exception as e:
+        raise HTTPException(500, detail=str(e))
+    JOB_POOL.wake()
+    return {"job_id": job_id, "status": "queued"}
+
+
+@app.get('/diagnose/jobs/{job_id}')
+async def get_diagnose_job(job_id: str):
+    job = await asyncio.to_thread(JOBS.get, job_id)
+    if job is None:
+        raise HTTPException(404, detail="job not found")
+    return job
+
+class DiagnoseBatchRequest(BaseModel):
+    patients: List[PatientData]
+    concurrency: Optional[int] = None
+
+
+@app.post('/diagnose/batch')
+async def diagnose_batch_endpoint(req: DiagnoseBatchRequest):
+    """Diagnose many patients; streams one NDJSON line per case, in completion order."""
+    concurrency = req.concurrency or BATCH_CONCURRENCY
+
+    async def lines():
+        async for index, outcome in diagnose_batch(req.patients, concurrency=concurrency):
+            patient = req.patients[index]
+            mrn, patient_id, case_id = _case_keys(patient)
+            line: Dict[str, Any] = {"index": index, "mrn": mrn, "patient_id": patient_id, "case_id": case_id}
+            if isinstance(outcome, Exception):
+                line["error"] = str(outcome)
+            else:
+                data = _sanitize_for_response(outcome.model_dump())
+                await _mark_diagnosed(patient)
+                await _store_result(patient, data)
+                line["result"] = data
+            yield json.dumps(line) + "\n"
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
 @app.get('/evidence/{case_id}')
 async def evidence_endpoint(case_id: str):
-    return EVIDENCE.get(case_id)
+    return await asyncio.to_thread(EVIDENCE.get, case_id)
 
 
 @app.get('/cases/{patient_id}')
 async def case_doc_endpoint(patient_id: str):
     try:
-        doc = EVIDENCE.get_case_doc(patient_id)
+        doc = await asyncio.to_thread(EVIDENCE.get_case_doc, patient_id)
         return _sanitize_for_response(doc)
     except Exception as e:
         raise HTTPException(500, detail=str(e))
@@ -99,7 +283,7 @@ async def case_doc_endpoint(patient_id: str):
 @app.get('/diagnosed_result/{patient_id}')
 async def diagnosed_result_endpoint(patient_id: str):
     try:
-        res = EVIDENCE.get_result(patient_id)
+        res = await asyncio.to_thread(EVIDENCE.get_result, patient_id)
         return _sanitize_for_response(res)
     except Exception as e:
         raise HTTPException(500, detail=str(e))
@@ -0,0 +1,264 @@
+import os
+import time
+import asyncio
+import itertools
+import threading
+import contextvars
+from contextlib import asynccontextmanager, contextmanager
+from typing import Callable, Dict, List, Optional
+
+from .metrics import LLM_QUEUE_DEPTH, LLM_QUEUE_WAIT_SECONDS, LLM_IN_FLIGHT
+
+# Provider ceilings for chat completions (0 = unlimited). Calls beyond them wait
+# in a priority queue instead of being sent and rejected with a 429.
+LLM_RPM = float(os.getenv('LLM_RPM', '0'))
+LLM_TPM = float(os.getenv('LLM_TPM', '0'))
+# Global cap on in-flight chat completions (0 = unbounded)
+LLM_MAX_CONCURRENCY = int(os.getenv('LLM_MAX_CONCURRENCY', '0'))
+# Bucket size in seconds of the per-minute rate (how large a burst is let through at once)
+LLM_BURST_SECONDS = float(os.getenv('LLM_BURST_SECONDS', '10'))
+# Completion tokens reserved for a call without max_tokens; the reservation is
+# corrected with the reported usage once the call returns
+LLM_EXPECTED_COMPLETION_TOKENS = int(os.getenv('LLM_EXPECTED_COMPLETION_TOKENS', '600'))
+# A waiting call moves up one priority class per this many seconds, so lower
+# classes are delayed under load but never starved
+LLM_PRIORITY_AGING_SECONDS = float(os.getenv('LLM_PRIORITY_AGING_SECONDS', '15'))
+
+# Priority classes, highest first
+PRIORITIES: Dict[str, int] = {'interactive': 0, 'batch': 1, 'recommendations': 2}
+
+_priority: contextvars.ContextVar[str] = contextvars.ContextVar('biosage_llm_priority', default='interactive')
+
+
+@contextmanager
+def llm_priority(name: str):
+    """Run the enclosed LLM calls (and tasks created inside) in priority class `name`."""
+    token = _priority.set(name if name in PRIORITIES else 'interactive')
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority() -> str:
+    return _priority.get()
+
+
+class TokenBucket:
+    """Refills at `per_minute` / 60 per second up to LLM_BURST_SECONDS worth of capacity.
+
+    A request larger than the whole bucket is let through once the bucket is
+    full (the level goes negative), so it is delayed but never stuck.
+    """
+
+    def __init__(self, per_minute: float, burst_seconds: float = LLM_BURST_SECONDS):
+        self.rate = per_minute / 60.0
+        self.capacity = max(1.0, self.rate * burst_seconds)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        if self.rate <= 0:
+            return 0.0
+        self._refill(now)
+        need = min(amount, self.capacity)
+        return 0.0 if self.level >= need else (need - self.level) / self.rate
+
+    def take(self, amount: float) -> None:
+        if self.rate > 0:
+            self.level -= amount
+
+    def give(self, amount: float) -> None:
+        if self.rate > 0:
+            self.level = min(self.capacity, self.level + amount)
+
+
+class Ticket:
+    """An admitted call; set `used_tokens` from the response usage before release."""
+
+    def __init__(self, tokens: int):
+        self.tokens = tokens
+        self.used_tokens: Optional[int] = None
+
+
+class _Waiter:
+    __slots__ = ('rank', 'priority', 'seq', 'tokens', 'enqueued', 'grant')
+
+    def __init__(self, priority: str, seq: int, tokens: int, grant: Callable[[], None]):
+        self.priority = priority
+        self.rank = PRIORITIES.get(priority, 0)
+        self.seq = seq
+        self.tokens = tokens
+        self.enqueued = time.monotonic()
+        self.grant = grant
+
+
+class AdmissionController:
+    """Process-wide admission of chat completions under RPM/TPM and concurrency limits.
+
+    Waiting calls are granted in priority order (interactive > batch >
+    recommendations), FIFO within a class, with aging so a long wait lifts a
+    call into the next class. Works from event loops and threads alike: grants
+    are made under a lock and a timer thread re-checks the queue when the
+    buckets will have refilled.
+    """
+
+    def __init__(self, rpm: float = LLM_RPM, tpm: float = LLM_TPM, max_concurrency: int = LLM_MAX_CONCURRENCY,
+                 aging_seconds: float = LLM_PRIORITY_AGING_SECONDS):
+        self.rpm = TokenBucket(rpm)
+        self.tpm = TokenBucket(tpm)
+        self.max_concurrency = max_concurrency
+        self.aging_seconds = aging_seconds
+        self.enabled = rpm > 0 or tpm > 0 or max_concurrency > 0
+        self._lock = threading.Lock()
+        self._waiters: List[_Waiter] = []
+        self._seq = itertools.count()
+        self._in_flight = 0
+        self._paused_until = 0.0
+        self._timer: Optional[threading.Timer] = None
+        self._timer_at = 0.0
+
+    # ---- queue ----
+    def _effective_rank(self, w: _Waiter, now: float) -> float:
+        if self.aging_seconds <= 0:
+            return w.rank
+        return w.rank - (now - w.enqueued) / self.aging_seconds
+
+    def _publish_depth(self) -> None:
+        counts = {p: 0 for p in PRIORITIES}
+        for w in self._waiters:
+            counts[w.priority] = counts.get(w.priority, 0) + 1
+        for p, n in counts.items():
+            LLM_QUEUE_DEPTH.set(n, priority=p)
+        LLM_IN_FLIGHT.set(self._in_flight)
+
+    def _schedule(self, delay: float) -> None:
+        at = time.monotonic() + delay
+        if self._timer is not None and self._timer.is_alive() and self._timer_at <= at:
+            return
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer_at = at
+        self._timer.start()
+
+    def _on_timer(self) -> None:
+        with self._lock:
+            self._timer = None
+            self._dispatch()
+
+    def _dispatch(self) -> None:
+        # Caller holds the lock
+        now = time.monotonic()
+        while self._waiters:
+            if self.max_concurrency > 0 and self._in_flight >= self.max_concurrency:
+                break  # release() dispatches again
+            if now < self._paused_until:
+                self._schedule(self._paused_until - now)
+                break
+            w = min(self._waiters, key=lambda x: (self._effective_rank(x, now), x.seq))
+            wait = max(self.rpm.wait_time(1, now), self.tpm.wait_time(w.tokens, now))
+            if wait > 0:
+                # Head-of-line: lower classes do not overtake a call waiting for tokens
+                self._schedule(wait)
+                break
+            self._waiters.remove(w)
+            self.rpm.take(1)
+            self.tpm.take(w.tokens)
+            self._in_flight += 1
+            LLM_QUEUE_WAIT_SECONDS.observe(now - w.enqueued, priority=w.priority)
+            w.grant()
+        self._publish_depth()
+
+    def _enqueue(self, priority: str, tokens: int, grant: Callable[[], None]) -> _Waiter:
+        with self._lock:
+            w = _Waiter(priority, next(self._seq), tokens, grant)
+            self._waiters.append(w)
+            self._dispatch()
+            return w
+
+    def _withdraw(self, w: _Waiter) -> bool:
+        """Drop a waiter that gave up; False if it had already been granted."""
+        with self._lock:
+            if w in self._waiters:
+                self._waiters.remove(w)
+                self._publish_depth()
+                return True
+            return False
+
+    def release(self, ticket: Ticket) -> None:
+        with self._lock:
+            self._in_flight -= 1
+            if ticket.used_tokens is not None:
+                # Settle the reservation against what the provider actually counted
+                delta = ticket.tokens - ticket.used_tokens
+                if delta > 0:
+                    self.tpm.give(delta)
+                else:
+                    self.tpm.take(-delta)
+            self._dispatch()
+
+    def penalize(self, seconds: float) -> None:
+        """Hold every grant for `seconds` (the provider answered 429 / Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._dispatch()
+
+    def depth(self) -> Dict[str, int]:
+        with self._lock:
+            counts = {p: 0 for p in PRIORITIES}
+            for w in self._waiters:
+                counts[w.priority] += 1
+            return counts
+
+    # ---- entry points ----
+    @asynccontextmanager
+    async def slot(self, tokens: int, priority: Optional[str] = None):
+        """Wait for admission on the running loop; yields a Ticket released on exit."""
+        ticket = Ticket(tokens)
+        if not self.enabled:
+            yield ticket
+            return
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+
+        def resolve() -> None:
+            if fut.cancelled():
+                self.release(ticket)  # granted after the caller gave up
+            else:
+                fut.set_result(None)
+
+        w = self._enqueue(priority or current_priority(), tokens, lambda: loop.call_soon_threadsafe(resolve))
+        try:
+            await fut
+        except asyncio.CancelledError:
+            if not self._withdraw(w) and fut.done() and not fut.cancelled():
+                self.release(ticket)  # granted, but cancelled before we resumed
+            raise
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+    @contextmanager
+    def slot_sync(self, tokens: int, priority: Optional[str] = None):
+        """Blocking counterpart of slot() for reason() and worker threads."""
+        ticket = Ticket(tokens)
+        if not self.enabled:
+            yield ticket
+            return
+        granted = threading.Event()
+        self._enqueue(priority or current_priority(), tokens, granted.set)
+        granted.wait()
+        try:
+            yield ticket
+        finally:
+            self.release(ticket)
+
+
+ADMISSION = AdmissionController()
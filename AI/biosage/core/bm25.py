@@ -0,0 +1,165 @@
+import os
+import json
+import hashlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy import sparse
+
+# Okapi BM25 parameters (same defaults and idf floor as rank_bm25.BM25Okapi)
+BM25_K1 = 1.5
+BM25_B = 0.75
+BM25_EPSILON = 0.25
+
+_FILES = ('data.npy', 'indices.npy', 'indptr.npy')
+
+
+def tokenize(text: str) -> List[str]:
+    # naive whitespace tokenization (kept identical for corpus and queries)
+    return text.split()
+
+
+def corpus_fingerprint(texts: Sequence[str]) -> str:
+    h = hashlib.sha256()
+    for t in texts:
+        h.update(t.encode('utf-8'))
+        h.update(b'\0')
+    return h.hexdigest()
+
+
+class SparseBM25:
+    """Okapi BM25 over a precomputed term x document CSR weight matrix.
+
+    Row t holds idf(t) * tf * (k1 + 1) / (tf + k1 * (1 - b + b * dl / avgdl)) for
+    every document containing t, so scoring a query is a single sparse
+    vector-matrix product over the query's term rows.
+    """
+
+    def __init__(self, weights: sparse.csr_matrix, vocab: Dict[str, int], fingerprint: str = ''):
+        self.weights = weights
+        self.vocab = vocab
+        self.fingerprint = fingerprint
+        self.n_docs = weights.shape[1]
+
+    @classmethod
+    def build(cls, tokenized: Sequence[Sequence[str]], fingerprint: str = '',
+              k1: float = BM25_K1, b: float = BM25_B, epsilon: float = BM25_EPSILON) -> 'SparseBM25':
+        vocab: Dict[str, int] = {}
+        rows: List[int] = []
+        cols: List[int] = []
+        tfs: List[int] = []
+        doc_len = np.zeros(len(tokenized), dtype='float64')
+        for d, tokens in enumerate(tokenized):
+            doc_len[d] = len(tokens)
+            counts: Dict[int, int] = {}
+            for tok in tokens:
+                tid = vocab.setdefault(tok, len(vocab))
+                counts[tid] = counts.get(tid, 0) + 1
+            for tid, tf in counts.items():
+                rows.append(tid)
+                cols.append(d)
+                tfs.append(tf)
+        n_docs = len(tokenized)
+        rows_a = np.asarray(rows, dtype='int64')
+        cols_a = np.asarray(cols, dtype='int64')
+        tf_a = np.asarray(tfs, dtype='float64')
+        avgdl = float(doc_len.mean()) if n_docs else 0.0
+
+        df = np.bincount(rows_a, minlength=len(vocab)).astype('float64')
+        idf = np.log(n_docs - df + 0.5) - np.log(df + 0.5)
+        if len(idf):
+            # Floor terms that appear in more than half the docs at eps * mean idf
+            idf[idf < 0] = epsilon * float(idf.mean())
+
+        norm = k1 * (1 - b + b * doc_len / avgdl) if avgdl > 0 else np.full(n_docs, k1)
+        vals = idf[rows_a] * tf_a * (k1 + 1) / (tf_a + norm[cols_a])
+        weights = sparse.csr_matrix((vals.astype('float32'), (rows_a, cols_a)), shape=(len(vocab), n_docs))
+        weights.sum_duplicates()
+        return cls(weights, vocab, fingerprint)
+
+    def query_vector(self, tokens: Sequence[str]) -> Tuple[np.ndarray, np.ndarray]:
+        counts: Dict[int, int] = {}
+        for tok in tokens:
+            tid = self.vocab.get(tok)
+            if tid is not None:
+                counts[tid] = counts.get(tid, 0) + 1
+        ids = np.fromiter(counts.keys(), dtype='int64', count=len(counts))
+        qf = np.fromiter(counts.values(), dtype='float32', count=len(counts))
+        return ids, qf
+
+    def get_scores(self, tokens: Sequence[str]) -> np.ndarray:
+        ids, qf = self.query_vector(tokens)
+        if not len(ids):
+            return np.zeros(self.n_docs, dtype='float32')
+        # Repeated query terms count once per occurrence, as in BM25Okapi
+        return np.asarray(self.weights[ids].T @ qf).ravel()
+
+    def top_k(self, tokens: Sequence[str], k: int) -> List[Tuple[int, float]]:
+        """Return [(doc_index, score)] for the k best docs with a positive score."""
+        scores = self.get_scores(tokens)
+        if k <= 0 or not len(scores):
+            return []
+        k = min(k, len(scores))
+        cand = np.argpartition(-scores, k - 1)[:k]
+        cand = cand[np.argsort(-scores[cand], kind='stable')]
+        return [(int(i), float(scores[i])) for i in cand if scores[i] > 0]
+
+    # -------- persistence (memory-mapped on load) --------
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        arrays = {
+            'data.npy': self.weights.data,
+            'indices.npy': self.weights.indices,
+            'indptr.npy': self.weights.indptr,
+        }
+        for name, arr in arrays.items():
+            tmp = os.path.join(directory, name + '.tmp')
+            with open(tmp, 'wb') as f:
+                np.save(f, arr)
+            os.replace(tmp, os.path.join(directory, name))
+        tmp = os.path.join(directory, 'meta.json.tmp')
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({
+                'fingerprint': self.fingerprint,
+                'shape': list(self.weights.shape),
+                'nnz': int(self.weights.nnz),
+                'vocab': self.vocab,
+            }, f)
+        # meta.json goes last: it is what marks the arrays as complete
+        os.replace(tmp, os.path.join(directory, 'meta.json'))
+
+    @classmethod
+    def load(cls, directory: str, fingerprint: Optional[str] = None) -> Optional['SparseBM25']:
+        meta_path = os.path.join(directory, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, 'r', encoding='utf-8') as f:
+                meta = json.load(f)
+            if fingerprint is not None and meta.get('fingerprint') != fingerprint:
+                return None
+            data, indices, indptr = (np.load(os.path.join(directory, n), mmap_mode='r') for n in _FILES)
+            shape = tuple(meta['shape'])
+            if len(indptr) != shape[0] + 1 or len(data) != meta['nnz']:
+                return None
+            weights = sparse.csr_matrix((data, indices, indptr), shape=shape, copy=False)
+            return cls(weights, meta['vocab'], meta.get('fingerprint', ''))
+        except Exception as e:
+            print(f"Failed to load BM25 matrix: {e}")
+            return None
+
+
+def load_or_build(directory: str, texts: Sequence[str]) -> Optional[SparseBM25]:
+    """Memory-map the persisted matrix if it matches the corpus, else rebuild and persist it."""
+    if not texts:
+        return None
+    fingerprint = corpus_fingerprint(texts)
+    engine = SparseBM25.load(directory, fingerprint)
+    if engine is not None:
+        return engine
+    engine = SparseBM25.build([tokenize(t) for t in texts], fingerprint)
+    try:
+        engine.save(directory)
+    except OSError as e:
+        print(f"Failed to persist BM25 matrix: {e}")
+    return engine
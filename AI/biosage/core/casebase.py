@@ -1,21 +1,34 @@
 import os
-import sqlite3
-from typing import List, Dict, Any
 import json
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Sequence, Tuple
+
+import numpy as np
 
 from .llm import embed_texts
+from .filelock import locked
 
 ROOT = os.path.dirname(os.path.dirname(__file__))
-DB_PATH = os.path.join(ROOT, 'storage', 'app.db')
+DB_PATH = os.getenv('APP_DB_PATH', os.path.join(ROOT, 'storage', 'app.db'))
+CASE_INDEX_DIR = os.getenv('CASE_INDEX_DIR', os.path.join(ROOT, 'storage', 'case_index'))
 
 
-def _fetch_all_cases() -> List[Dict[str, Any]]:
+def _fetch_cases(case_ids: Optional[Sequence[str]] = None) -> List[Dict[str, Any]]:
     if not os.path.exists(DB_PATH):
         return []
     con = sqlite3.connect(DB_PATH)
     try:
         cur = con.cursor()
-        rows = cur.execute('SELECT id, intake, normalized FROM cases ORDER BY created_at DESC LIMIT 500').fetchall()
+        if case_ids is None:
+            rows = cur.execute('SELECT id, intake, normalized FROM cases ORDER BY created_at').fetchall()
+        else:
+            rows = []
+            ids = list(case_ids)
+            for i in range(0, len(ids), 500):
+                chunk = ids[i:i + 500]
+                marks = ','.join('?' * len(chunk))
+                rows.extend(cur.execute(f'SELECT id, intake, normalized FROM cases WHERE id IN ({marks})', chunk).fetchall())
         out = []
         for row in rows:
             case_id = row[0]
@@ -35,6 +48,18 @@ def _fetch_all_cases() -> List[Dict[str, Any]]:
         con.close()
 
 
+def _fetch_case_ids() -> List[str]:
+    if not os.path.exists(DB_PATH):
+        return []
+    con = sqlite3.connect(DB_PATH)
+    try:
+        return [row[0] for row in con.execute('SELECT id FROM cases')]
+    except sqlite3.Error:
+        return []
+    finally:
+        con.close()
+
+
 def _summarize_case(case: Dict[str, Any]) -> str:
     norm = case.get('normalized', {})
     intake = norm.get('intake', case.get('intake', {}))
@@ -50,38 +75,239 @@ def _summarize_case(case: Dict[str, Any]) -> str:
     )
 
 
-def search_previous_cases(query_symptoms: List[str], k: int = 5) -> List[Dict[str, Any]]:
+class CaseIndex:
+    """Append-only index of L2-normalized case-summary embeddings.
+
+    Rows live in <dir>/vectors.f32 (float32) with one {"case_id", "text"} line
+    per row in <dir>/rows.jsonl. Re-indexing a case appends a new row that
+    supersedes the old one, so search only scores each case's latest row.
+    The API and the job workers share the files: appends hold <dir>/.lock, and
+    rows another process appended are read in once rows.jsonl grows.
+    """
+
+    def __init__(self, directory: str = CASE_INDEX_DIR):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.vec_path = os.path.join(directory, 'vectors.f32')
+        self.rows_path = os.path.join(directory, 'rows.jsonl')
+        self.lock_path = os.path.join(directory, '.lock')
+        self._lock = threading.RLock()
+        self._sync_thread: Optional[threading.Thread] = None
+        self.synced = False
+        self._reset()
+
+    def _reset(self) -> None:
+        self.dim: Optional[int] = None
+        self._buf = np.zeros((0, 0), dtype='float32')
+        self._n = 0
+        self._rows: List[Dict[str, str]] = []
+        self._latest: Dict[str, int] = {}
+        self._active = np.zeros(0, dtype=bool)
+        self._rows_offset = 0  # bytes of rows.jsonl read so far
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._latest)
+
+    def _refresh(self) -> None:
+        """Read rows appended since the last look, by this or another process (caller holds _lock)."""
+        if self.dim is None:
+            try:
+                with open(self.meta_path, 'r', encoding='utf-8') as f:
+                    self.dim = int(json.load(f)['dim'])
+            except FileNotFoundError:
+                return
+            except Exception as e:
+                print(f"Case index meta unreadable: {e}")
+                return
+        try:
+            size = os.path.getsize(self.rows_path)
+            stored = os.path.getsize(self.vec_path) // (4 * self.dim)
+        except OSError:
+            return
+        if size < self._rows_offset:
+            # Replaced underneath us: read it again from the start
+            dim = self.dim
+            self._reset()
+            self.dim = dim
+        if size == self._rows_offset:
+            return
+        with open(self.rows_path, 'rb') as f:
+            f.seek(self._rows_offset)
+            data = f.read(size - self._rows_offset)
+        # Only complete lines whose vector is on disk (vectors are written first)
+        lines = data[:data.rfind(b'\n') + 1].splitlines(keepends=True)[:max(0, stored - self._n)]
+        if not lines:
+            return
+        with open(self.vec_path, 'rb') as f:
+            f.seek(self._n * self.dim * 4)
+            mat = np.fromfile(f, dtype='float32', count=len(lines) * self.dim).reshape(len(lines), self.dim)
+        self._reserve(self._n + len(lines))
+        self._buf[self._n:self._n + len(lines)] = mat
+        self._n += len(lines)
+        for line in lines:
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = {'case_id': None, 'text': ''}  # keeps row numbers aligned with vectors.f32
+            self._track(row)
+        self._rows_offset += sum(len(line) for line in lines)
+
+    def _reserve(self, n: int) -> None:
+        if self._buf.shape[0] >= n and self._buf.shape[1] == (self.dim or 0):
+            return
+        cap = max(n, 2 * self._buf.shape[0], 64)
+        buf = np.zeros((cap, self.dim or 0), dtype='float32')
+        if self._n:
+            buf[:self._n] = self._buf[:self._n]
+        self._buf = buf
+        active = np.zeros(cap, dtype=bool)
+        active[:self._n] = self._active[:self._n]
+        self._active = active
+
+    def _track(self, row: Dict[str, str]) -> None:
+        idx = len(self._rows)
+        self._rows.append(row)
+        if row.get('case_id') is None:
+            return
+        prev = self._latest.get(row['case_id'])
+        if prev is not None:
+            self._active[prev] = False
+        self._latest[row['case_id']] = idx
+        self._active[idx] = True
+
+    def add_many(self, items: Sequence[Tuple[str, str]], vectors: Optional[Sequence[Sequence[float]]] = None,
+                 skip_known: bool = False) -> None:
+        """Index (case_id, summary_text) pairs; embeds the texts unless vectors are given.
+
+        skip_known leaves out cases that are indexed by the time the rows are
+        written (e.g. by another process syncing at the same time).
+        """
+        if not items:
+            return
+        if vectors is None:
+            vectors = embed_texts([text for _, text in items])
+        mat = np.asarray(vectors, dtype='float32')
+        norms = np.linalg.norm(mat, axis=1, keepdims=True)
+        mat = mat / np.where(norms == 0, 1.0, norms)
+        with self._lock, locked(self.lock_path):
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(mat.shape[1])
+                with open(self.meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'dim': self.dim}, f)
+            elif mat.shape[1] != self.dim:
+                raise ValueError(f'case embedding dim {mat.shape[1]} != index dim {self.dim}')
+            if skip_known:
+                keep = [i for i, (case_id, _) in enumerate(items) if case_id not in self._latest]
+                items, mat = [items[i] for i in keep], mat[keep]
+                if not items:
+                    return
+            # Every writer holds the lock, so anything past the last complete row
+            # was left by an interrupted append
+            expected = self._n * self.dim * 4
+            if os.path.exists(self.vec_path) and os.path.getsize(self.vec_path) > expected:
+                with open(self.vec_path, 'r+b') as f:
+                    f.truncate(expected)
+            if os.path.exists(self.rows_path) and os.path.getsize(self.rows_path) > self._rows_offset:
+                with open(self.rows_path, 'r+b') as f:
+                    f.truncate(self._rows_offset)
+            with open(self.vec_path, 'ab') as f:
+                f.write(mat.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            rows = [{'case_id': case_id, 'text': text} for case_id, text in items]
+            data = ''.join(json.dumps(row) + '\n' for row in rows).encode('utf-8')
+            with open(self.rows_path, 'ab') as f:
+                f.write(data)
+            self._reserve(self._n + len(items))
+            self._buf[self._n:self._n + len(items)] = mat
+            self._n += len(items)
+            for row in rows:
+                self._track(row)
+            self._rows_offset += len(data)
+
+    def sync(self) -> None:
+        """Index cases present in app.db but missing here (e.g. stored before the index existed)."""
+        with self._lock:
+            self._refresh()
+            known = set(self._latest)
+        missing = [cid for cid in _fetch_case_ids() if cid not in known]
+        if missing:
+            cases = _fetch_cases(missing)
+            self.add_many([(c['case_id'], _summarize_case(c)) for c in cases], skip_known=True)
+        self.synced = True
+
+    def start_sync(self) -> None:
+        """Run sync() once, on a background thread; searches meanwhile see the rows indexed so far."""
+        with self._lock:
+            if self._sync_thread is not None:
+                return
+            self._sync_thread = threading.Thread(target=self._sync_quietly, name='case-index-sync', daemon=True)
+            self._sync_thread.start()
+
+    def _sync_quietly(self) -> None:
+        try:
+            self.sync()
+        except Exception as e:
+            print(f"Case index sync failed: {e}")
+
+    def search(self, query_vec: Sequence[float], k: int = 5) -> List[Dict[str, Any]]:
+        q = np.asarray(query_vec, dtype='float32')
+        q = q / (np.linalg.norm(q) or 1.0)
+        with self._lock:
+            self._refresh()
+            n = self._n
+            if n == 0 or k <= 0 or not self._latest:
+                return []
+            scores = self._buf[:n] @ q
+            scores = np.where(self._active[:n], scores, -np.inf)
+            rows = self._rows
+            k = min(k, len(self._latest))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        out = []
+        for idx in top:
+            if not np.isfinite(scores[idx]):
+                continue
+            row = rows[idx]
+            out.append({'doc_id': f"case:{row['case_id']}", 'text': row['text'], 'score': float(scores[idx])})
+        return out
+
+
+CASE_INDEX = CaseIndex()
+
+
+def index_cases(items: Sequence[Tuple[str, Dict[str, Any]]]) -> None:
+    """Embed and index stored cases [(case_id, {'intake', 'normalized'})] with one embedding call."""
+    CASE_INDEX.add_many([(case_id, _summarize_case(case)) for case_id, case in items])
+
+
+def index_case(case_id: str, case: Dict[str, Any]) -> None:
+    """Embed and index one stored case ({'intake', 'normalized'})."""
+    index_cases([(case_id, case)])
+
+
+def case_query_text(query_symptoms: List[str]) -> str:
+    return ', '.join(query_symptoms) if query_symptoms else 'fever'
+
+
+def search_previous_cases(query_symptoms: List[str], k: int = 5,
+                          query_vec: Optional[Sequence[float]] = None) -> List[Dict[str, Any]]:
     """
     Retrieve top-k similar previous cases using embedding similarity over a textual summary.
     Returns list of {doc_id, text, score} where doc_id is prefixed with 'case:'.
+    query_vec may carry a precomputed embedding of case_query_text(query_symptoms).
     """
-    all_cases = _fetch_all_cases()
-    if not all_cases:
+    # Cases stored before the index existed are indexed in the background (normally
+    # started at app startup); until then they are simply not found
+    CASE_INDEX.start_sync()
+    if not len(CASE_INDEX):
         return []
-    # Build texts
-    texts = [_summarize_case(c) for c in all_cases]
-    # Embed corpus and query
-    corpus_vecs = embed_texts(texts)
-    query_text = ', '.join(query_symptoms) if query_symptoms else 'fever'
-    query_vec = embed_texts([query_text])[0]
-
-    # cosine similarity
-    import numpy as np
-    def cosine(a, b):
-        a = np.array(a, dtype='float32')
-        b = np.array(b, dtype='float32')
-        denom = (np.linalg.norm(a) * np.linalg.norm(b)) or 1.0
-        return float(np.dot(a, b) / denom)
-
-    scored = []
-    for case, vec in zip(all_cases, corpus_vecs):
-        scored.append({
-            'doc_id': f"case:{case['case_id']}",
-            'text': _summarize_case(case),
-            'score': cosine(query_vec, vec)
-        })
-    scored.sort(key=lambda x: x['score'], reverse=True)
-    return scored[:k]
+    if query_vec is None:
+        query_vec = embed_texts([case_query_text(query_symptoms)])[0]
+    return CASE_INDEX.search(query_vec, k)
 
 
 def format_case_snippets(passages: List[Dict[str, Any]]) -> str:
@@ -0,0 +1,235 @@
+import os
+import json
+import time
+import random
+import asyncio
+import hashlib
+import threading
+from types import SimpleNamespace
+from typing import Any, Dict, List, Optional
+
+from .llmcache import ResponseCache
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+
+# Record/replay of provider calls for offline benchmarks and tests:
+#   off    - talk to the provider
+#   record - talk to the provider and append every chat/embedding response to the cassette
+#   replay - serve responses from the cassette only (no network, no API key needed)
+LLM_CASSETTE_MODE = os.getenv('LLM_CASSETTE_MODE', 'off').lower()
+LLM_CASSETTE_PATH = os.getenv('LLM_CASSETTE_PATH', os.path.join(ROOT, 'storage', 'cassettes', 'llm.jsonl'))
+# Replay latency: a fixed value in ms, or empty to reuse each call's recorded latency;
+# scaled by LLM_REPLAY_LATENCY_SCALE and jittered by up to +/- LLM_REPLAY_JITTER_MS
+# (seeded by the request, so runs are repeatable)
+LLM_REPLAY_LATENCY_MS = os.getenv('LLM_REPLAY_LATENCY_MS', '')
+LLM_REPLAY_LATENCY_SCALE = float(os.getenv('LLM_REPLAY_LATENCY_SCALE', '1.0'))
+LLM_REPLAY_JITTER_MS = float(os.getenv('LLM_REPLAY_JITTER_MS', '0'))
+# Replay matching: 'exact' fails on any unrecorded request; 'family' falls back to a
+# recorded response for the same model, system prompt and parameters (or, for
+# embeddings, the same model), picked deterministically. Prompts shift between runs
+# as the casebase grows, so benchmarks default to 'family'.
+LLM_REPLAY_MATCH = os.getenv('LLM_REPLAY_MATCH', 'family').lower()
+
+
+class CassetteMiss(RuntimeError):
+    """Replay found no recorded response for a request."""
+
+
+def chat_key(model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    return ResponseCache.make_key('cassette', model, messages, params)
+
+
+def embed_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\x00{text}".encode('utf-8')).hexdigest()
+
+
+def chat_family(model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+    system = [m for m in messages if m.get('role') == 'system']
+    return ResponseCache.make_key('cassette-family', model, system, params)
+
+
+def embed_family(model: str) -> str:
+    return hashlib.sha256(f"embed\x00{model}".encode('utf-8')).hexdigest()
+
+
+def _chat_response(content: str, model: str) -> SimpleNamespace:
+    # The subset of the OpenAI ChatCompletion shape llm.py reads
+    return SimpleNamespace(
+        model=model,
+        choices=[SimpleNamespace(index=0, finish_reason='stop',
+                                 message=SimpleNamespace(role='assistant', content=content))],
+        usage=None,
+    )
+
+
+def _embed_response(vectors: List[List[float]], model: str) -> SimpleNamespace:
+    return SimpleNamespace(model=model, data=[SimpleNamespace(index=i, embedding=v) for i, v in enumerate(vectors)])
+
+
+class Cassette:
+    """JSONL file of recorded provider responses.
+
+    Each line is {"kind": "chat", "key", "family", "model", "content", "latency"}
+    or {"kind": "embed", "key", "family", "model", "embedding", "latency"};
+    embeddings are stored per input text, so replay does not depend on how
+    inputs were batched.
+    """
+
+    def __init__(self, path: str = LLM_CASSETTE_PATH, mode: str = LLM_CASSETTE_MODE):
+        self.path = path
+        self.mode = mode
+        self._entries: Optional[Dict[str, Dict[str, Any]]] = None
+        self._families: Dict[str, List[str]] = {}
+        self._lock = threading.Lock()
+        self.stats = {'hits': 0, 'fallbacks': 0, 'misses': 0, 'recorded': 0}
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode in ('record', 'replay')
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            if self._entries is None:
+                entries: Dict[str, Dict[str, Any]] = {}
+                if os.path.exists(self.path):
+                    with open(self.path, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            line = line.strip()
+                            if line:
+                                entry = json.loads(line)
+                                if entry['key'] not in entries:
+                                    self._families.setdefault(entry.get('family', ''), []).append(entry['key'])
+                                entries[entry['key']] = entry
+                self._entries = entries
+            return self._entries
+
+    def lookup(self, key: str, family: Optional[str] = None) -> Dict[str, Any]:
+        entries = self._load()
+        entry = entries.get(key)
+        if entry is not None:
+            self.stats['hits'] += 1
+            return entry
+        members = self._families.get(family or '') if LLM_REPLAY_MATCH == 'family' else None
+        if members:
+            self.stats['fallbacks'] += 1
+            return entries[members[int(key, 16) % len(members)]]
+        self.stats['misses'] += 1
+        raise CassetteMiss(f"No recorded response for {key[:12]} in {self.path}")
+
+    def append(self, entries: List[Dict[str, Any]]) -> None:
+        loaded = self._load()
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                for entry in entries:
+                    if entry['key'] in loaded:
+                        continue
+                    f.write(json.dumps(entry) + '\n')
+                    loaded[entry['key']] = entry
+                    self._families.setdefault(entry.get('family', ''), []).append(entry['key'])
+                    self.stats['recorded'] += 1
+
+    def replay_delay(self, key: str, recorded: float) -> float:
+        base = float(LLM_REPLAY_LATENCY_MS) / 1000.0 if LLM_REPLAY_LATENCY_MS else recorded
+        delay = base * LLM_REPLAY_LATENCY_SCALE
+        if LLM_REPLAY_JITTER_MS > 0:
+            delay += random.Random(key).uniform(-1.0, 1.0) * LLM_REPLAY_JITTER_MS / 1000.0
+        return max(0.0, delay)
+
+    # ---- replay ----
+    def _replay_chat(self, model: str, messages: List[Dict[str, str]], params: Dict[str, Any]):
+        key = chat_key(model, messages, params)
+        entry = self.lookup(key, chat_family(model, messages, params))
+        return _chat_response(entry['content'], model), self.replay_delay(key, entry.get('latency', 0.0))
+
+    def _replay_embed(self, model: str, texts: List[str]):
+        entries = [self.lookup(embed_key(model, t), embed_family(model)) for t in texts]
+        # One request: the batch waits for its slowest recorded input
+        delay = max(self.replay_delay(embed_key(model, t), e.get('latency', 0.0)) for t, e in zip(texts, entries))
+        return _embed_response([e['embedding'] for e in entries], model), delay
+
+    # ---- record ----
+    def _record_chat(self, model: str, messages: List[Dict[str, str]], params: Dict[str, Any], resp, latency: float):
+        content = resp.choices[0].message.content or ""
+        self.append([{'kind': 'chat', 'key': chat_key(model, messages, params),
+                      'family': chat_family(model, messages, params), 'model': model,
+                      'content': content, 'latency': round(latency, 4)}])
+
+    def _record_embed(self, model: str, texts: List[str], resp, latency: float):
+        self.append([{'kind': 'embed', 'key': embed_key(model, t), 'family': embed_family(model),
+                      'model': model, 'embedding': d.embedding, 'latency': round(latency, 4)}
+                     for t, d in zip(texts, resp.data)])
+
+    def wrap(self, client: Any = None) -> 'CassetteClient':
+        return CassetteClient(self, client)
+
+    def wrap_async(self, client: Any = None) -> 'AsyncCassetteClient':
+        return AsyncCassetteClient(self, client)
+
+
+class CassetteClient:
+    """Stands in for a sync OpenAI client: chat.completions.create / embeddings.create."""
+
+    def __init__(self, cassette: Cassette, client: Any = None):
+        self.cassette = cassette
+        self.client = client
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    def _chat(self, model: str, messages: List[Dict[str, str]], **params):
+        if self.cassette.mode == 'replay':
+            resp, delay = self.cassette._replay_chat(model, messages, params)
+            time.sleep(delay)
+            return resp
+        start = time.perf_counter()
+        resp = self.client.chat.completions.create(model=model, messages=messages, **params)
+        self.cassette._record_chat(model, messages, params, resp, time.perf_counter() - start)
+        return resp
+
+    def _embed(self, model: str, input: List[str], **params):
+        if self.cassette.mode == 'replay':
+            resp, delay = self.cassette._replay_embed(model, input)
+            time.sleep(delay)
+            return resp
+        start = time.perf_counter()
+        resp = self.client.embeddings.create(model=model, input=input, **params)
+        self.cassette._record_embed(model, input, resp, time.perf_counter() - start)
+        return resp
+
+
+class AsyncCassetteClient:
+    """Async counterpart of CassetteClient (AsyncOpenAI surface used by llm.py)."""
+
+    def __init__(self, cassette: Cassette, client: Any = None):
+        self.cassette = cassette
+        self.client = client
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._chat))
+        self.embeddings = SimpleNamespace(create=self._embed)
+
+    async def _chat(self, model: str, messages: List[Dict[str, str]], **params):
+        if self.cassette.mode == 'replay':
+            resp, delay = self.cassette._replay_chat(model, messages, params)
+            await asyncio.sleep(delay)
+            return resp
+        start = time.perf_counter()
+        resp = await self.client.chat.completions.create(model=model, messages=messages, **params)
+        await asyncio.to_thread(self.cassette._record_chat, model, messages, params, resp,
+                                time.perf_counter() - start)
+        return resp
+
+    async def _embed(self, model: str, input: List[str], **params):
+        if self.cassette.mode == 'replay':
+            resp, delay = self.cassette._replay_embed(model, input)
+            await asyncio.sleep(delay)
+            return resp
+        start = time.perf_counter()
+        resp = await self.client.embeddings.create(model=model, input=input, **params)
+        await asyncio.to_thread(self.cassette._record_embed, model, input, resp, time.perf_counter() - start)
+        return resp
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.close()
+
+
+CASSETTE = Cassette()
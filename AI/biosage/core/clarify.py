@@ -2,7 +2,7 @@ from typing import List
 import os
 from dotenv import load_dotenv
 from ..core.schemas import ClarifyRequest, ClarifyResponse
-from ..core.llm import reason
+from ..core.llm import areason
 
 load_dotenv()
 OPENAI_REAS_MODEL = os.getenv("OPENAI_REAS_MODEL", "gpt-4o")
@@ -20,7 +20,7 @@ Generate 1-3 yes/no questions to disambiguate these diagnoses. Focus on key symp
 Output as JSON: {{"questions": ["Question 1?", "Question 2?"]}}
 """
     try:
-        data = reason(
+        data = await areason(
             messages=[
                 {"role": "system", "content": SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
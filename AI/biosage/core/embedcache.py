@@ -0,0 +1,188 @@
+import os
+import json
+import hashlib
+import threading
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+from .filelock import locked
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+CACHE_DIR = os.getenv('EMBED_CACHE_DIR', os.path.join(ROOT, 'storage', 'embeddings'))
+EMBED_CACHE_ENABLED = os.getenv('EMBED_CACHE', 'on').lower() not in ('0', 'off', 'false', 'no')
+
+
+def text_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode('utf-8')).hexdigest()
+
+
+class _ModelStore:
+    """Append-only float32 matrix for one embedding model, memory-mapped for reads.
+
+    Layout under <CACHE_DIR>/<model>/:
+      meta.json    {"dim": int}
+      vectors.f32  raw row-major float32 rows
+      keys.txt     one sha256 key per row (written after the row, so a crash
+                   can only leave unreferenced trailing bytes, never a bad key)
+      .lock        held while appending
+
+    The API and the job workers share the store: appends happen under the file
+    lock after re-reading keys.txt, and rows other processes added are picked
+    up on the next read.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.meta_path = os.path.join(directory, 'meta.json')
+        self.vec_path = os.path.join(directory, 'vectors.f32')
+        self.keys_path = os.path.join(directory, 'keys.txt')
+        self.lock_path = os.path.join(directory, '.lock')
+        self.dim: Optional[int] = None
+        self.rows: Dict[str, int] = {}
+        self.count = 0  # rows referenced by keys.txt (line i of keys.txt is row i)
+        self._keys_offset = 0  # bytes of keys.txt already read
+        self._mmap: Optional[np.memmap] = None
+        self._refresh()
+
+    def _refresh(self) -> None:
+        """Read the keys appended since the last look, by this or another process."""
+        if self.dim is None:
+            try:
+                with open(self.meta_path, 'r', encoding='utf-8') as f:
+                    self.dim = int(json.load(f)['dim'])
+            except Exception:
+                return
+        try:
+            size = os.path.getsize(self.keys_path)
+        except OSError:
+            return
+        if size == self._keys_offset:
+            return
+        if size < self._keys_offset:
+            # Replaced underneath us: start over
+            self.rows, self.count, self._keys_offset, self._mmap = {}, 0, 0, None
+        with open(self.keys_path, 'rb') as f:
+            f.seek(self._keys_offset)
+            data = f.read(size - self._keys_offset)
+        complete = data[:data.rfind(b'\n') + 1]  # a trailing partial line is still being written
+        for line in complete.splitlines():
+            key = line.decode('ascii', 'replace').strip()
+            if len(key) == 64:
+                self.rows.setdefault(key, self.count)
+            self.count += 1
+        self._keys_offset += len(complete)
+
+    def _matrix(self) -> Optional[np.memmap]:
+        n = self.count
+        if n == 0 or self.dim is None:
+            return None
+        if self._mmap is None or self._mmap.shape[0] != n:
+            self._mmap = np.memmap(self.vec_path, dtype='float32', mode='r', shape=(n, self.dim))
+        return self._mmap
+
+    def get_many(self, keys: Sequence[str]) -> List[Optional[np.ndarray]]:
+        self._refresh()
+        mat = self._matrix()
+        out: List[Optional[np.ndarray]] = []
+        for key in keys:
+            row = self.rows.get(key)
+            out.append(np.array(mat[row]) if (mat is not None and row is not None) else None)
+        return out
+
+    def append(self, keys: Sequence[str], vectors: np.ndarray) -> None:
+        vectors = np.ascontiguousarray(vectors, dtype='float32')
+        if vectors.ndim != 2 or len(keys) != vectors.shape[0]:
+            raise ValueError('keys/vectors shape mismatch')
+        with locked(self.lock_path):
+            self._refresh()
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_path, 'w', encoding='utf-8') as f:
+                    json.dump({'dim': self.dim}, f)
+            elif vectors.shape[1] != self.dim:
+                raise ValueError(f'embedding dim {vectors.shape[1]} != cached dim {self.dim}')
+            fresh: Dict[str, int] = {}
+            for i, k in enumerate(keys):
+                if k not in self.rows:
+                    fresh.setdefault(k, i)
+            if not fresh:
+                return
+            # Every writer holds the lock, so bytes past the last referenced row (or
+            # a partial keys.txt line) can only be left by an interrupted write
+            expected = self.count * self.dim * 4
+            size = os.path.getsize(self.vec_path) if os.path.exists(self.vec_path) else 0
+            if size < expected:
+                raise OSError(f'{self.vec_path} holds fewer rows than keys.txt')
+            if size > expected:
+                with open(self.vec_path, 'r+b') as f:
+                    f.truncate(expected)
+            if os.path.exists(self.keys_path) and os.path.getsize(self.keys_path) > self._keys_offset:
+                with open(self.keys_path, 'r+b') as f:
+                    f.truncate(self._keys_offset)
+            with open(self.vec_path, 'ab') as f:
+                f.write(vectors[list(fresh.values())].tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            lines = ''.join(k + '\n' for k in fresh).encode('ascii')
+            with open(self.keys_path, 'ab') as f:
+                f.write(lines)
+            for k in fresh:
+                self.rows[k] = self.count
+                self.count += 1
+            self._keys_offset += len(lines)
+        self._mmap = None
+
+
+class EmbeddingCache:
+    """Content-addressed embedding cache: sha256(model, text) -> float32 vector."""
+
+    def __init__(self, directory: str = CACHE_DIR, enabled: bool = EMBED_CACHE_ENABLED):
+        self.directory = directory
+        self.enabled = enabled
+        self._stores: Dict[str, _ModelStore] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _store(self, model: str) -> _ModelStore:
+        store = self._stores.get(model)
+        if store is None:
+            safe = ''.join(ch if ch.isalnum() or ch in '-_.' else '_' for ch in model)
+            store = _ModelStore(os.path.join(self.directory, safe))
+            self._stores[model] = store
+        return store
+
+    def get_many(self, model: str, texts: Sequence[str]) -> List[Optional[np.ndarray]]:
+        if not self.enabled:
+            return [None] * len(texts)
+        keys = [text_key(model, t) for t in texts]
+        with self._lock:
+            out = self._store(model).get_many(keys)
+            found = sum(1 for v in out if v is not None)
+            self.hits += found
+            self.misses += len(out) - found
+        return out
+
+    def put_many(self, model: str, texts: Sequence[str], vectors: np.ndarray) -> None:
+        if not self.enabled or not len(texts):
+            return
+        keys = [text_key(model, t) for t in texts]
+        with self._lock:
+            try:
+                self._store(model).append(keys, vectors)
+            except (OSError, ValueError) as e:
+                print(f"Embedding cache write failed: {e}")
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'entries': sum(len(s.rows) for s in self._stores.values()),
+            }
+
+
+EMBED_CACHE = EmbeddingCache()
@@ -4,6 +4,10 @@ import hashlib
 from typing import Dict, Any, List, Optional
 import json
 import datetime
+import atexit
+
+from .casebase import index_cases
+from .writebehind import WriteBehindQueue
 
 # Optional MongoDB support (enabled via env var MONGO_URI)
 MONGO_URI = os.getenv('MONGO_URI') or os.getenv('MONGODB_URI')
@@ -46,7 +50,21 @@ if MONGO_RESULTS_URI:
         _mongo_results_coll = None
 
 ROOT = os.path.dirname(os.path.dirname(__file__))
-DB_PATH = os.path.join(ROOT, 'storage', 'app.db')
+DB_PATH = os.getenv('APP_DB_PATH', os.path.join(ROOT, 'storage', 'app.db'))
+
+# Write-behind persistence: writes are queued and committed in batches by a background thread
+EVIDENCE_WRITE_BEHIND = os.getenv('EVIDENCE_WRITE_BEHIND', 'on').lower() not in ('0', 'off', 'false', 'no')
+EVIDENCE_DURABLE = os.getenv('EVIDENCE_DURABLE', 'off').lower() in ('1', 'on', 'true', 'yes')
+EVIDENCE_QUEUE_MAX = int(os.getenv('EVIDENCE_QUEUE_MAX', '1000'))
+EVIDENCE_BATCH_MAX = int(os.getenv('EVIDENCE_BATCH_MAX', '64'))
+EVIDENCE_LINGER_MS = float(os.getenv('EVIDENCE_LINGER_MS', '20'))
+EVIDENCE_READ_FLUSH_TIMEOUT = float(os.getenv('EVIDENCE_READ_FLUSH_TIMEOUT', '5'))
+# Longest a durable write waits for its commit before the caller moves on (the write stays queued)
+EVIDENCE_DURABLE_TIMEOUT = float(os.getenv('EVIDENCE_DURABLE_TIMEOUT', '10'))
+# Case embeddings for the casebase are computed by their own background queue, so slow
+# embedding calls never hold up SQLite/Mongo persistence
+CASE_INDEX_QUEUE_MAX = int(os.getenv('CASE_INDEX_QUEUE_MAX', '1000'))
+CASE_INDEX_BATCH_MAX = int(os.getenv('CASE_INDEX_BATCH_MAX', '32'))
 
 SCHEMA_SQL = '''
 CREATE TABLE IF NOT EXISTS cases (
@@ -87,46 +105,167 @@ def init_db():
     with get_conn() as c:
         c.executescript(SCHEMA_SQL)
 
-class EvidenceStore:
-    def __init__(self):
-        init_db()
+def _store_original_id() -> bool:
+    return os.getenv('MONGO_STORE_ORIGINAL_ID', 'true').lower() in ('1', 'true', 'yes')
 
-    def put(self, case_id: str, data: Dict[str, Any]):
-        hashed_id = hashlib.sha256(case_id.encode()).hexdigest()
+
+def _case_rows(items: List[Dict[str, Any]]):
+    cases, agents, fused, evidence = [], [], [], []
+    for item in items:
+        hashed_id, data = item['hashed_id'], item['data']
+        cases.append((hashed_id, json.dumps(data.get('intake', {})), json.dumps(data.get('normalized', {}))))
+        for agent, output in data.get('agents', {}).items():
+            agents.append((hashed_id, agent, json.dumps(output)))
+        fused.append((hashed_id, json.dumps(data.get('fused', {}))))
+        for ev in data.get('evidence', []):
+            evidence.append((hashed_id, ev.get('type', 'misc'), json.dumps(ev)))
+    return cases, agents, fused, evidence
+
+
+def _case_doc(item: Dict[str, Any]) -> Dict[str, Any]:
+    data = item['data']
+    doc = {
+        '_id': item['hashed_id'],
+        'case_id_hash': item['hashed_id'],
+        'original_case_id': item['case_id'],  # caution: may contain PHI; set MONGO_STORE_ORIGINAL_ID=false to omit
+        'intake': data.get('intake', {}),
+        'normalized': data.get('normalized', {}),
+        'agents': data.get('agents', {}),
+        'fused': data.get('fused', {}),
+        'evidence': data.get('evidence', []),
+        'created_at': item['created_at'],
+    }
+    if not _store_original_id():
+        doc.pop('original_case_id', None)
+    return doc
+
+
+def _result_doc(item: Dict[str, Any]) -> Dict[str, Any]:
+    doc = {
+        '_id': item['hashed_id'],
+        'case_id_hash': item['hashed_id'],
+        'original_case_id': item['case_id'],
+        'result': item['result'],
+        'created_at': item['created_at'],
+    }
+    if not _store_original_id():
+        doc.pop('original_case_id', None)
+    return doc
+
+
+def _mongo_bulk(coll, ops: List[Any]) -> None:
+    if coll is None or not ops:
+        return
+    try:
+        coll.bulk_write(ops, ordered=False)
+    except Exception as e:
+        # best-effort mirror, same as the former per-document writes
+        print(f"Mongo bulk write failed: {e}")
+
+
+def write_batch(items: List[Dict[str, Any]]) -> None:
+    """Persist a batch of queued writes: one SQLite transaction, then one bulk_write per collection."""
+    cases = [i for i in items if i['op'] == 'case']
+    if cases:
+        case_rows, agent_rows, fused_rows, evidence_rows = _case_rows(cases)
         with get_conn() as c:
-            c.execute('INSERT OR REPLACE INTO cases(id, intake, normalized) VALUES(?,?,?)',
-                      (hashed_id, json.dumps(data.get('intake', {})), json.dumps(data.get('normalized', {}))))
-            for agent, output in data.get('agents', {}).items():
-                c.execute('INSERT INTO agent_outputs(case_id, agent, output) VALUES(?,?,?)',
-                          (hashed_id, agent, json.dumps(output)))
-            c.execute('INSERT INTO integrations(case_id, fused_output) VALUES(?,?)',
-                      (hashed_id, json.dumps(data.get('fused', {}))))
-            for item in data.get('evidence', []):
-                c.execute('INSERT INTO evidence_items(case_id, item_type, content) VALUES(?,?,?)',
-                          (hashed_id, item.get('type', 'misc'), json.dumps(item)))
+            c.executemany('INSERT OR REPLACE INTO cases(id, intake, normalized) VALUES(?,?,?)', case_rows)
+            c.executemany('INSERT INTO agent_outputs(case_id, agent, output) VALUES(?,?,?)', agent_rows)
+            c.executemany('INSERT INTO integrations(case_id, fused_output) VALUES(?,?)', fused_rows)
+            c.executemany('INSERT INTO evidence_items(case_id, item_type, content) VALUES(?,?,?)', evidence_rows)
             c.commit()
 
-        # Mirror to MongoDB (best-effort, non-fatal)
-        if _mongo_coll is not None:
-            try:
-                doc = {
-                    '_id': hashed_id,
-                    'case_id_hash': hashed_id,
-                    'original_case_id': case_id,  # caution: may contain PHI; set MONGO_STORE_ORIGINAL_ID=false to omit
-                    'intake': data.get('intake', {}),
-                    'normalized': data.get('normalized', {}),
-                    'agents': data.get('agents', {}),
-                    'fused': data.get('fused', {}),
-                    'evidence': data.get('evidence', []),
-                    'created_at': datetime.datetime.utcnow(),
-                }
-                if os.getenv('MONGO_STORE_ORIGINAL_ID', 'true').lower() not in ('1', 'true', 'yes'):
-                    doc.pop('original_case_id', None)
-                _mongo_coll.replace_one({'_id': hashed_id}, doc, upsert=True)
-            except Exception:
-                pass
+    if _mongo_coll is None and _mongo_results_coll is None and _mongo_cases_coll is None:
+        return
+    try:
+        from pymongo import ReplaceOne, UpdateOne
+    except Exception:
+        return
+    case_ops = [ReplaceOne({'_id': i['hashed_id']}, _case_doc(i), upsert=True) for i in cases]
+    result_ops = [ReplaceOne({'_id': i['hashed_id']}, _result_doc(i), upsert=True)
+                  for i in items if i['op'] == 'result']
+    diagnosed_ops = [UpdateOne(i['query'], {'$set': {'diagnosed': True}}, upsert=False)
+                     for i in items if i['op'] == 'diagnosed']
+    _mongo_bulk(_mongo_coll, case_ops)
+    _mongo_bulk(_mongo_results_coll, result_ops)
+    _mongo_bulk(_mongo_cases_coll, diagnosed_ops)
+
+
+def index_batch(items: List[Dict[str, Any]]) -> None:
+    """Embed a batch of stored cases for similar-case search (one embedding call)."""
+    try:
+        index_cases([(i['hashed_id'], {'intake': i['data'].get('intake', {}),
+                                       'normalized': i['data'].get('normalized', {})}) for i in items])
+    except Exception as e:
+        print(f"Case indexing failed: {e}")
+
+
+class EvidenceStore:
+    """SQLite evidence store with best-effort Mongo mirroring.
+
+    Writes (put, put_result, mark_case_diagnosed) go through a write-behind
+    queue drained by a background thread unless EVIDENCE_WRITE_BEHIND=off.
+    durable=True (or EVIDENCE_DURABLE=on) makes put() wait for the commit, for
+    up to EVIDENCE_DURABLE_TIMEOUT. Reads flush pending writes first (for up to
+    EVIDENCE_READ_FLUSH_TIMEOUT), so a put is visible to get(). Every method may
+    block: async callers run them with asyncio.to_thread. Stored cases are then
+    embedded for the casebase by a second queue.
+    """
+
+    def __init__(self, write_behind: bool = EVIDENCE_WRITE_BEHIND, durable: bool = EVIDENCE_DURABLE):
+        init_db()
+        self.durable = durable
+        self._queue = WriteBehindQueue(
+            self._write_batch,
+            max_items=EVIDENCE_QUEUE_MAX,
+            batch_max=EVIDENCE_BATCH_MAX,
+            linger=EVIDENCE_LINGER_MS / 1000.0,
+            name='evidence-writer',
+        ) if write_behind else None
+        self._indexer = WriteBehindQueue(
+            index_batch,
+            max_items=CASE_INDEX_QUEUE_MAX,
+            batch_max=CASE_INDEX_BATCH_MAX,
+            linger=EVIDENCE_LINGER_MS / 1000.0,
+            name='case-indexer',
+        )
+
+    def _write_batch(self, items: List[Dict[str, Any]]) -> None:
+        write_batch(items)
+        for item in items:
+            if item['op'] == 'case':
+                self._indexer.submit(item)
+
+    def _submit(self, item: Dict[str, Any], durable: Optional[bool] = None) -> None:
+        if self._queue is None:
+            self._write_batch([item])
+            return
+        wait = self.durable if durable is None else durable
+        if not self._queue.submit(item, wait=wait, timeout=EVIDENCE_DURABLE_TIMEOUT):
+            print(f"Evidence write not committed within {EVIDENCE_DURABLE_TIMEOUT}s; left queued")
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until queued writes are persisted. Returns False on timeout."""
+        return True if self._queue is None else self._queue.flush(timeout)
+
+    def close(self) -> None:
+        """Flush and stop the background writer (called on app shutdown and at exit)."""
+        if self._queue is not None:
+            self._queue.close()
+        self._indexer.close()
+
+    def put(self, case_id: str, data: Dict[str, Any], durable: Optional[bool] = None):
+        hashed_id = hashlib.sha256(case_id.encode()).hexdigest()
+        self._submit({
+            'op': 'case',
+            'hashed_id': hashed_id,
+            'case_id': case_id,
+            'data': data,
+            'created_at': datetime.datetime.utcnow(),
+        }, durable)
 
     def get(self, case_id: str) -> Dict[str, Any]:
+        self.flush(EVIDENCE_READ_FLUSH_TIMEOUT)
         hashed_id = hashlib.sha256(case_id.encode()).hexdigest()
         with get_conn() as c:
             case_row = c.execute('SELECT intake, normalized FROM cases WHERE id=?', (hashed_id,)).fetchone()
@@ -151,7 +290,7 @@ class EvidenceStore:
                 agents[row[0]] = json.loads(row[1])
             fused_row = c.execute('SELECT fused_output FROM integrations WHERE case_id=?', (hashed_id,)).fetchone()
             fused = json.loads(fused_row[0]) if fused_row else {}
-            evidence = [json.loads(row[2]) for row in c.execute('SELECT content FROM evidence_items WHERE case_id=?', (hashed_id,))]
+            evidence = [json.loads(row[0]) for row in c.execute('SELECT content FROM evidence_items WHERE case_id=?', (hashed_id,))]
             return {
                 'intake': json.loads(case_row[0]),
                 'normalized': json.loads(case_row[1]),
@@ -164,21 +303,13 @@ class EvidenceStore:
         """Store the exact response payload for a case in the results collection (Mongo only)."""
         if _mongo_results_coll is None:
             return
-        try:
-            hashed_id = hashlib.sha256(case_id.encode()).hexdigest()
-            doc = {
-                '_id': hashed_id,
-                'case_id_hash': hashed_id,
-                'original_case_id': case_id,
-                'result': result,
-                'created_at': datetime.datetime.utcnow(),
-            }
-            if os.getenv('MONGO_STORE_ORIGINAL_ID', 'true').lower() not in ('1', 'true', 'yes'):
-                doc.pop('original_case_id', None)
-            _mongo_results_coll.replace_one({'_id': hashed_id}, doc, upsert=True)
-        except Exception:
-            # best-effort only
-            pass
+        self._submit({
+            'op': 'result',
+            'hashed_id': hashlib.sha256(case_id.encode()).hexdigest(),
+            'case_id': case_id,
+            'result': result,
+            'created_at': datetime.datetime.utcnow(),
+        })
 
     # -------- Mongo helpers for API endpoints --------
     def mark_case_diagnosed(self, patient_id: Optional[str] = None, case_id: Optional[str] = None) -> None:
@@ -188,18 +319,15 @@ class EvidenceStore:
         """
         if _mongo_cases_coll is None:
             return
-        try:
-            filters = []
-            if patient_id:
-                filters.append({'patient_id': patient_id})
-            if case_id:
-                filters.append({'case_id': case_id})
-            if not filters:
-                return
-            query = {'$or': filters} if len(filters) > 1 else filters[0]
-            _mongo_cases_coll.update_one(query, {'$set': {'diagnosed': True}}, upsert=False)
-        except Exception:
-            pass
+        filters = []
+        if patient_id:
+            filters.append({'patient_id': patient_id})
+        if case_id:
+            filters.append({'case_id': case_id})
+        if not filters:
+            return
+        query = {'$or': filters} if len(filters) > 1 else filters[0]
+        self._submit({'op': 'diagnosed', 'query': query})
 
     def get_case_doc(self, patient_or_case_id: str) -> Dict[str, Any]:
         """Fetch the raw case document from Mongo 'cases' by patient_id or case_id. Returns {} if not found."""
@@ -225,6 +353,7 @@ class EvidenceStore:
         """Fetch the stored diagnosed result payload for a case from Mongo. Returns {} if not found."""
         if _mongo_results_coll is None:
             return {}
+        self.flush(EVIDENCE_READ_FLUSH_TIMEOUT)
         try:
             hashed_id = hashlib.sha256(case_id.encode()).hexdigest()
             doc = _mongo_results_coll.find_one({'_id': hashed_id})
@@ -237,3 +366,4 @@ class EvidenceStore:
             return {}
 
 EVIDENCE = EvidenceStore()
+atexit.register(EVIDENCE.close)
@@ -0,0 +1,33 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterator
+
+try:
+    import fcntl  # type: ignore
+except Exception:
+    fcntl = None  # Windows: only threads of this process are serialized
+
+_local_locks: Dict[str, threading.Lock] = {}
+_local_guard = threading.Lock()
+
+
+@contextmanager
+def locked(path: str) -> Iterator[None]:
+    """Exclusive lock on `path` (created if missing) across threads and processes.
+
+    The on-disk stores shared by the API and the job workers take it around
+    every write, so appends from different processes never interleave.
+    """
+    with _local_guard:
+        local = _local_locks.setdefault(path, threading.Lock())
+    with local:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'a+b') as f:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f.fileno(), fcntl.LOCK_UN)
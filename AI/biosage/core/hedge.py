@@ -0,0 +1,105 @@
+import os
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+# Hedged chat completions: when a call has not answered after the
+# LLM_HEDGE_PERCENTILE latency of recent calls to the same model, a duplicate is
+# sent (to the next provider in LLM_HEDGE_PROVIDERS) and the first answer wins.
+LLM_HEDGE = os.getenv('LLM_HEDGE', 'off').lower() in ('1', 'on', 'true', 'yes')
+LLM_HEDGE_PERCENTILE = float(os.getenv('LLM_HEDGE_PERCENTILE', '0.95'))
+# Recent latencies kept per (provider, model), and how many are needed before hedging
+LLM_HEDGE_WINDOW = int(os.getenv('LLM_HEDGE_WINDOW', '200'))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv('LLM_HEDGE_MIN_SAMPLES', '20'))
+# Never hedge earlier than this, whatever the percentile says
+LLM_HEDGE_MIN_DELAY_MS = float(os.getenv('LLM_HEDGE_MIN_DELAY_MS', '500'))
+# Extra spend cap: hedges may be at most this fraction of primary calls
+# (up to LLM_HEDGE_BURST hedges can be banked while traffic is calm)
+LLM_HEDGE_BUDGET = float(os.getenv('LLM_HEDGE_BUDGET', '0.1'))
+LLM_HEDGE_BURST = float(os.getenv('LLM_HEDGE_BURST', '5'))
+# Where duplicates go, in order; empty = the primary provider again
+LLM_HEDGE_PROVIDERS = [p.strip() for p in os.getenv('LLM_HEDGE_PROVIDERS', '').split(',') if p.strip()]
+# Duplicates per call at most (1 = one hedge)
+LLM_HEDGE_MAX = int(os.getenv('LLM_HEDGE_MAX', '1'))
+
+
+class LatencyWindow:
+    """Rolling window of recent call latencies (seconds) per (provider, model)."""
+
+    def __init__(self, size: int = LLM_HEDGE_WINDOW):
+        self.size = size
+        self._lock = threading.Lock()
+        self._samples: Dict[Tuple[str, str], Deque[float]] = {}
+
+    def observe(self, provider: str, model: str, seconds: float) -> None:
+        with self._lock:
+            window = self._samples.get((provider, model))
+            if window is None:
+                window = self._samples[(provider, model)] = deque(maxlen=self.size)
+            window.append(seconds)
+
+    def percentile(self, provider: str, model: str, q: float, min_samples: int = 1) -> Optional[float]:
+        with self._lock:
+            window = self._samples.get((provider, model))
+            if window is None or len(window) < max(1, min_samples):
+                return None
+            ordered = sorted(window)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class HedgeBudget:
+    """Credits for duplicate requests: each primary call earns `ratio`, each hedge spends 1."""
+
+    def __init__(self, ratio: float = LLM_HEDGE_BUDGET, burst: float = LLM_HEDGE_BURST):
+        self.ratio = ratio
+        self.burst = burst
+        self._lock = threading.Lock()
+        self.credits = 0.0
+        self.primaries = 0
+        self.hedges = 0
+
+    def earn(self) -> None:
+        with self._lock:
+            self.primaries += 1
+            self.credits = min(self.burst, self.credits + self.ratio)
+
+    def spend(self) -> bool:
+        with self._lock:
+            if self.credits < 1.0 - 1e-9:  # ten credits of 0.1 sum to just under 1
+                return False
+            self.credits -= 1.0
+            self.hedges += 1
+            return True
+
+
+class HedgePolicy:
+    """When to hedge a chat completion and where to send the duplicate."""
+
+    def __init__(self, enabled: bool = LLM_HEDGE, percentile: float = LLM_HEDGE_PERCENTILE,
+                 min_samples: int = LLM_HEDGE_MIN_SAMPLES, min_delay: float = LLM_HEDGE_MIN_DELAY_MS / 1000.0,
+                 providers: Optional[List[str]] = None, max_hedges: int = LLM_HEDGE_MAX):
+        self.enabled = enabled
+        self.q = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.providers = list(LLM_HEDGE_PROVIDERS if providers is None else providers)
+        self.max_hedges = max_hedges
+        self.latency = LatencyWindow()
+        self.budget = HedgeBudget()
+
+    def delay(self, provider: str, model: str) -> Optional[float]:
+        """Seconds to wait before the first duplicate, or None to not hedge this call."""
+        if not self.enabled or self.max_hedges <= 0:
+            return None
+        p = self.latency.percentile(provider, model, self.q, self.min_samples)
+        if p is None:
+            return None  # not enough history yet
+        return max(self.min_delay, p)
+
+    def targets(self, provider: str) -> List[str]:
+        """Providers for the duplicates of a call to `provider`, in order."""
+        pool = self.providers or [provider]
+        return [pool[i % len(pool)] for i in range(self.max_hedges)]
+
+
+HEDGE = HedgePolicy()
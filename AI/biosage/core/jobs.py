@@ -0,0 +1,255 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+DB_PATH = os.getenv('JOBS_DB_PATH', os.path.join(ROOT, 'storage', 'jobs.db'))
+
+# A claimed job is invisible to other workers for this long; workers renew the
+# lease while running, so only a crashed or stuck worker lets it lapse.
+JOB_VISIBILITY_TIMEOUT = float(os.getenv('JOB_VISIBILITY_TIMEOUT', '120'))
+JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', '3'))
+JOB_RETRY_BACKOFF = float(os.getenv('JOB_RETRY_BACKOFF', '5'))
+JOB_POLL_INTERVAL = float(os.getenv('JOB_POLL_INTERVAL', '0.5'))
+# In-process workers started with the API (0 = run scripts/job_worker.py separately)
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '2'))
+
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS jobs (
+  id TEXT PRIMARY KEY,
+  status TEXT NOT NULL,
+  payload TEXT NOT NULL,
+  attempts INTEGER NOT NULL DEFAULT 0,
+  max_attempts INTEGER NOT NULL,
+  visible_at REAL NOT NULL,
+  lease_owner TEXT,
+  partial TEXT NOT NULL DEFAULT '{}',
+  result TEXT,
+  error TEXT,
+  created_at REAL NOT NULL,
+  updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(status, visible_at);
+'''
+
+
+class JobQueue:
+    """Durable job queue in a SQLite table, safe to share between processes.
+
+    Status flow: queued -> running -> done | failed. A running job whose lease
+    (visible_at) lapsed is claimed again; a failed attempt is re-queued after
+    a backoff until max_attempts is reached.
+    """
+
+    def __init__(self, path: str = DB_PATH, visibility_timeout: float = JOB_VISIBILITY_TIMEOUT,
+                 max_attempts: int = JOB_MAX_ATTEMPTS):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        self._initialized = False
+
+    def _conn(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=10.0, isolation_level=None)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL;')
+            conn.executescript(SCHEMA_SQL)
+            self._initialized = True
+        return conn
+
+    def enqueue(self, payload: Dict[str, Any]) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        conn = self._conn()
+        try:
+            conn.execute('INSERT INTO jobs(id, status, payload, max_attempts, visible_at, created_at, updated_at) '
+                         'VALUES(?,?,?,?,?,?,?)',
+                         (job_id, 'queued', json.dumps(payload), self.max_attempts, now, now, now))
+        finally:
+            conn.close()
+        return job_id
+
+    def claim(self, owner: str) -> Optional[Dict[str, Any]]:
+        """Lease the oldest visible job to `owner`. Returns {'id', 'payload', 'attempts'} or None."""
+        now = time.time()
+        conn = self._conn()
+        try:
+            # IMMEDIATE takes the write lock up front, so two workers never claim the same row
+            conn.execute('BEGIN IMMEDIATE')
+            conn.execute("UPDATE jobs SET status='failed', error='visibility timeout exceeded', lease_owner=NULL, "
+                         "updated_at=? WHERE status='running' AND visible_at<=? AND attempts>=max_attempts",
+                         (now, now))
+            row = conn.execute("SELECT id, payload, attempts FROM jobs WHERE status IN ('queued','running') "
+                               "AND visible_at<=? ORDER BY created_at LIMIT 1", (now,)).fetchone()
+            if row is None:
+                conn.execute('COMMIT')
+                return None
+            conn.execute("UPDATE jobs SET status='running', attempts=attempts+1, lease_owner=?, visible_at=?, "
+                         "partial='{}', updated_at=? WHERE id=?",
+                         (owner, now + self.visibility_timeout, now, row[0]))
+            conn.execute('COMMIT')
+            return {'id': row[0], 'payload': json.loads(row[1]), 'attempts': row[2] + 1}
+        except Exception:
+            # BEGIN itself may have failed (database locked): a ROLLBACK then would hide the error
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+
+    def _update(self, sql: str, params: tuple) -> bool:
+        conn = self._conn()
+        try:
+            return conn.execute(sql, params).rowcount > 0
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id: str, owner: str) -> bool:
+        """Extend the lease; False means the job was reclaimed by someone else."""
+        now = time.time()
+        return self._update("UPDATE jobs SET visible_at=?, updated_at=? WHERE id=? AND lease_owner=? "
+                            "AND status='running'", (now + self.visibility_timeout, now, job_id, owner))
+
+    def save_partial(self, job_id: str, owner: str, key: str, value: Any) -> bool:
+        return self._update("UPDATE jobs SET partial=json_set(partial, '$.' || ?, json(?)), updated_at=? "
+                            "WHERE id=? AND lease_owner=? AND status='running'",
+                            (key, json.dumps(value), time.time(), job_id, owner))
+
+    def complete(self, job_id: str, owner: str, result: Dict[str, Any]) -> bool:
+        return self._update("UPDATE jobs SET status='done', result=?, error=NULL, lease_owner=NULL, updated_at=? "
+                            "WHERE id=? AND lease_owner=?", (json.dumps(result), time.time(), job_id, owner))
+
+    def fail(self, job_id: str, owner: str, error: str) -> bool:
+        """Record a failed attempt: re-queue with backoff, or mark failed once attempts run out."""
+        now = time.time()
+        return self._update("UPDATE jobs SET status=CASE WHEN attempts>=max_attempts THEN 'failed' ELSE 'queued' END, "
+                            "visible_at=? + ? * attempts, error=?, lease_owner=NULL, updated_at=? "
+                            "WHERE id=? AND lease_owner=?",
+                            (now, JOB_RETRY_BACKOFF, error, now, job_id, owner))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        conn = self._conn()
+        try:
+            row = conn.execute('SELECT id, status, attempts, max_attempts, partial, result, error, created_at, '
+                               'updated_at FROM jobs WHERE id=?', (job_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {
+            'id': row[0],
+            'status': row[1],
+            'attempts': row[2],
+            'max_attempts': row[3],
+            'partial': json.loads(row[4] or '{}'),
+            'result': json.loads(row[5]) if row[5] else None,
+            'error': row[6],
+            'created_at': row[7],
+            'updated_at': row[8],
+        }
+
+
+JOBS = JobQueue()
+
+
+class JobWorkerPool:
+    """Async workers that claim jobs from a JobQueue and run `handler` on them.
+
+    handler(payload, on_partial) returns the job result; on_partial(key, value)
+    stores an intermediate value (e.g. one agent's output) on the job row in
+    the background, in call order, before the job completes.
+    Runs in the API process (JOB_WORKERS) or standalone via scripts/job_worker.py.
+    """
+
+    def __init__(self, handler: Callable[[Dict[str, Any], Callable[[str, Any], None]], Awaitable[Dict[str, Any]]],
+                 queue: JobQueue = JOBS, workers: int = JOB_WORKERS, poll_interval: float = JOB_POLL_INTERVAL):
+        self.handler = handler
+        self.queue = queue
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._wake: Optional[asyncio.Event] = None
+
+    def start(self) -> None:
+        self._wake = asyncio.Event()
+        prefix = f"{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self._tasks = [asyncio.create_task(self._run(f"{prefix}-{i}")) for i in range(self.workers)]
+
+    def wake(self) -> None:
+        """Skip the poll delay after a local enqueue."""
+        if self._wake is not None:
+            self._wake.set()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _heartbeat(self, job_id: str, owner: str) -> None:
+        while True:
+            await asyncio.sleep(self.queue.visibility_timeout / 3)
+            try:
+                await asyncio.to_thread(self.queue.heartbeat, job_id, owner)
+            except Exception as e:
+                # Keep beating: a lapsed lease would hand the running job to another worker
+                print(f"Job {job_id} heartbeat failed: {e}")
+
+    async def _run(self, owner: str) -> None:
+        while True:
+            try:
+                job = await asyncio.to_thread(self.queue.claim, owner)
+            except Exception as e:
+                print(f"Job claim failed: {e}")
+                job = None
+            if job is None:
+                self._wake.clear()
+                try:
+                    await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            await self.run_job(job, owner)
+
+    async def run_job(self, job: Dict[str, Any], owner: str) -> None:
+        job_id = job['id']
+        saving: Optional[asyncio.Task] = None
+
+        async def save(prev: Optional[asyncio.Task], key: str, value: Any) -> None:
+            if prev is not None:
+                await asyncio.gather(prev, return_exceptions=True)  # keep this job's partials in order
+            try:
+                await asyncio.to_thread(self.queue.save_partial, job_id, owner, key, value)
+            except Exception as e:
+                print(f"Saving partial job result failed: {e}")
+
+        def on_partial(key: str, value: Any) -> None:
+            # Called on the event loop: the SQLite write (which may wait on another
+            # process's lock) runs in a thread and the caller does not wait for it
+            nonlocal saving
+            saving = asyncio.ensure_future(save(saving, key, value))
+
+        async def saved() -> None:
+            if saving is not None:
+                await asyncio.gather(saving, return_exceptions=True)
+
+        beat = asyncio.create_task(self._heartbeat(job_id, owner))
+        try:
+            result = await self.handler(job['payload'], on_partial)
+            await saved()
+            await asyncio.to_thread(self.queue.complete, job_id, owner, result)
+        except asyncio.CancelledError:
+            # Shutdown: the lease lapses and another worker picks the job up
+            if saving is not None:
+                saving.cancel()
+            raise
+        except Exception as e:
+            print(f"Job {job_id} attempt {job['attempts']} failed: {e}")
+            await saved()
+            await asyncio.to_thread(self.queue.fail, job_id, owner, str(e))
+        finally:
+            beat.cancel()
@@ -0,0 +1,91 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class _Frame:
+    __slots__ = ('kind', 'key', 'start', 'expect_key', 'pending_key')
+
+    def __init__(self, kind: str, key: Optional[str], start: int):
+        self.kind = kind            # 'obj' or 'arr'
+        self.key = key              # key this container sits under in its parent object
+        self.start = start
+        self.expect_key = kind == 'obj'
+        self.pending_key: Optional[str] = None
+
+
+class CandidateStream:
+    """Incremental parser for `"candidates": [{...}, ...]` arrays in streamed JSON.
+
+    feed() takes the next chunk of model output and returns the candidate objects
+    that closed within it, as (owner, item): owner is the key of the object
+    holding the array (None for the top-level specialist answer, the agent name
+    for a panel answer). Only structure is tracked until an object closes, which
+    is then decoded with json.loads, so each chunk costs time linear in its size.
+    """
+
+    def __init__(self, array_key: str = 'candidates'):
+        self.array_key = array_key
+        self.buf = ''
+        self.pos = 0
+        self.stack: List[_Frame] = []
+        self.in_string = False
+        self.escape = False
+        self.string_start = 0
+        self.done = False  # the outermost value has closed
+
+    def feed(self, chunk: str) -> List[Tuple[Optional[str], Dict[str, Any]]]:
+        self.buf += chunk
+        out: List[Tuple[Optional[str], Dict[str, Any]]] = []
+        buf, stack = self.buf, self.stack
+        i = self.pos
+        while i < len(buf) and not self.done:
+            ch = buf[i]
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif ch == '\\':
+                    self.escape = True
+                elif ch == '"':
+                    self.in_string = False
+                    top = stack[-1] if stack else None
+                    if top is not None and top.kind == 'obj' and top.expect_key:
+                        try:
+                            top.pending_key = json.loads(buf[self.string_start:i + 1])
+                        except ValueError:
+                            top.pending_key = None
+            elif ch == '"':
+                self.in_string = True
+                self.string_start = i
+            elif ch in '{[':
+                parent = stack[-1] if stack else None
+                key = parent.pending_key if parent is not None and parent.kind == 'obj' else None
+                stack.append(_Frame('obj' if ch == '{' else 'arr', key, i))
+            elif ch in '}]':
+                if stack:
+                    frame = stack.pop()
+                    parent = stack[-1] if stack else None
+                    if (frame.kind == 'obj' and parent is not None and parent.kind == 'arr'
+                            and parent.key == self.array_key):
+                        try:
+                            item = json.loads(buf[frame.start:i + 1])
+                        except ValueError:
+                            item = None
+                        if isinstance(item, dict):
+                            owner = stack[-2].key if len(stack) >= 2 else None
+                            out.append((owner, item))
+                    if not stack:
+                        self.done = True
+            elif ch == ':':
+                if stack and stack[-1].kind == 'obj':
+                    stack[-1].expect_key = False
+            elif ch == ',':
+                if stack and stack[-1].kind == 'obj':
+                    stack[-1].expect_key = True
+                    stack[-1].pending_key = None
+            i += 1
+        self.pos = i
+        return out
+
+    @property
+    def text(self) -> str:
+        return self.buf
@@ -1,12 +1,16 @@
 import os
+import re
 import sqlite3
-from typing import List, Tuple, Dict, Any, Optional
+import threading
+from typing import List, Tuple, Dict, Any, Optional, Set, Iterable
 import networkx as nx
 import numpy as np
 
+from .normalize import SYMPTOM_MAP
+
 ROOT = os.path.dirname(os.path.dirname(__file__))
-DB_PATH = os.path.join(ROOT, 'storage', 'kg.db')
-GRAPHML_PATH = os.path.join(ROOT, 'storage', 'kg.graphml')
+DB_PATH = os.getenv('KG_DB_PATH', os.path.join(ROOT, 'storage', 'kg.db'))
+GRAPHML_PATH = os.getenv('KG_GRAPHML_PATH', os.path.join(ROOT, 'storage', 'kg.graphml'))
 
 SCHEMA_SQL = '''
 CREATE TABLE IF NOT EXISTS entities (
@@ -32,8 +36,17 @@ CREATE TABLE IF NOT EXISTS tests (
   cost REAL DEFAULT 1.0,
   risk REAL DEFAULT 1.0
 );
+CREATE TABLE IF NOT EXISTS kg_meta (
+  key TEXT PRIMARY KEY,
+  value INTEGER NOT NULL
+);
 '''
 
+# In-process graph cache, keyed on the KG version (see kg_version)
+_graph_cache: Dict[str, Any] = {'version': None, 'graph': None, 'index': None}
+_graph_lock = threading.Lock()
+_db_ready = False
+
 
 def get_conn():
     os.makedirs(os.path.dirname(DB_PATH), exist_ok=True)
@@ -43,8 +56,23 @@ def get_conn():
 
 
 def init_db():
+    global _db_ready
     with get_conn() as c:
         c.executescript(SCHEMA_SQL)
+    _db_ready = True
+
+
+def _bump_version(c) -> None:
+    c.execute("INSERT INTO kg_meta(key, value) VALUES('version', 1) "
+              "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+
+
+def kg_version(c) -> Tuple[int, int, int]:
+    """Cheap change token: the write counter plus the highest entity/relation ids."""
+    row = c.execute("SELECT value FROM kg_meta WHERE key='version'").fetchone()
+    max_entity = c.execute('SELECT COALESCE(MAX(id), 0) FROM entities').fetchone()[0]
+    max_relation = c.execute('SELECT COALESCE(MAX(id), 0) FROM relations').fetchone()[0]
+    return (row[0] if row else 0, max_entity, max_relation)
 
 
 def upsert_entity(c, name: str, typ: str) -> int:
@@ -53,32 +81,160 @@ def upsert_entity(c, name: str, typ: str) -> int:
     if row:
         return row[0]
     cur = c.execute('INSERT INTO entities(name, type) VALUES(?,?)', (name, typ))
+    _bump_version(c)
     return cur.lastrowid
 
 
 def add_relation(c, src_id: int, rel: str, dst_id: int, source_doc: Optional[str] = None, weight: float = 1.0):
     c.execute('INSERT INTO relations(src, rel, dst, source_doc, weight) VALUES(?,?,?,?,?)',
               (src_id, rel, dst_id, source_doc, weight))
+    _bump_version(c)
 
 
-def to_networkx() -> nx.MultiDiGraph:
-    init_db()
-    with get_conn() as c:
-        G = nx.MultiDiGraph()
-        for (eid, name, typ) in c.execute('SELECT id,name,type FROM entities'):
-            G.add_node(eid, name=name, type=typ)
-        for (src, rel, dst, source_doc, weight) in c.execute('SELECT src,rel,dst,source_doc,weight FROM relations'):
-            G.add_edge(src, dst, rel=rel, source_doc=source_doc, weight=weight)
+def _build_graph(c) -> nx.MultiDiGraph:
+    G = nx.MultiDiGraph()
+    for (eid, name, typ) in c.execute('SELECT id,name,type FROM entities'):
+        G.add_node(eid, name=name, type=typ)
+    for (src, rel, dst, source_doc, weight) in c.execute('SELECT src,rel,dst,source_doc,weight FROM relations'):
+        G.add_edge(src, dst, rel=rel, source_doc=source_doc, weight=weight)
+    return G
+
+
+def _name_key(name: str) -> str:
+    return ' '.join(str(name).lower().split())
+
+
+def _alias_keys(name: str) -> List[str]:
+    """Looser keys for a KG name: without the parenthetical, and each '/' alternative.
+
+    'Chest pain (pressure-like)' -> ['chest pain']; 'Rigors/chills' -> ['rigors', 'chills'].
+    """
+    base = re.sub(r'\s*\([^)]*\)', '', str(name))
+    parts = [base] + (base.split('/') if '/' in base else [])
+    keys = [_name_key(p) for p in parts]
+    return [k for k in dict.fromkeys(keys) if k and k != _name_key(name)]
+
+
+class KGIndex:
+    """Lookup tables built alongside a graph: exact name, lower-cased/synonym key and type."""
+
+    def __init__(self, G: nx.Graph):
+        self.by_name: Dict[str, List[Any]] = {}
+        self.by_key: Dict[str, List[Any]] = {}
+        self.by_type: Dict[str, Set[Any]] = {}
+        for n, d in G.nodes(data=True):
+            name = d.get('name')
+            if name is not None:
+                self.by_name.setdefault(name, []).append(n)
+                self.by_key.setdefault(_name_key(name), []).append(n)
+            self.by_type.setdefault(d.get('type'), set()).add(n)
+        # Shortened names ('chills' for 'Rigors/chills') unless they are a node's exact name
+        exact_keys = set(self.by_key)
+        for n, d in G.nodes(data=True):
+            for key in _alias_keys(d.get('name') or ''):
+                if key not in exact_keys:
+                    self.by_key.setdefault(key, []).append(n)
+        # Intake synonyms (e.g. 'sob' -> 'Dyspnea') resolve to the canonical term's nodes
+        for term, (canonical, _code) in SYMPTOM_MAP.items():
+            key = _name_key(term)
+            nodes = self.by_key.get(_name_key(canonical))
+            if nodes and key not in self.by_key:
+                self.by_key[key] = nodes
+
+    def nodes_by_name(self, name: str, exact: bool = False) -> List[Any]:
+        nodes = self.by_name.get(name)
+        if nodes or exact:
+            return list(nodes or [])
+        return list(self.by_key.get(_name_key(name), []))
+
+    def nodes_by_type(self, typ: str) -> Set[Any]:
+        return self.by_type.get(typ, set())
+
+
+def kg_index(G: Optional[nx.Graph] = None) -> KGIndex:
+    """Index for G (defaults to the cached KG); cached graphs reuse their prebuilt index."""
+    if G is None:
+        G = to_networkx()
+    with _graph_lock:
+        if G is _graph_cache['graph'] and _graph_cache['index'] is not None:
+            return _graph_cache['index']
+    return KGIndex(G)
+
+
+def neighbors_by_name(name: str, rels: Optional[Iterable[str]] = None, G: Optional[nx.Graph] = None,
+                      limit: Optional[int] = None) -> List[Tuple[str, str, str]]:
+    """Edges touching the node(s) named `name` as (src_name, rel, dst_name) triples.
+
+    Matches exact names first, then lower-cased/synonym keys. Work is
+    proportional to the degree of the matched nodes. `rels` restricts the
+    relation types; `limit` stops after that many distinct triples.
+    """
+    if G is None:
+        G = to_networkx()
+    index = kg_index(G)
+    wanted = set(rels) if rels is not None else None
+    out: List[Tuple[str, str, str]] = []
+    seen: Set[Tuple[str, str, str]] = set()
+    for n in index.nodes_by_name(name):
+        edges = [(n, v, e) for _, v, e in G.out_edges(n, data=True)] + [(u, n, e) for u, _, e in G.in_edges(n, data=True)]
+        for u, v, edata in edges:
+            rel = edata.get('rel', 'rel')
+            if wanted is not None and rel not in wanted:
+                continue
+            triple = (G.nodes[u].get('name'), rel, G.nodes[v].get('name'))
+            if triple in seen:
+                continue
+            seen.add(triple)
+            out.append(triple)
+            if limit is not None and len(out) >= limit:
+                return out
+    return out
+
+
+def export_graphml(G: Optional[nx.MultiDiGraph] = None, path: Optional[str] = None) -> None:
+    if G is None:
+        G = to_networkx()
     try:
-        nx.write_graphml(G, GRAPHML_PATH)
+        nx.write_graphml(G, path or GRAPHML_PATH)
     except Exception:
         pass
+
+
+def _graphml_stale() -> bool:
+    try:
+        return os.path.getmtime(GRAPHML_PATH) < os.path.getmtime(DB_PATH)
+    except OSError:
+        return True
+
+
+def to_networkx(export: bool = False) -> nx.MultiDiGraph:
+    """Return the KG as a MultiDiGraph, rebuilt only when kg_version() changes.
+
+    The graph is shared between callers, so treat it as read-only. GraphML is
+    written only when the graph was rebuilt and kg.db is newer than the export,
+    or when export=True.
+    """
+    if not _db_ready:
+        init_db()
+    with get_conn() as c:
+        version = kg_version(c)
+        with _graph_lock:
+            G = _graph_cache['graph']
+            rebuilt = G is None or _graph_cache['version'] != version
+            if rebuilt:
+                G = _build_graph(c)
+                _graph_cache['graph'] = G
+                _graph_cache['index'] = KGIndex(G)
+                _graph_cache['version'] = version
+    if export or (rebuilt and _graphml_stale()):
+        export_graphml(G)
     return G
 
 
 def paths_between(G: nx.Graph, a_name: str, b_name: str, max_hops: int = 3) -> List[List[str]]:
-    a_nodes = [n for n, d in G.nodes(data=True) if d.get('name') == a_name]
-    b_nodes = [n for n, d in G.nodes(data=True) if d.get('name') == b_name]
+    index = kg_index(G)
+    a_nodes = index.nodes_by_name(a_name)
+    b_nodes = index.nodes_by_name(b_name)
     paths: List[List[str]] = []
     for a in a_nodes:
         for b in b_nodes:
@@ -100,9 +256,8 @@ def suggest_next_best_test(G: nx.Graph, hypotheses: List[str], observed: List[st
         # Fallback to vote-count
         test_votes: Dict[str, int] = {}
         edges: List[List[str]] = []
-        for n, d in G.nodes(data=True):
-            if d.get('type') == 'Test':
-                test_votes[d['name']] = 0
+        for n in kg_index(G).nodes_by_type('Test'):
+            test_votes[G.nodes[n]['name']] = 0
         for u, v, edata in G.edges(data=True):
             if edata.get('rel') == 'suggests_test':
                 src_name = G.nodes[u]['name']
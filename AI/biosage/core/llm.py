@@ -1,15 +1,35 @@
 import os
 import json
-from typing import List, Dict, Any
+import time
+import asyncio
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, AsyncIterator, Tuple
+import numpy as np
 from dotenv import load_dotenv
 
 from .redact import redact_phi
+from .llmcache import LLM_CACHE
+from .embedcache import EMBED_CACHE
+from .cassette import CASSETTE
+from .metrics import LLM_CALLS
+from .admission import ADMISSION, LLM_EXPECTED_COMPLETION_TOKENS
+from .tokenbudget import count_tokens
+from .singleflight import FLIGHTS, flight_key
+from .hedge import HEDGE
+from .router import ROUTER, LLMUnavailableError
 
 load_dotenv()
 
-# Providers (locked to OpenAI per new architecture)
-REAS_PROVIDER = 'openai'
+# Chat completions are routed across LLM_PROVIDERS, fastest healthy backend first
+# (core/router.py); REAS_PROVIDER is the primary one (default model, cache keys).
+# Embeddings stay on one provider: vectors from different models do not mix.
+REAS_PROVIDER = os.getenv('REAS_PROVIDER', 'openai')
 EMBED_PROVIDER = 'openai'
+LLM_PROVIDERS = [p.strip() for p in os.getenv('LLM_PROVIDERS', REAS_PROVIDER).split(',') if p.strip()]
+# Retries inside the OpenAI SDK (unset: 2, or 0 with several providers, so a failure
+# reaches the router at once and it can fail over)
+LLM_CLIENT_MAX_RETRIES = int(os.getenv('LLM_CLIENT_MAX_RETRIES') or (0 if len(LLM_PROVIDERS) > 1 else 2))
 
 # OpenAI defaults
 OPENAI_REAS_MODEL = os.getenv('OPENAI_REAS_MODEL', 'gpt-4o')
@@ -26,17 +46,43 @@ VLLM_BASE_URL = os.getenv('VLLM_BASE_URL', 'http://localhost:8000/v1')
 VLLM_REAS_MODEL = os.getenv('VLLM_REAS_MODEL', 'microsoft/BioGPT-Large')  # example biomed model
 VLLM_EMBED_MODEL = os.getenv('VLLM_EMBED_MODEL', 'microsoft/BioGPT-Large')  # assuming embedding support
 
+# Deployment serving a model on a secondary provider, e.g.
+# "azure:gpt-4o-mini=gpt4o-mini-eu,vllm_local:gpt-4o=meta-llama/Llama-3.1-70B-Instruct";
+# unmapped models fall back to that provider's reasoning model
+LLM_MODEL_ALIASES: Dict[Tuple[str, str], str] = {}
+for _alias in os.getenv('LLM_MODEL_ALIASES', '').split(','):
+    if ':' in _alias and '=' in _alias:
+        _provider, _rest = _alias.split(':', 1)
+        _model, _deployment = _rest.split('=', 1)
+        LLM_MODEL_ALIASES[(_provider.strip(), _model.strip())] = _deployment.strip()
+
+# Embedding batching: inputs are packed by an estimated token budget and the
+# batches are sent concurrently; a failed batch is retried on its own.
+EMBED_BATCH_TOKENS = int(os.getenv('EMBED_BATCH_TOKENS', '60000'))
+EMBED_BATCH_MAX_ITEMS = int(os.getenv('EMBED_BATCH_MAX_ITEMS', '512'))
+EMBED_CONCURRENCY = int(os.getenv('EMBED_CONCURRENCY', '4'))
+EMBED_MAX_RETRIES = int(os.getenv('EMBED_MAX_RETRIES', '3'))
+
+# Chat completions rejected with 429 are re-queued through ADMISSION this many
+# times before LLMRateLimitError is raised
+LLM_RATE_LIMIT_RETRIES = int(os.getenv('LLM_RATE_LIMIT_RETRIES', '4'))
+
 # Clients
 _openai_client = None
 _azure_client = None
 _vllm_client = None
 
+# Async clients are shared by every coroutine on the running event loop so that
+# concurrent agents reuse the same pooled keep-alive connections.
+_async_clients: Dict[str, Any] = {}
+_async_clients_loop = None
+
 def _get_openai_client():
     global _openai_client
     if _openai_client is None:
         try:
             from openai import OpenAI
-            _openai_client = OpenAI()
+            _openai_client = OpenAI(max_retries=LLM_CLIENT_MAX_RETRIES)
         except Exception:
             raise RuntimeError('OpenAI client not configured. Set OPENAI_API_KEY')
     return _openai_client
@@ -49,7 +95,8 @@ def _get_azure_client():
             _azure_client = AzureOpenAI(
                 azure_endpoint=AZURE_OPENAI_ENDPOINT,
                 api_key=AZURE_OPENAI_KEY,
-                api_version="2024-02-01"
+                api_version="2024-02-01",
+                max_retries=LLM_CLIENT_MAX_RETRIES,
             )
         except Exception:
             raise RuntimeError('Azure OpenAI client not configured. Set AZURE_OPENAI_ENDPOINT and AZURE_OPENAI_KEY')
@@ -60,62 +107,629 @@ def _get_vllm_client():
     if _vllm_client is None:
         try:
             from openai import OpenAI
-            _vllm_client = OpenAI(base_url=VLLM_BASE_URL, api_key="not-needed")
+            _vllm_client = OpenAI(base_url=VLLM_BASE_URL, api_key="not-needed", max_retries=LLM_CLIENT_MAX_RETRIES)
         except Exception:
             raise RuntimeError('vLLM client not configured. Ensure vLLM server is running at VLLM_BASE_URL')
     return _vllm_client
 
-def reason(messages: List[Dict[str, str]], model: str = None, **kwargs) -> str:
-    """Reasoning LLM call. Returns response content."""
-    # Redact PHI from messages
-    redacted_messages = []
-    for msg in messages:
-        redacted_content = redact_phi(msg.get('content', ''))
-        redacted_messages.append({'role': msg['role'], 'content': redacted_content})
-
-    provider = REAS_PROVIDER
-    # Set default timeout if not provided
-    kwargs.setdefault('timeout', 30.0)
+def _get_async_client(provider: str):
+    """Return the process-wide async client for a provider, bound to the running loop."""
+    global _async_clients_loop
+    loop = asyncio.get_running_loop()
+    if _async_clients_loop is not loop:
+        # Connection pools cannot be shared across event loops (e.g. one loop per test)
+        _async_clients.clear()
+        _async_clients_loop = loop
+    client = _async_clients.get(provider)
+    if client is not None:
+        return client
+    if CASSETTE.mode == 'replay':
+        # Offline: every response comes from the cassette
+        client = CASSETTE.wrap_async()
+        _async_clients[provider] = client
+        return client
     try:
         if provider == 'openai':
-            client = _get_openai_client()
-            model = model or OPENAI_REAS_MODEL
-            resp = client.chat.completions.create(model=model, messages=redacted_messages, **kwargs)
-            return resp.choices[0].message.content or ""
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI(max_retries=LLM_CLIENT_MAX_RETRIES)
         elif provider == 'azure':
-            client = _get_azure_client()
-            model = model or AZURE_REAS_DEPLOYMENT
-            resp = client.chat.completions.create(model=model, messages=redacted_messages, **kwargs)
-            return resp.choices[0].message.content or ""
+            from openai import AsyncAzureOpenAI
+            client = AsyncAzureOpenAI(
+                azure_endpoint=AZURE_OPENAI_ENDPOINT,
+                api_key=AZURE_OPENAI_KEY,
+                api_version="2024-02-01",
+                max_retries=LLM_CLIENT_MAX_RETRIES,
+            )
         elif provider == 'vllm_local':
-            client = _get_vllm_client()
-            model = model or VLLM_REAS_MODEL
-            resp = client.chat.completions.create(model=model, messages=redacted_messages, **kwargs)
-            return resp.choices[0].message.content or ""
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI(base_url=VLLM_BASE_URL, api_key="not-needed", max_retries=LLM_CLIENT_MAX_RETRIES)
         else:
-            raise ValueError(f"Unknown REAS_PROVIDER: {provider}")
-    except Exception as e:
-        # Log error and return empty for resilience
-        print(f"LLM call failed: {e}")
-        return ""
+            raise ValueError(f"Unknown provider: {provider}")
+    except ValueError:
+        raise
+    except Exception:
+        raise RuntimeError(f'Async {provider} client not configured')
+    if CASSETTE.mode == 'record':
+        client = CASSETTE.wrap_async(client)
+    _async_clients[provider] = client
+    return client
 
-def embed_texts(texts: List[str], model: str = None) -> List[List[float]]:
-    """Embedding call. Returns list of vectors."""
-    provider = EMBED_PROVIDER
+
+class LLMRateLimitError(LLMUnavailableError):
+    """The provider kept answering 429 after LLM_RATE_LIMIT_RETRIES re-queues."""
+
+
+def _is_rate_limited(e: Exception) -> bool:
+    return getattr(e, 'status_code', None) == 429 or type(e).__name__ == 'RateLimitError'
+
+
+def _retry_after(e: Exception, attempt: int) -> float:
+    """Seconds to hold admissions after a 429: Retry-After when given, else backoff."""
+    try:
+        headers = e.response.headers
+        value = headers.get('retry-after-ms')
+        if value is not None:
+            return float(value) / 1000.0
+        value = headers.get('retry-after')
+        if value is not None:
+            return float(value)
+    except Exception:
+        pass
+    return _backoff(attempt)
+
+
+def _chat_tokens(messages: List[Dict[str, str]], kwargs: Dict[str, Any]) -> int:
+    """TPM reservation for a chat completion: prompt tokens plus the completion allowance."""
+    prompt = sum(count_tokens(m.get('content') or '') for m in messages)
+    return prompt + int(kwargs.get('max_tokens') or LLM_EXPECTED_COMPLETION_TOKENS)
+
+
+def _settle(ticket, resp) -> None:
+    usage = getattr(resp, 'usage', None)
+    if usage is not None and getattr(usage, 'total_tokens', None):
+        ticket.used_tokens = usage.total_tokens
+
+
+async def aclose_clients() -> None:
+    """Close pooled async connections (call on application shutdown)."""
+    clients = list(_async_clients.values())
+    _async_clients.clear()
+    for client in clients:
+        try:
+            await client.close()
+        except Exception:
+            pass
+
+
+def _redact_messages(messages: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    redacted_messages = []
+    for msg in messages:
+        redacted_content = redact_phi(msg.get('content', ''))
+        redacted_messages.append({'role': msg['role'], 'content': redacted_content})
+    return redacted_messages
+
+
+def _default_reas_model(provider: str) -> str:
+    if provider == 'openai':
+        return OPENAI_REAS_MODEL
+    if provider == 'azure':
+        return AZURE_REAS_DEPLOYMENT
+    if provider == 'vllm_local':
+        return VLLM_REAS_MODEL
+    raise ValueError(f"Unknown REAS_PROVIDER: {provider}")
+
+
+def _deployment(provider: str, model: str) -> str:
+    """Name of `model` (as the agents ask for it) on `provider`."""
+    alias = LLM_MODEL_ALIASES.get((provider, model))
+    if alias:
+        return alias
+    if provider in (REAS_PROVIDER, 'openai'):
+        return model
+    return _default_reas_model(provider)
+
+
+def _backends(model: str) -> List[Tuple[str, str]]:
+    return [(p, _deployment(p, model)) for p in LLM_PROVIDERS]
+
+
+def _unavailable(error: Exception) -> LLMUnavailableError:
+    if isinstance(error, LLMUnavailableError):
+        return error
+    if error is None:
+        return LLMUnavailableError("No healthy LLM backend (every circuit is open)")
+    return LLMUnavailableError(f"All LLM backends failed: {error}")
+
+
+def _default_embed_model(provider: str) -> str:
+    if provider == 'openai':
+        return OPENAI_EMBED_MODEL
+    if provider == 'azure':
+        return AZURE_EMBED_DEPLOYMENT
+    if provider == 'vllm_local':
+        return VLLM_EMBED_MODEL
+    raise ValueError(f"Unknown EMBED_PROVIDER: {provider}")
+
+
+def _get_client(provider: str):
+    if CASSETTE.mode == 'replay':
+        return CASSETTE.wrap()
     if provider == 'openai':
         client = _get_openai_client()
-        model = model or OPENAI_EMBED_MODEL
-        resp = client.embeddings.create(model=model, input=texts)
-        return [d.embedding for d in resp.data]
     elif provider == 'azure':
         client = _get_azure_client()
-        model = model or AZURE_EMBED_DEPLOYMENT
-        resp = client.embeddings.create(model=model, input=texts)
-        return [d.embedding for d in resp.data]
     elif provider == 'vllm_local':
         client = _get_vllm_client()
-        model = model or VLLM_EMBED_MODEL
-        resp = client.embeddings.create(model=model, input=texts)
-        return [d.embedding for d in resp.data]
     else:
-        raise ValueError(f"Unknown EMBED_PROVIDER: {provider}")
+        raise ValueError(f"Unknown provider: {provider}")
+    return CASSETTE.wrap(client) if CASSETTE.mode == 'record' else client
+
+
+def _create(provider: str, model: str, messages: List[Dict[str, str]], kwargs: Dict[str, Any]):
+    """One admitted chat completion on `provider` (re-queued on 429), reported to ROUTER."""
+    deployment = _deployment(provider, model)
+    ok, elapsed = None, 0.0
+    try:
+        client = _get_client(provider)
+        tokens = _chat_tokens(messages, kwargs)
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            try:
+                with ADMISSION.slot_sync(tokens) as ticket:
+                    start = time.perf_counter()
+                    resp = client.chat.completions.create(model=deployment, messages=messages, **kwargs)
+                    elapsed = time.perf_counter() - start
+                    _settle(ticket, resp)
+                ok = True
+                return resp
+            except Exception as e:
+                if not _is_rate_limited(e):
+                    ok = False
+                    raise
+                LLM_CALLS.inc(kind='chat', outcome='rate_limited')
+                ADMISSION.penalize(_retry_after(e, attempt))
+        raise LLMRateLimitError(f"Rate limited after {LLM_RATE_LIMIT_RETRIES} retries")
+    finally:
+        # Rate-limited calls leave ok=None: throttling is not a broken endpoint
+        ROUTER.record(provider, deployment, ok, elapsed)
+
+
+def _complete(model: str, key: str, messages: List[Dict[str, str]], kwargs: Dict[str, Any]) -> str:
+    """Chat completion on the fastest healthy backend, failing over to the next; caches the content."""
+    error = None
+    for provider, deployment in ROUTER.order(_backends(model)):
+        if not ROUTER.allow(provider, deployment):
+            continue
+        try:
+            resp = _create(provider, model, messages, kwargs)
+            break
+        except Exception as e:
+            LLM_CALLS.inc(kind='chat', outcome='backend_error')
+            error = error or e
+    else:
+        raise _unavailable(error)
+    content = resp.choices[0].message.content or ""
+    LLM_CALLS.inc(kind='chat', outcome='ok')
+    LLM_CACHE.put(key, model, content)
+    return content
+
+
+async def _acreate(provider: str, model: str, messages: List[Dict[str, str]], kwargs: Dict[str, Any]):
+    """Async counterpart of _create(); also feeds HEDGE's latency window."""
+    deployment = _deployment(provider, model)
+    ok, elapsed = None, 0.0
+    try:
+        client = _get_async_client(provider)
+        tokens = _chat_tokens(messages, kwargs)
+        for attempt in range(LLM_RATE_LIMIT_RETRIES + 1):
+            try:
+                async with ADMISSION.slot(tokens) as ticket:
+                    start = time.perf_counter()
+                    try:
+                        resp = await client.chat.completions.create(model=deployment, messages=messages, **kwargs)
+                    except asyncio.CancelledError:
+                        # A losing hedge: its elapsed time is a lower bound, but keeps slow calls in the window
+                        HEDGE.latency.observe(provider, model, time.perf_counter() - start)
+                        raise
+                    elapsed = time.perf_counter() - start
+                    HEDGE.latency.observe(provider, model, elapsed)
+                    _settle(ticket, resp)
+                ok = True
+                return resp
+            except Exception as e:
+                if not _is_rate_limited(e):
+                    ok = False
+                    raise
+                LLM_CALLS.inc(kind='chat', outcome='rate_limited')
+                ADMISSION.penalize(_retry_after(e, attempt))
+        raise LLMRateLimitError(f"Rate limited after {LLM_RATE_LIMIT_RETRIES} retries")
+    finally:
+        # Cancelled and rate-limited calls leave ok=None (only a half-open probe is freed)
+        ROUTER.record(provider, deployment, ok, elapsed)
+
+
+def _forget(task: asyncio.Task) -> None:
+    # Losing attempts may still fail after we stopped listening
+    if not task.cancelled():
+        task.exception()
+
+
+async def _ahedged(provider: str, model: str, messages: List[Dict[str, str]], kwargs: Dict[str, Any]):
+    """_acreate(), plus duplicates sent after HEDGE.delay() while the budget allows.
+
+    The first successful response wins and the other attempts are cancelled;
+    if every attempt fails the first error is raised.
+    """
+    delay = HEDGE.delay(provider, model)
+    HEDGE.budget.earn()
+    if delay is None:
+        return await _acreate(provider, model, messages, kwargs)
+    primary = asyncio.ensure_future(_acreate(provider, model, messages, kwargs))
+    primary.add_done_callback(_forget)
+    attempts = [primary]
+    targets = HEDGE.targets(provider)
+    pending = {primary}
+    error = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, timeout=delay if targets else None,
+                                               return_when=asyncio.FIRST_COMPLETED)
+            for task in attempts:
+                if task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            LLM_CALLS.inc(kind='chat', outcome='hedge_won')
+                        return task.result()
+                    error = error or task.exception()
+            if not done and targets:
+                target = targets.pop(0)
+                deployment = _deployment(target, model)
+                if not ROUTER.allow(target, deployment):
+                    continue  # circuit open on the hedge target
+                if not HEDGE.budget.spend():
+                    # Nothing is sent, so hand back a half-open probe allow() may have taken
+                    ROUTER.record(target, deployment, None)
+                    targets = []  # over the extra-spend cap: wait for what is in flight
+                    continue
+                LLM_CALLS.inc(kind='chat', outcome='hedged')
+                hedge = asyncio.ensure_future(_acreate(target, model, messages, kwargs))
+                hedge.add_done_callback(_forget)
+                attempts.append(hedge)
+                pending.add(hedge)
+        raise error
+    finally:
+        for task in attempts:
+            if not task.done():
+                task.cancel()
+
+
+async def _acomplete(model: str, key: str, messages: List[Dict[str, str]], kwargs: Dict[str, Any]) -> str:
+    """Async counterpart of _complete(); each backend attempt is hedged when LLM_HEDGE is on."""
+    error = None
+    for provider, deployment in ROUTER.order(_backends(model)):
+        if not ROUTER.allow(provider, deployment):
+            continue
+        try:
+            resp = await _ahedged(provider, model, messages, kwargs)
+            break
+        except Exception as e:
+            LLM_CALLS.inc(kind='chat', outcome='backend_error')
+            error = error or e
+    else:
+        raise _unavailable(error)
+    content = resp.choices[0].message.content or ""
+    LLM_CALLS.inc(kind='chat', outcome='ok')
+    await asyncio.to_thread(LLM_CACHE.put, key, model, content)
+    return content
+
+
+def reason(messages: List[Dict[str, str]], model: str = None, cache: bool = True, **kwargs) -> str:
+    """Reasoning LLM call. Returns response content.
+
+    Responses are served from LLM_CACHE when present; cache=False skips the
+    lookup (the fresh answer still refreshes the cached entry). Identical
+    calls already in flight are joined rather than sent again (FLIGHTS).
+    Raises LLMUnavailableError when no backend in LLM_PROVIDERS could answer,
+    or the call failed for any other reason.
+    """
+    # Redact PHI from messages
+    redacted_messages = _redact_messages(messages)
+    # Recording must see every call, so cached answers are not served
+    cache = cache and CASSETTE.mode != 'record'
+
+    provider = REAS_PROVIDER
+    # Set default timeout if not provided
+    kwargs.setdefault('timeout', 30.0)
+    try:
+        model = model or _default_reas_model(provider)
+        key = LLM_CACHE.make_key(provider, model, redacted_messages, kwargs)
+        if cache:
+            cached = LLM_CACHE.get(key)
+            if cached is not None:
+                LLM_CALLS.inc(kind='chat', outcome='cache_hit')
+                return cached
+        # Identical concurrent calls (double submits, duplicate cases) share one completion
+        return FLIGHTS.do('chat', key, lambda: _complete(model, key, redacted_messages, kwargs))
+    except LLMUnavailableError:
+        LLM_CALLS.inc(kind='chat', outcome='error')
+        raise
+    except Exception as e:
+        # Not an empty answer: callers must be able to tell a failed call (bad request, auth, ...) apart
+        LLM_CALLS.inc(kind='chat', outcome='error')
+        raise LLMUnavailableError(f"LLM call failed: {e}") from e
+
+def _estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English/clinical text
+    return max(1, len(text) // 4)
+
+
+def _pack_batches(texts: List[str]) -> List[List[int]]:
+    """Group text indices into batches bounded by token budget and item count."""
+    batches: List[List[int]] = []
+    current: List[int] = []
+    current_tokens = 0
+    for i, text in enumerate(texts):
+        n = _estimate_tokens(text)
+        if current and (current_tokens + n > EMBED_BATCH_TOKENS or len(current) >= EMBED_BATCH_MAX_ITEMS):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(i)
+        current_tokens += n
+    if current:
+        batches.append(current)
+    return batches
+
+
+def _backoff(attempt: int) -> float:
+    return min(8.0, 0.5 * (2 ** attempt))
+
+
+def _plan_embeddings(texts: List[str], model: str, cache: bool):
+    """Dedupe texts and resolve cache hits. Returns (vectors_by_text, missing_texts)."""
+    unique = list(dict.fromkeys(texts))
+    found = EMBED_CACHE.get_many(model, unique) if cache else [None] * len(unique)
+    vectors: Dict[str, Any] = {t: v for t, v in zip(unique, found) if v is not None}
+    missing = [t for t in unique if t not in vectors]
+    if vectors:
+        LLM_CALLS.inc(len(vectors), kind='embed', outcome='cache_hit')
+    return vectors, missing
+
+
+def _store_batch(model: str, batch: List[str], result: List[List[float]], vectors: Dict[str, Any]) -> None:
+    mat = np.asarray(result, dtype='float32')
+    # Persist every batch as soon as it lands so interrupted runs can resume
+    EMBED_CACHE.put_many(model, batch, mat)
+    for text, vec in zip(batch, mat):
+        vectors[text] = vec
+
+
+def _embed_request(provider: str, model: str, texts: List[str]) -> List[List[float]]:
+    client = _get_client(provider)
+    resp = client.embeddings.create(model=model, input=texts)
+    return [d.embedding for d in resp.data]
+
+
+def _embed_batch(provider: str, model: str, texts: List[str]) -> List[List[float]]:
+    for attempt in range(EMBED_MAX_RETRIES + 1):
+        try:
+            result = _embed_request(provider, model, texts)
+            LLM_CALLS.inc(kind='embed', outcome='ok')
+            return result
+        except Exception:
+            LLM_CALLS.inc(kind='embed', outcome='error')
+            if attempt >= EMBED_MAX_RETRIES:
+                raise
+            time.sleep(_backoff(attempt))
+    return []
+
+
+def _embed_missing(provider: str, model: str, missing: List[str]) -> Dict[str, Any]:
+    """Embed cache misses in batches; returns {text: vector}, raising the first batch error."""
+    vectors: Dict[str, Any] = {}
+    batches = [[missing[i] for i in idx] for idx in _pack_batches(missing)]
+    errors: List[Exception] = []
+    if len(batches) == 1:
+        _store_batch(model, batches[0], _embed_batch(provider, model, batches[0]), vectors)
+    elif batches:
+        with ThreadPoolExecutor(max_workers=max(1, min(EMBED_CONCURRENCY, len(batches)))) as pool:
+            futures = [(batch, pool.submit(_embed_batch, provider, model, batch)) for batch in batches]
+            for batch, fut in futures:
+                try:
+                    _store_batch(model, batch, fut.result(), vectors)
+                except Exception as e:
+                    errors.append(e)
+    if errors:
+        raise errors[0]
+    return vectors
+
+
+def embed_texts(texts: List[str], model: str = None, cache: bool = True) -> List[List[float]]:
+    """Embedding call. Returns list of vectors.
+
+    Cached vectors are reused; the rest are embedded in token-bounded batches
+    sent concurrently (EMBED_CONCURRENCY) and written back to EMBED_CACHE.
+    Concurrent calls missing the same texts share one set of requests (FLIGHTS).
+    """
+    if not texts:
+        return []
+    provider = EMBED_PROVIDER
+    model = model or _default_embed_model(provider)
+    cache = cache and CASSETTE.mode != 'record'
+    vectors, missing = _plan_embeddings(texts, model, cache)
+    if missing:
+        vectors.update(FLIGHTS.do('embed', flight_key(provider, model, missing),
+                                  lambda: _embed_missing(provider, model, missing)))
+    return [vectors[t].tolist() for t in texts]
+
+
+async def areason(messages: List[Dict[str, str]], model: str = None, cache: bool = True, **kwargs) -> str:
+    """Async reasoning LLM call. Returns response content, like reason().
+
+    Waits for admission (ADMISSION) in the caller's priority class and fails
+    over across LLM_PROVIDERS (ROUTER); raises LLMUnavailableError when no
+    backend could answer (LLMRateLimitError if it was kept answering 429) or
+    the call failed otherwise.
+    """
+    redacted_messages = _redact_messages(messages)
+    cache = cache and CASSETTE.mode != 'record'
+    provider = REAS_PROVIDER
+    kwargs.setdefault('timeout', 30.0)
+    try:
+        model = model or _default_reas_model(provider)
+        key = LLM_CACHE.make_key(provider, model, redacted_messages, kwargs)
+        if cache:
+            cached = await asyncio.to_thread(LLM_CACHE.get, key)
+            if cached is not None:
+                LLM_CALLS.inc(kind='chat', outcome='cache_hit')
+                return cached
+        return await FLIGHTS.ado('chat', key, lambda: _acomplete(model, key, redacted_messages, kwargs))
+    except LLMUnavailableError:
+        LLM_CALLS.inc(kind='chat', outcome='error')
+        raise
+    except Exception as e:
+        # Not an empty answer: callers must be able to tell a failed call (bad request, auth, ...) apart
+        LLM_CALLS.inc(kind='chat', outcome='error')
+        raise LLMUnavailableError(f"LLM call failed: {e}") from e
+
+
+async def _astream(provider: str, model: str, messages: List[Dict[str, str]],
+                   kwargs: Dict[str, Any]) -> AsyncIterator[str]:
+    """Content deltas of one streamed completion on `provider`, reported to ROUTER."""
+    deployment = _deployment(provider, model)
+    ok, elapsed = None, None
+    pieces: List[str] = []
+    try:
+        client = _get_async_client(provider)
+        tokens = _chat_tokens(messages, kwargs)
+        async with ADMISSION.slot(tokens) as ticket:
+            start = time.perf_counter()
+            try:
+                stream = await client.chat.completions.create(model=deployment, messages=messages,
+                                                              stream=True, **kwargs)
+            except Exception as e:
+                if _is_rate_limited(e):
+                    LLM_CALLS.inc(kind='chat', outcome='rate_limited')
+                    ADMISSION.penalize(_retry_after(e, 0))
+                    raise LLMRateLimitError(f"Rate limited on {provider}") from e
+                ok = False
+                raise
+            try:
+                async for chunk in stream:
+                    delta = chunk.choices[0].delta.content if chunk.choices else None
+                    if delta:
+                        ok = True  # answering; a consumer that stops early leaves it healthy
+                        pieces.append(delta)
+                        yield delta
+                ok = True
+                elapsed = time.perf_counter() - start
+            except Exception:
+                ok = False
+                raise
+            finally:
+                await stream.close()
+                # Charge TPM for what was generated, not for the allowance
+                allowance = int(kwargs.get('max_tokens') or LLM_EXPECTED_COMPLETION_TOKENS)
+                ticket.used_tokens = tokens - allowance + count_tokens(''.join(pieces))
+    finally:
+        ROUTER.record(provider, deployment, ok, elapsed)
+
+
+async def astream_reason(messages: List[Dict[str, str]], model: str = None, cache: bool = True,
+                         **kwargs) -> AsyncIterator[str]:
+    """Streaming areason(): yields the completion's content as it is generated.
+
+    The consumer may stop early (aclose()); the provider stream is then closed,
+    so no further output tokens are generated or charged. Only completed
+    streams are cached. Cached answers, and every call under a cassette (which
+    records whole responses), arrive as a single piece. Fails over to the next
+    backend only before the first piece; raises LLMUnavailableError like areason().
+    """
+    if CASSETTE.enabled:
+        yield await areason(messages, model=model, cache=cache, **kwargs)
+        return
+    redacted_messages = _redact_messages(messages)
+    provider = REAS_PROVIDER
+    kwargs.setdefault('timeout', 30.0)
+    model = model or _default_reas_model(provider)
+    key = LLM_CACHE.make_key(provider, model, redacted_messages, kwargs)
+    if cache:
+        cached = await asyncio.to_thread(LLM_CACHE.get, key)
+        if cached is not None:
+            LLM_CALLS.inc(kind='chat', outcome='cache_hit')
+            yield cached
+            return
+    error = None
+    for backend, deployment in ROUTER.order(_backends(model)):
+        if not ROUTER.allow(backend, deployment):
+            continue
+        pieces: List[str] = []
+        try:
+            # aclosing: a consumer stopping early must close the provider stream now, not at GC
+            async with contextlib.aclosing(_astream(backend, model, redacted_messages, kwargs)) as stream:
+                async for piece in stream:
+                    pieces.append(piece)
+                    yield piece
+        except Exception as e:
+            LLM_CALLS.inc(kind='chat', outcome='backend_error')
+            if pieces:
+                LLM_CALLS.inc(kind='chat', outcome='error')
+                raise _unavailable(e)  # part of the answer is already out: no failover
+            error = error or e
+            continue
+        LLM_CALLS.inc(kind='chat', outcome='ok')
+        await asyncio.to_thread(LLM_CACHE.put, key, model, ''.join(pieces))
+        return
+    LLM_CALLS.inc(kind='chat', outcome='error')
+    raise _unavailable(error)
+
+
+async def _aembed_request(provider: str, model: str, texts: List[str]) -> List[List[float]]:
+    client = _get_async_client(provider)
+    resp = await client.embeddings.create(model=model, input=texts)
+    return [d.embedding for d in resp.data]
+
+
+async def _aembed_batch(provider: str, model: str, texts: List[str], sem: asyncio.Semaphore) -> List[List[float]]:
+    async with sem:
+        for attempt in range(EMBED_MAX_RETRIES + 1):
+            try:
+                result = await _aembed_request(provider, model, texts)
+                LLM_CALLS.inc(kind='embed', outcome='ok')
+                return result
+            except Exception:
+                LLM_CALLS.inc(kind='embed', outcome='error')
+                if attempt >= EMBED_MAX_RETRIES:
+                    raise
+                await asyncio.sleep(_backoff(attempt))
+    return []
+
+
+async def _aembed_missing(provider: str, model: str, missing: List[str]) -> Dict[str, Any]:
+    """Async counterpart of _embed_missing()."""
+    vectors: Dict[str, Any] = {}
+    batches = [[missing[i] for i in idx] for idx in _pack_batches(missing)]
+    sem = asyncio.Semaphore(max(1, EMBED_CONCURRENCY))
+    results = await asyncio.gather(*[_aembed_batch(provider, model, b, sem) for b in batches],
+                                   return_exceptions=True)
+    errors: List[Exception] = []
+    for batch, result in zip(batches, results):
+        if isinstance(result, BaseException):
+            errors.append(result)
+            continue
+        await asyncio.to_thread(_store_batch, model, batch, result, vectors)
+    if errors:
+        raise errors[0]
+    return vectors
+
+
+async def aembed_texts(texts: List[str], model: str = None, cache: bool = True) -> List[List[float]]:
+    """Async embedding call. Returns list of vectors (same caching/batching as embed_texts)."""
+    if not texts:
+        return []
+    provider = EMBED_PROVIDER
+    model = model or _default_embed_model(provider)
+    cache = cache and CASSETTE.mode != 'record'
+    vectors, missing = await asyncio.to_thread(_plan_embeddings, texts, model, cache)
+    if missing:
+        vectors.update(await FLIGHTS.ado('embed', flight_key(provider, model, missing),
+                                         lambda: _aembed_missing(provider, model, missing)))
+    return [vectors[t].tolist() for t in texts]
@@ -0,0 +1,155 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, Any, List, Optional
+
+ROOT = os.path.dirname(os.path.dirname(__file__))
+DB_PATH = os.getenv('LLM_CACHE_PATH', os.path.join(ROOT, 'storage', 'llm_cache.db'))
+
+# Cache knobs (set LLM_CACHE=off to bypass globally)
+LLM_CACHE_ENABLED = os.getenv('LLM_CACHE', 'on').lower() not in ('0', 'off', 'false', 'no')
+LLM_CACHE_TTL_SECONDS = float(os.getenv('LLM_CACHE_TTL_SECONDS', str(7 * 24 * 3600)))
+LLM_CACHE_MAX_BYTES = int(os.getenv('LLM_CACHE_MAX_BYTES', str(256 * 1024 * 1024)))
+
+# Request kwargs that do not influence the completion text
+_NON_KEY_PARAMS = ('timeout', 'extra_headers')
+
+SCHEMA_SQL = '''
+CREATE TABLE IF NOT EXISTS responses (
+  key TEXT PRIMARY KEY,
+  model TEXT,
+  value TEXT NOT NULL,
+  size INTEGER NOT NULL,
+  created_at REAL NOT NULL,
+  last_access REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access);
+'''
+
+
+class ResponseCache:
+    """Content-addressed, disk-backed cache of LLM responses with TTL and LRU eviction."""
+
+    def __init__(self, path: str = DB_PATH, ttl_seconds: float = LLM_CACHE_TTL_SECONDS,
+                 max_bytes: int = LLM_CACHE_MAX_BYTES, enabled: bool = LLM_CACHE_ENABLED):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'expired': 0, 'writes': 0, 'evictions': 0, 'bypassed': 0}
+        self._initialized = False
+
+    def _conn(self):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        if not self._initialized:
+            conn.execute('PRAGMA journal_mode=WAL;')
+            conn.executescript(SCHEMA_SQL)
+            self._initialized = True
+        return conn
+
+    def _count(self, name: str, n: int = 1) -> None:
+        with self._lock:
+            self._counters[name] += n
+
+    @staticmethod
+    def make_key(provider: str, model: str, messages: List[Dict[str, str]], params: Dict[str, Any]) -> str:
+        """Hash of the (already redacted) messages, model and sampling parameters."""
+        key_params = {k: v for k, v in params.items() if k not in _NON_KEY_PARAMS}
+        payload = json.dumps({
+            'provider': provider,
+            'model': model,
+            'messages': messages,
+            'params': key_params,
+        }, sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if not self.enabled:
+            self._count('bypassed')
+            return None
+        now = time.time()
+        try:
+            with self._conn() as c:
+                row = c.execute('SELECT value, created_at FROM responses WHERE key=?', (key,)).fetchone()
+                if row is None:
+                    self._count('misses')
+                    return None
+                value, created_at = row
+                if self.ttl_seconds > 0 and now - created_at > self.ttl_seconds:
+                    c.execute('DELETE FROM responses WHERE key=?', (key,))
+                    self._count('expired')
+                    self._count('misses')
+                    return None
+                c.execute('UPDATE responses SET last_access=? WHERE key=?', (now, key))
+            self._count('hits')
+            return value
+        except sqlite3.Error:
+            self._count('misses')
+            return None
+
+    def put(self, key: str, model: str, value: str) -> None:
+        # Never cache empty answers
+        if not self.enabled or not value:
+            return
+        now = time.time()
+        size = len(value.encode('utf-8'))
+        try:
+            with self._conn() as c:
+                c.execute('INSERT OR REPLACE INTO responses(key, model, value, size, created_at, last_access) '
+                          'VALUES(?,?,?,?,?,?)', (key, model, value, size, now, now))
+                self._count('writes')
+                self._evict(c)
+        except sqlite3.Error:
+            pass
+
+    def _evict(self, c) -> None:
+        total = c.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = 0
+        for key, size in c.execute('SELECT key, size FROM responses ORDER BY last_access ASC').fetchall():
+            if total <= self.max_bytes:
+                break
+            c.execute('DELETE FROM responses WHERE key=?', (key,))
+            total -= size
+            evicted += 1
+        self._count('evictions', evicted)
+
+    def purge_expired(self) -> int:
+        if self.ttl_seconds <= 0:
+            return 0
+        try:
+            with self._conn() as c:
+                cur = c.execute('DELETE FROM responses WHERE created_at < ?', (time.time() - self.ttl_seconds,))
+                return cur.rowcount
+        except sqlite3.Error:
+            return 0
+
+    def clear(self) -> None:
+        try:
+            with self._conn() as c:
+                c.execute('DELETE FROM responses')
+        except sqlite3.Error:
+            pass
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            out: Dict[str, Any] = dict(self._counters)
+        lookups = out['hits'] + out['misses']
+        out['hit_rate'] = (out['hits'] / lookups) if lookups else 0.0
+        try:
+            with self._conn() as c:
+                entries, size = c.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+            out['entries'] = entries
+            out['bytes'] = size
+        except sqlite3.Error:
+            pass
+        return out
+
+
+LLM_CACHE = ResponseCache()
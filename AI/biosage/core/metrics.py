@@ -0,0 +1,173 @@
+import os
+import time
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+# Latency buckets (seconds) shared by every histogram
+BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+# Add a Server-Timing header to API responses (SERVER_TIMING=on)
+SERVER_TIMING_ENABLED = os.getenv('SERVER_TIMING', 'off').lower() in ('1', 'on', 'true', 'yes')
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, str]) -> LabelKey:
+    return tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None and v != ''))
+
+
+def _format_labels(key: LabelKey, extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(key) + ([extra] if extra else [])
+    if not items:
+        return ''
+    body = ','.join('{}="{}"'.format(k, v.replace('\\', '\\\\').replace('"', '\\"')) for k, v in items)
+    return '{' + body + '}'
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self._series: Dict[LabelKey, List[float]] = {}  # bucket counts + [sum, count]
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = [0.0] * (len(self.buckets) + 2)
+                self._series[key] = series
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {k: list(v) for k, v in self._series.items()}
+        for key, series in sorted(snapshot.items()):
+            for i, bound in enumerate(self.buckets):
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', repr(bound)))} {int(series[i])}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, ('le', '+Inf'))} {int(series[-1])}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-2]:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {int(series[-1])}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for key, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels: str) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for key, value in sorted(snapshot.items()):
+            lines.append(f"{self.name}{_format_labels(key)} {value:g}")
+        return lines
+
+
+_registry: List = []
+
+
+def register(metric):
+    _registry.append(metric)
+    return metric
+
+
+STAGE_SECONDS = register(Histogram('biosage_stage_seconds', 'Latency of diagnose pipeline stages.'))
+HTTP_SECONDS = register(Histogram('biosage_http_request_seconds', 'Latency of HTTP requests by route.'))
+LLM_CALLS = register(Counter('biosage_llm_calls_total', 'LLM calls by kind and outcome.'))
+ERRORS = register(Counter('biosage_stage_errors_total', 'Pipeline stages that raised or degraded.'))
+LLM_QUEUE_DEPTH = register(Gauge('biosage_llm_admission_queue_depth', 'LLM calls waiting for admission by priority.'))
+LLM_QUEUE_WAIT_SECONDS = register(Histogram('biosage_llm_admission_wait_seconds', 'Time LLM calls waited for admission by priority.'))
+LLM_IN_FLIGHT = register(Gauge('biosage_llm_in_flight', 'LLM calls admitted and not yet finished.'))
+LLM_BACKEND_STATE = register(Gauge('biosage_llm_backend_circuit_state', 'Circuit breaker per LLM backend (0 closed, 1 half-open, 2 open).'))
+LLM_BACKEND_LATENCY = register(Gauge('biosage_llm_backend_latency_seconds', 'Smoothed latency of successful calls per LLM backend.'))
+SINGLEFLIGHT_CALLS = register(Counter('biosage_singleflight_calls_total', 'Coalescable calls by kind; outcome=shared calls were saved.'))
+PROMPT_TOKENS = register(Counter('biosage_prompt_context_tokens_total', 'Context tokens sent in specialist prompts by section.'))
+
+
+def render_prometheus() -> str:
+    lines: List[str] = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+# -------- request-scoped timings (Server-Timing) --------
+_request_timings: contextvars.ContextVar[Optional[List[Tuple[str, float]]]] = contextvars.ContextVar(
+    'biosage_request_timings', default=None)
+
+
+def start_request_timings() -> contextvars.Token:
+    return _request_timings.set([])
+
+
+def end_request_timings(token: contextvars.Token) -> List[Tuple[str, float]]:
+    timings = _request_timings.get() or []
+    _request_timings.reset(token)
+    return timings
+
+
+def server_timing_header(timings: List[Tuple[str, float]]) -> str:
+    return ', '.join(f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings)
+
+
+def record(stage: str, elapsed: float, agent: str = '') -> None:
+    """Record a measured stage duration into STAGE_SECONDS and the current request's Server-Timing."""
+    STAGE_SECONDS.observe(elapsed, stage=stage, agent=agent)
+    timings = _request_timings.get()
+    if timings is not None:
+        timings.append((f"{stage}.{agent}" if agent else stage, elapsed))
+
+
+@contextmanager
+def span(stage: str, agent: str = ''):
+    """Time a pipeline stage into STAGE_SECONDS (and the current request's Server-Timing)."""
+    start = time.perf_counter()
+    failed = False
+    try:
+        yield
+    except BaseException:
+        failed = True
+        raise
+    finally:
+        record(stage, time.perf_counter() - start, agent)
+        if failed:
+            ERRORS.inc(stage=stage, agent=agent)
@@ -1,8 +1,14 @@
+import os
+import time
 import asyncio
+from contextlib import aclosing
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Sequence, Set, Tuple, Union
 from .schemas import (
     Intake,
     NormalizedIntake,
     AgentResult,
+    Candidate,
+    FusedOutput,
     DiagnoseResult,
     PatientData,
 )
@@ -14,9 +20,55 @@ from ..agents.neurology import run_agent as run_neurology
 from ..agents.oncology import run_agent as run_oncology
 from ..agents.toxicology import run_agent as run_toxicology
 from ..agents.integrator import integrate
+from ..agents.panel import run_panel
 from .evidence import EVIDENCE
 from .transform import patient_data_to_intake
 from .recommendations import generate_recommendations
+from .retrieval import RetrievalBundle, abuild_retrieval_bundle, bundle_query_texts
+from .metrics import span, record, ERRORS
+from .llm import aembed_texts
+from .admission import llm_priority
+from .embedcache import EMBED_CACHE
+from .triage import TriageResult, triage, TRIAGE_MODE
+
+# Specialist agents, in the order their results are reported and integrated
+SPECIALISTS: List[Tuple[str, Callable[..., Awaitable[AgentResult]]]] = [
+    ("infectious", run_infectious),
+    ("autoimmune", run_autoimmune),
+    ("cardiology", run_cardiology),
+    ("neurology", run_neurology),
+    ("oncology", run_oncology),
+    ("toxicology", run_toxicology),
+]
+
+# Latency budgets (seconds, 0 = unbounded). The deadline covers the whole request;
+# each specialist also has its own budget (AGENT_BUDGET_SECONDS_<AGENT> overrides).
+# Specialists still running when their budget or the deadline expires are left out
+# of the fusion and reported in missing_domains; with FINISH_STRAGGLERS on they keep
+# running in the background so their answers land in the LLM cache for next time.
+DIAGNOSE_DEADLINE_SECONDS = float(os.getenv('DIAGNOSE_DEADLINE_SECONDS', '40'))
+AGENT_BUDGET_SECONDS = float(os.getenv('AGENT_BUDGET_SECONDS', '35'))
+RECOMMENDATIONS_MIN_BUDGET_SECONDS = float(os.getenv('RECOMMENDATIONS_MIN_BUDGET_SECONDS', '5'))
+FINISH_STRAGGLERS = os.getenv('FINISH_STRAGGLERS', 'on').lower() not in ('0', 'off', 'false', 'no')
+
+# Model cascade: with CASCADE_MODE on, specialists first answer on OPENAI_FAST_MODEL;
+# if the fused result is contested (disagreement_score at or above
+# CASCADE_DISAGREEMENT_THRESHOLD, or top_margin below CASCADE_MARGIN_THRESHOLD) the
+# contested specialists are re-run on the reasoning model (OPENAI_REAS_MODEL).
+CASCADE_MODE = os.getenv('CASCADE_MODE', 'off').lower() in ('1', 'on', 'true', 'yes')
+OPENAI_FAST_MODEL = os.getenv('OPENAI_FAST_MODEL', 'gpt-4o-mini')
+CASCADE_DISAGREEMENT_THRESHOLD = float(os.getenv('CASCADE_DISAGREEMENT_THRESHOLD', '0.35'))
+CASCADE_MARGIN_THRESHOLD = float(os.getenv('CASCADE_MARGIN_THRESHOLD', '0.05'))
+
+# How specialists are asked: 'separate' (one LLM call each) or 'panel' (one call
+# carrying the shared context once, with a section per specialty; see agents/panel.py)
+SPECIALIST_MODE = os.getenv('SPECIALIST_MODE', 'separate').lower()
+
+# Stragglers finishing in the background (kept referenced until done)
+_background: Set[asyncio.Task] = set()
+
+# Cases diagnose_batch keeps in flight at once
+BATCH_CONCURRENCY = int(os.getenv('BATCH_CONCURRENCY', '4'))
 
 
 def normalize(intake: Intake) -> NormalizedIntake:
@@ -24,42 +76,351 @@ def normalize(intake: Intake) -> NormalizedIntake:
     return NormalizedIntake(intake=intake, symptoms_normalized=norm, codes=codes)
 
 
-async def diagnose_patient(patient: PatientData) -> DiagnoseResult:
+def prepare_intake(patient: PatientData) -> Tuple[Intake, NormalizedIntake]:
+    with span("patient_data_to_intake"):
+        intake = patient_data_to_intake(patient)
+    with span("normalize"):
+        norm = normalize(intake)
+    return intake, norm
+
+
+def agent_budget(name: str) -> float:
+    return float(os.getenv(f'AGENT_BUDGET_SECONDS_{name.upper()}', AGENT_BUDGET_SECONDS))
+
+
+def request_deadline(seconds: Optional[float] = None) -> Optional[float]:
+    """Absolute time.monotonic() deadline for a request starting now (None = unbounded)."""
+    seconds = DIAGNOSE_DEADLINE_SECONDS if seconds is None else seconds
+    return time.monotonic() + seconds if seconds and seconds > 0 else None
+
+
+def _straggle(name: str, task: asyncio.Task) -> None:
+    ERRORS.inc(stage="agent.deadline", agent=name)
+    if FINISH_STRAGGLERS:
+        _background.add(task)
+        task.add_done_callback(_background.discard)
+    else:
+        task.cancel()
+
+
+def contested_agents(results: List[AgentResult], fused: FusedOutput) -> List[str]:
+    """Specialists worth re-asking on the reasoning model, or [] when the fused result is clear.
+
+    Each specialist only answers within its own domain, so an empty answer or an
+    in-domain top pick other than the winner is not a dissent. The contest is
+    between the fused top and runner-up: the specialists whose candidates back
+    either one are re-asked. Falls back to every specialist that answered if
+    none of them does.
+    """
+    disagreement = fused.disagreement_score or 0.0
+    margin = fused.top_margin if fused.top_margin is not None else 1.0
+    if disagreement < CASCADE_DISAGREEMENT_THRESHOLD and margin >= CASCADE_MARGIN_THRESHOLD:
+        return []
+    leaders = {d.diagnosis.strip().lower() for d in fused.differential[:2]}
+    answered = [r for r in results if r.candidates]
+    contested = [r.agent for r in answered
+                 if leaders & {c.diagnosis.strip().lower() for c in r.candidates}]
+    return contested or [r.agent for r in answered]
+
+
+async def _run_specialists(names: Sequence[str], ctx: Dict, retrieval: RetrievalBundle,
+                           deadline: Optional[float], model: Optional[str], tier: str,
+                           missing: List[str], candidates: bool = False) -> AsyncIterator[Tuple[str, Any]]:
+    """Run the named specialists in parallel, yielding ("agent", AgentResult) as each lands.
+
+    Each one may run until its own budget or the request deadline, whichever is
+    first; those that fail or run out of time are appended to `missing`. In
+    panel mode they share one call, bounded by the largest of their budgets.
+    With candidates=True, ("candidate", {"agent", "candidate"}) events come
+    first, as each specialist's candidates are parsed (mid-stream with
+    AGENT_STREAMING on).
+    """
+    start = time.monotonic()
+    # Each task answers for one or more specialists
+    names_of: Dict[asyncio.Task, List[str]] = {}
+    expiry: Dict[asyncio.Task, float] = {}
+    runners = dict(SPECIALISTS)
+    found: Optional[asyncio.Queue] = asyncio.Queue() if candidates else None
+
+    def on_candidate(agent: str) -> Optional[Callable[[Candidate], None]]:
+        return None if found is None else (lambda cand: found.put_nowait((agent, cand)))
+
+    if SPECIALIST_MODE == "panel" and len(names) > 1:
+        panel_cb = None if found is None else (lambda agent, cand: found.put_nowait((agent, cand)))
+        units = [(list(names), run_panel(ctx, retrieval, list(names), model=model, on_candidate=panel_cb))]
+    else:
+        units = [([name], runners[name](ctx, retrieval, model=model, on_candidate=on_candidate(name)))
+                 for name in names]
+    for unit, coro in units:
+        task = asyncio.create_task(coro)
+        names_of[task] = unit
+        budgets = [agent_budget(name) for name in unit]
+        budget = 0.0 if min(budgets) <= 0 else max(budgets)
+        ends = [t for t in (start + budget if budget > 0 else None, deadline) if t is not None]
+        expiry[task] = min(ends) if ends else float('inf')
+    pending = set(names_of)
+    running = set(names)  # candidates of specialists already answered or given up on are dropped
+    getter: Optional[asyncio.Task] = None
+
+    def drain(first: List[Tuple[str, Candidate]]) -> List[Tuple[str, Any]]:
+        while found is not None and not found.empty():
+            first.append(found.get_nowait())
+        return [("candidate", {"agent": agent, "candidate": cand}) for agent, cand in first if agent in running]
+
+    try:
+        while pending:
+            next_expiry = min(expiry[t] for t in pending)
+            timeout = None if next_expiry == float('inf') else max(0.0, next_expiry - time.monotonic())
+            if found is not None and getter is None:
+                getter = asyncio.create_task(found.get())
+            waiting = pending | {getter} if getter is not None else pending
+            done, _ = await asyncio.wait(waiting, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            first = []
+            if getter is not None and getter in done:
+                first.append(getter.result())
+                getter = None
+            for event in drain(first):
+                yield event
+            for task in done & pending:
+                pending.discard(task)
+                running.difference_update(names_of[task])
+                label = "/".join(names_of[task])
+                try:
+                    outs = task.result()
+                except Exception as e:
+                    print(f"Agent {label} failed: {e}")
+                    missing.extend(names_of[task])
+                    continue
+                for out in outs if isinstance(outs, list) else [outs]:
+                    out.tier = tier
+                    yield "agent", out
+            now = time.monotonic()
+            for task in [t for t in pending if expiry[t] <= now]:
+                pending.discard(task)
+                running.difference_update(names_of[task])
+                missing.extend(names_of[task])
+                _straggle("panel" if len(names_of[task]) > 1 else names_of[task][0], task)
+    finally:
+        # Consumer went away mid-stream: drop whatever is still running
+        for task in pending:
+            task.cancel()
+        if getter is not None:
+            getter.cancel()
+
+
+async def diagnose_patient(patient: PatientData, deadline_seconds: Optional[float] = None,
+                           all_agents: bool = False) -> DiagnoseResult:
     # Master Agent entrypoint: transform incoming patient data → Intake, then run pipeline
-    intake = patient_data_to_intake(patient)
-    norm = normalize(intake)
+    deadline = request_deadline(deadline_seconds)
+    intake, norm = prepare_intake(patient)
+    return await run_pipeline(intake, norm, deadline=deadline, all_agents=all_agents)
+
+
+async def pipeline_events(intake: Intake, norm: NormalizedIntake,
+                          retrieval: Optional[RetrievalBundle] = None,
+                          deadline: Optional[float] = None,
+                          all_agents: bool = False,
+                          candidates: bool = False) -> AsyncIterator[Tuple[str, Any]]:
+    """Run the pipeline for one normalized intake, yielding (event, payload) as stages finish.
+
+    Events: ("triage", TriageResult dict) naming the specialists that will run
+    (all of them with all_agents=True), with candidates=True ("candidate",
+    {"agent", "candidate": Candidate}) as specialists' candidates are parsed,
+    ("agent", AgentResult) for each in completion order,
+    ("missing", [agent names]) if some ran out of time; in cascade mode ("escalate",
+    [agent names]) followed by their reasoning-tier ("agent", ...) re-runs; then ("fused",
+    FusedOutput), ("recommendations", List[Recommendation]) and, once the
+    evidence is queued, ("result", DiagnoseResult). `deadline` is an absolute
+    time.monotonic() value (default: DIAGNOSE_DEADLINE_SECONDS from now).
+    """
+    if deadline is None:
+        deadline = request_deadline()
     ctx = {"norm": norm.model_dump()}
 
-    # Run specialist agents in parallel
-    id_task = asyncio.create_task(run_infectious(ctx))
-    ai_task = asyncio.create_task(run_autoimmune(ctx))
-    card_task = asyncio.create_task(run_cardiology(ctx))
-    neuro_task = asyncio.create_task(run_neurology(ctx))
-    onco_task = asyncio.create_task(run_oncology(ctx))
-    tox_task = asyncio.create_task(run_toxicology(ctx))
-    id_out, ai_out, card_out, neuro_out, onco_out, tox_out = await asyncio.gather(
-        id_task, ai_task, card_task, neuro_task, onco_task, tox_task
-    )
+    async def retrieve() -> RetrievalBundle:
+        with span("retrieval"):
+            return await abuild_retrieval_bundle(norm.symptoms_normalized)
+
+    async def route() -> TriageResult:
+        with span("triage"):
+            return await asyncio.to_thread(triage, norm.symptoms_normalized, "all" if all_agents else TRIAGE_MODE)
+
+    # Retrieve literature, previous cases and KG facts once for all specialists, and
+    # pick the specialists worth calling from the KG in the meantime
+    if retrieval is None:
+        retrieval, plan = await asyncio.gather(retrieve(), route())
+    else:
+        plan = await route()
+    yield "triage", plan.to_dict()
+
+    # Run specialist agents in parallel and hand each result on as soon as it lands;
+    # in cascade mode they answer on the fast model first
+    start = time.monotonic()
+    outputs: Dict[str, AgentResult] = {}
+    missing: List[str] = []
+    first_model, first_tier = (OPENAI_FAST_MODEL, "fast") if CASCADE_MODE else (None, "reasoning")
+    async with aclosing(_run_specialists(plan.selected, ctx, retrieval, deadline,
+                                         first_model, first_tier, missing, candidates)) as results:
+        async for event, payload in results:
+            if event == "agent":
+                outputs[payload.agent] = payload
+            yield event, payload
+    record("agents", time.monotonic() - start)
+    agent_outs = [outputs[name] for name, _ in SPECIALISTS if name in outputs]
+    missing = [name for name, _ in SPECIALISTS if name in missing]
+    if missing:
+        yield "missing", missing
 
-    fused = integrate([id_out, ai_out, card_out, neuro_out, onco_out, tox_out], ctx)
+    with span("integrate"):
+        fused = integrate(agent_outs, ctx)
+
+    # Escalate contested specialists to the reasoning model; one that misses its
+    # budget this time keeps its fast answer
+    cascade: Dict[str, Any] = {}
+    if CASCADE_MODE:
+        escalate = contested_agents(agent_outs, fused)
+        cascade = {"fast_model": OPENAI_FAST_MODEL,
+                   "disagreement_score": fused.disagreement_score,
+                   "top_margin": fused.top_margin,
+                   "escalated": escalate}
+        if escalate:
+            yield "escalate", escalate
+            late: List[str] = []
+            escalated_at = time.monotonic()
+            async with aclosing(_run_specialists(escalate, ctx, retrieval, deadline,
+                                                 None, "reasoning", late, candidates)) as results:
+                async for event, payload in results:
+                    if event == "agent":
+                        outputs[payload.agent] = payload
+                    yield event, payload
+            record("agents.escalate", time.monotonic() - escalated_at)
+            cascade["escalation_missed"] = late
+            agent_outs = [outputs[name] for name, _ in SPECIALISTS if name in outputs]
+            with span("integrate"):
+                fused = integrate(agent_outs, ctx)
+        cascade["tiers"] = {out.agent: out.tier for out in agent_outs}
+    yield "fused", fused
 
     # Recommendations
-    recs = generate_recommendations(ctx.get("norm", {}), fused)
-
-    # Persist evidence (bundle includes context)
-    EVIDENCE.put(intake.patient_id, {
-        "intake": intake.model_dump(),
-        "normalized": norm.model_dump(),
-        "agents": {
-            "infectious": id_out.model_dump(),
-            "autoimmune": ai_out.model_dump(),
-            "cardiology": card_out.model_dump(),
-            "neurology": neuro_out.model_dump(),
-            "oncology": onco_out.model_dump(),
-            "toxicology": tox_out.model_dump(),
-        },
-        "fused": fused.model_dump(),
-        "evidence": [{"type": "context", "content": ctx}]
-    })
-
-    return DiagnoseResult(agents=[id_out, ai_out, card_out, neuro_out, onco_out, tox_out], fused=fused, recommendations=recs)
+    with span("generate_recommendations"):
+        recs_budget = None
+        if deadline is not None:
+            recs_budget = max(RECOMMENDATIONS_MIN_BUDGET_SECONDS, deadline - time.monotonic())
+        try:
+            # Lowest admission class: the diagnosis is already out, so these yield to other cases' agents
+            with llm_priority("recommendations"):
+                recs = await asyncio.wait_for(generate_recommendations(ctx.get("norm", {}), fused), recs_budget)
+        except asyncio.TimeoutError:
+            print("Recommendations timed out")
+            recs = []
+    yield "recommendations", recs
+
+    # Persist evidence (bundle includes context); put() only queues it, the background
+    # writer commits the batch and embeds the case for the casebase
+    with span("evidence_put"):
+        await asyncio.to_thread(EVIDENCE.put, intake.patient_id, {
+            "intake": intake.model_dump(),
+            "normalized": norm.model_dump(),
+            "agents": {out.agent: out.model_dump() for out in agent_outs},
+            "fused": fused.model_dump(),
+            "missing_domains": missing,
+            "triage": plan.to_dict(),
+            "cascade": cascade,
+            "evidence": [{"type": "context", "content": ctx}]
+        })
+
+    yield "result", DiagnoseResult(agents=agent_outs, fused=fused, recommendations=recs,
+                                   missing_domains=missing, skipped_domains=plan.skipped)
+
+
+async def run_pipeline(intake: Intake, norm: NormalizedIntake,
+                       retrieval: Optional[RetrievalBundle] = None,
+                       on_agent: Optional[Callable[[AgentResult], None]] = None,
+                       deadline: Optional[float] = None,
+                       all_agents: bool = False) -> DiagnoseResult:
+    """Retrieval, specialists, integration, recommendations and evidence for one normalized intake.
+
+    on_agent, if given, is called with each AgentResult as soon as that agent finishes.
+    """
+    result: Optional[DiagnoseResult] = None
+    async for event, payload in pipeline_events(intake, norm, retrieval, deadline, all_agents):
+        if event == "agent" and on_agent is not None:
+            try:
+                on_agent(payload)
+            except Exception as e:
+                print(f"Agent result callback failed: {e}")
+        elif event == "result":
+            result = payload
+    return result
+
+
+async def diagnose_stream(patient: PatientData, deadline_seconds: Optional[float] = None,
+                          all_agents: bool = False) -> AsyncIterator[Tuple[str, Any]]:
+    """diagnose_patient as a stream of pipeline_events (candidates and agents first, as they finish)."""
+    deadline = request_deadline(deadline_seconds)
+    intake, norm = prepare_intake(patient)
+    async for event in pipeline_events(intake, norm, deadline=deadline, all_agents=all_agents, candidates=True):
+        yield event
+
+
+async def diagnose_batch(patients: Sequence[PatientData],
+                         concurrency: int = BATCH_CONCURRENCY) -> AsyncIterator[Tuple[int, Union[DiagnoseResult, Exception]]]:
+    """Diagnose many patients, yielding (index, DiagnoseResult or exception) as each case finishes.
+
+    Up to `concurrency` cases are in flight, so one case's LLM calls overlap
+    another's retrieval; their LLM calls are admitted in the "batch" class, behind
+    interactive requests.
+    Every patient is normalized up front and the batch's distinct retrieval
+    queries are embedded together. Patients with the same normalized symptoms
+    share one retrieval bundle; patients whose symptoms overlap share the KG
+    lookup of each common symptom. Literature and casebase searches are keyed
+    by the whole symptom query, so those are only shared between identical lists.
+    """
+    prepared: List[Tuple[int, Intake, NormalizedIntake]] = []
+    for i, patient in enumerate(patients):
+        try:
+            prepared.append((i, *prepare_intake(patient)))
+        except Exception as e:
+            yield i, e
+
+    if EMBED_CACHE.enabled:
+        texts = list(dict.fromkeys(t for _, _, norm in prepared for t in bundle_query_texts(norm.symptoms_normalized)))
+        try:
+            # Fills the embedding cache so each bundle below only does cache lookups
+            with span("batch_embed"):
+                await aembed_texts(texts)
+        except Exception as e:
+            print(f"Batch query embedding failed: {e}")
+
+    bundles: Dict[Tuple[str, ...], asyncio.Task] = {}
+    # Cases whose symptoms only overlap still share each symptom's KG lookup
+    kg_cache: Dict[str, List[str]] = {}
+
+    def bundle_for(symptoms: List[str]) -> asyncio.Task:
+        key = tuple(symptoms)
+        task = bundles.get(key)
+        if task is None:
+            task = asyncio.ensure_future(abuild_retrieval_bundle(symptoms, kg_cache=kg_cache))
+            bundles[key] = task
+        return task
+
+    sem = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(i: int, intake: Intake, norm: NormalizedIntake):
+        async with sem:
+            try:
+                with span("retrieval"):
+                    retrieval = await bundle_for(norm.symptoms_normalized)
+                with llm_priority("batch"):
+                    return i, await run_pipeline(intake, norm, retrieval)
+            except Exception as e:
+                return i, e
+
+    tasks = [asyncio.create_task(run_one(*item)) for item in prepared]
+    try:
+        for fut in asyncio.as_completed(tasks):
+            yield await fut
+    finally:
+        # The consumer may stop early (e.g. client disconnect): drop unfinished cases
+        for task in tasks + list(bundles.values()):
+            task.cancel()
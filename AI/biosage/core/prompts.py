@@ -1,4 +1,6 @@
-from typing import Dict
+from typing import Dict, List, Tuple
+
+from .tokenbudget import allocate, split_items
 
 
 # === HOUSE-STYLE + DOMAIN-LOCKED SYSTEM PROMPTS (no code/logic changes) ===
@@ -110,7 +112,20 @@ AGENT_JSON_SCHEMA_DESC = (
 )
 
 
+def budget_context(label: str, doc_snips: str, kg_snips: str, case_snips: str) -> Tuple[str, str, str, int, int]:
+    """Fit the retrieved sections into PROMPT_TOKEN_BUDGET; returns (docs, kg, cases, n_docs, n_cases)."""
+    kept, _ = allocate({
+        "literature": split_items(doc_snips),
+        "cases": split_items(case_snips),
+        "kg": split_items(kg_snips),
+    }, label=label)
+    return ("\n".join(kept["literature"]), "\n".join(kept["kg"]), "\n".join(kept["cases"]),
+            len(kept["literature"]), len(kept["cases"]))
+
+
 def build_agent_user_prompt(domain: str, context: Dict, doc_snips: str, kg_snips: str, case_snips: str, k_docs: int, k_cases: int) -> str:
+    doc_snips, kg_snips, case_snips, n_docs, n_cases = budget_context(domain, doc_snips, kg_snips, case_snips)
+    k_docs, k_cases = min(k_docs, n_docs), min(k_cases, n_cases)
     demographics = context.get("demographics")
     vitals = context.get("vitals")
     symptoms = context.get("symptoms_normalized")
@@ -151,6 +166,96 @@ HOUSE-STYLE DIFFERENTIAL (contrastive, falsifiable):
 """
 
 
+# Single-call panel mode: one prompt carries the shared case context once and a
+# section per specialty; the scopes below condense the specialist system prompts
+PANEL_SYSTEM_PROMPT = (
+    "You are a panel of specialist attendings reviewing one case together. Each specialist produces "
+    "a SEPARATE differential limited strictly to their own domain, as scoped in the request; "
+    "never place a diagnosis under a specialty it does not belong to. "
+    "If no diagnosis in a domain reasonably fits, return an EMPTY candidate list for that domain. "
+    "Use only the provided patient data, local literature snippets, previous case snippets, and local knowledge graph facts. "
+    "For each proposed diagnosis, produce a contrastive rationale: "
+    "(a) key positives FOR it, (b) key negatives AGAINST it, (c) ONE most-discriminative next test to falsify/confirm, "
+    "and (d) a brief comparison to at least one competing hypothesis from the same domain. "
+    "Cite doc_id:span for every non-obvious clinical claim. "
+    "Return valid JSON exactly matching the schema—no extra keys, no prose outside JSON."
+)
+
+PANEL_DOMAINS: Dict[str, Dict[str, str]] = {
+    "infectious": {
+        "label": "Infectious Disease",
+        "scope": "infectious etiologies (viral, bacterial, fungal, parasitic, prion); "
+                 "no autoimmune, malignant, metabolic, vascular or toxic causes; prefer specific pathogens over 'viral syndrome'",
+    },
+    "autoimmune": {
+        "label": "Autoimmune/Rheumatology",
+        "scope": "autoimmune/inflammatory etiologies (SLE, RA, vasculitides, spondyloarthropathies, IBD-associated, APS, "
+                 "sarcoidosis, autoinflammatory); no infectious, neoplastic, metabolic or mechanical causes",
+    },
+    "cardiology": {
+        "label": "Cardiology",
+        "scope": "cardiovascular etiologies (ACS, arrhythmias, heart failure, valvular, pericardial, cardiomyopathies, "
+                 "vascular disease); no non-cardiac causes",
+    },
+    "neurology": {
+        "label": "Neurology",
+        "scope": "neurologic etiologies (stroke/TIA, seizure, demyelinating disease, neuropathies, myopathies, "
+                 "movement disorders, CNS infections, headache disorders); no primary cardiac or purely psychiatric causes",
+    },
+    "oncology": {
+        "label": "Oncology",
+        "scope": "oncologic etiologies (solid tumors, hematologic malignancies, paraneoplastic syndromes, "
+                 "treatment-related complications); no rheumatologic, metabolic or primary cardiac/neurologic causes",
+    },
+    "toxicology": {
+        "label": "Medical Toxicology",
+        "scope": "toxicologic etiologies (xenobiotic exposures, toxidromes, envenomations, environmental/occupational "
+                 "exposures); no causes without a toxicologic mechanism",
+    },
+}
+
+
+def build_panel_user_prompt(agents: List[str], context: Dict, doc_snips: str, kg_snips: str, case_snips: str,
+                            k_docs: int, k_cases: int) -> str:
+    doc_snips, kg_snips, case_snips, n_docs, n_cases = budget_context("Panel", doc_snips, kg_snips, case_snips)
+    k_docs, k_cases = min(k_docs, n_docs), min(k_cases, n_cases)
+    sections = "\n".join(
+        f"- \"{a}\" ({PANEL_DOMAINS[a]['label']}): {PANEL_DOMAINS[a]['scope']}" for a in agents
+    )
+    keys = ", ".join(f"\"{a}\"" for a in agents)
+    exposures = context.get("exposures") or context.get("travel")
+    return f"""
+DOMAINS: {", ".join(PANEL_DOMAINS[a]['label'] for a in agents)}
+
+CASE CONTEXT:
+- Demographics: {context.get("demographics")}
+- Vitals: {context.get("vitals")}
+- Normalized symptoms: {context.get("symptoms_normalized")}
+- Duration days: {context.get("duration_days")}
+- Initial labs: {context.get("initial_labs")}
+- Exposures/travel: {exposures}
+
+LOCAL LITERATURE (top {k_docs}):
+{doc_snips}
+
+PREVIOUS CASES (top {k_cases}):
+{case_snips}
+
+LOCAL KNOWLEDGE GRAPH FACTS (examples):
+{kg_snips}
+
+PER-DOMAIN SECTIONS (one differential per key, apply each scope strictly):
+{sections}
+
+HOUSE-STYLE DIFFERENTIAL (contrastive, falsifiable), for EACH domain:
+- Up to 6 domain-specific diagnoses, DISTINCT within the domain; fewer items rather than crossing domains.
+- For each: FOR, AGAINST, ONE discriminative next test, and a 1-sentence comparison vs a competing hypothesis in that domain.
+- Calibrate confidence realistically (low/medium/high).
+- Cite doc_id:span after non-obvious claims.
+- Return one JSON object with exactly the keys {keys}, each value strictly matching: {AGENT_JSON_SCHEMA_DESC}
+"""
+
+
 # Recommendations prompt (unchanged shape)
 RECOMMENDATIONS_SYSTEM_PROMPT = (
     "You are a clinical recommendations assistant. Given a fused differential (Top-5) and case context, "
@@ -3,7 +3,7 @@ import json
 from typing import List, Dict
 from dotenv import load_dotenv
 
-from .llm import reason
+from .llm import areason
 from .prompts import RECOMMENDATIONS_SYSTEM_PROMPT, build_recommendations_user_prompt
 from .schemas import Recommendation, FusedOutput
 
@@ -19,11 +19,11 @@ def _summarize_fused(fused: FusedOutput) -> str:
     return "\n".join(lines)
 
 
-def generate_recommendations(context: Dict, fused: FusedOutput) -> List[Recommendation]:
+async def generate_recommendations(context: Dict, fused: FusedOutput) -> List[Recommendation]:
     summary = _summarize_fused(fused)
     prompt = build_recommendations_user_prompt(context, summary)
     try:
-        content = reason(
+        content = await areason(
             messages=[
                 {"role": "system", "content": RECOMMENDATIONS_SYSTEM_PROMPT},
                 {"role": "user", "content": prompt},
@@ -0,0 +1,128 @@
+import asyncio
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from .llm import aembed_texts
+from .vectorstore import search_hybrid
+from .casebase import search_previous_cases, case_query_text
+from .kg import to_networkx, neighbors_by_name
+from .metrics import span
+
+AGENTS = ["infectious", "autoimmune", "cardiology", "neurology", "oncology", "toxicology"]
+
+# Query used by an agent when the intake has no normalized symptoms
+FALLBACK_QUERIES: Dict[str, str] = {
+    "infectious": "fever",
+    "autoimmune": "fever",
+    "cardiology": "chest pain",
+    "neurology": "headache",
+    "oncology": "weight loss",
+    "toxicology": "toxidrome",
+}
+
+# Per-agent view size and the shared candidate pool it is sliced from
+K_DENSE = 10
+K_SPARSE = 10
+K_VIEW = 12
+K_CASES = 5
+
+
+class RetrievalBundle:
+    """Retrieval results computed once per request and shared by every specialist.
+
+    Holds one hybrid-search pool per distinct query (all agents share one
+    query unless symptoms are empty), one casebase search and the KG
+    neighbourhood of the symptoms. view(agent) re-slices the pool for a domain.
+    """
+
+    def __init__(self, queries: Dict[str, str], pools: Dict[str, List[Dict]],
+                 prev_cases: List[Dict], kg_lines: List[str]):
+        self.queries = queries
+        self.pools = pools
+        self.prev_cases = prev_cases
+        self.kg_lines = kg_lines
+
+    def passages_for(self, agent: str, k: int = K_VIEW) -> List[Dict]:
+        pool = self.pools.get(self.queries.get(agent, ""), [])
+        # Promote passages tagged with the agent's domain, keep score order otherwise
+        in_domain = [p for p in pool if agent in (p.get("tags") or [])]
+        rest = [p for p in pool if agent not in (p.get("tags") or [])]
+        return (in_domain + rest)[:k]
+
+    def view(self, agent: str) -> Tuple[List[Dict], List[Dict], str]:
+        """(passages, previous cases, KG snippet text) for one specialist."""
+        return self.passages_for(agent), self.prev_cases, "\n".join(self.kg_lines[:20])
+
+
+def _search_pool(query: str, query_vec: Optional[List[float]]) -> List[Dict]:
+    try:
+        with span('retrieval.literature'):
+            # k_final covers the whole dense+sparse union so each domain can re-slice it
+            return search_hybrid(query, k_dense=K_DENSE, k_sparse=K_SPARSE, k_final=K_DENSE + K_SPARSE,
+                                 query_vec=query_vec)
+    except Exception:
+        return []
+
+
+def _search_cases(symptoms: List[str], query_vec: Optional[List[float]]) -> List[Dict]:
+    try:
+        with span('retrieval.casebase'):
+            return search_previous_cases(symptoms, k=K_CASES, query_vec=query_vec)
+    except Exception as e:
+        print(f"Casebase search failed: {e}")
+        return []
+
+
+def _kg_lines(symptoms: List[str], kg_cache: Optional[Dict[str, List[str]]] = None) -> List[str]:
+    with span('retrieval.kg'):
+        try:
+            G = to_networkx()
+        except Exception:
+            return []
+        lines: List[str] = []
+        for s in symptoms[:5]:
+            cached = kg_cache.get(s) if kg_cache is not None else None
+            if cached is None:
+                # indexed name/synonym lookup: cost scales with the matched nodes' degree
+                cached = [f"{src} -[{rel}]-> {dst}" for src, rel, dst in neighbors_by_name(s, G=G, limit=5)]
+                if kg_cache is not None:
+                    kg_cache[s] = cached
+            lines.extend(cached)
+        return lines
+
+
+def _bundle_queries(symptoms: List[str], agents: Sequence[str]) -> Tuple[Dict[str, str], str]:
+    query = ", ".join(symptoms)
+    queries = {a: query or FALLBACK_QUERIES.get(a, "fever") for a in agents}
+    return queries, case_query_text(symptoms)
+
+
+def bundle_query_texts(symptoms: List[str], agents: Sequence[str] = AGENTS) -> List[str]:
+    """Distinct texts abuild_retrieval_bundle embeds for these symptoms."""
+    queries, case_query = _bundle_queries(symptoms, agents)
+    return list(dict.fromkeys(list(queries.values()) + [case_query]))
+
+
+async def abuild_retrieval_bundle(symptoms: List[str], agents: Sequence[str] = AGENTS,
+                                  kg_cache: Optional[Dict[str, List[str]]] = None) -> RetrievalBundle:
+    """Retrieval for one symptom list. kg_cache (symptom -> KG lines) lets bundles
+    built together, e.g. for one batch, share the KG lookup of each symptom."""
+    queries, case_query = _bundle_queries(symptoms, agents)
+    texts = bundle_query_texts(symptoms, agents)
+    try:
+        # one embedding request covers every distinct query
+        with span('retrieval.embed'):
+            vectors = dict(zip(texts, await aembed_texts(texts)))
+    except Exception as e:
+        print(f"Query embedding failed: {e}")
+        vectors = {}
+
+    distinct = list(dict.fromkeys(queries.values()))
+    # Retrieval backends are synchronous; run them side by side off the event loop
+    results = await asyncio.gather(
+        *[asyncio.to_thread(_search_pool, q, vectors.get(q)) for q in distinct],
+        asyncio.to_thread(_search_cases, symptoms, vectors.get(case_query)),
+        asyncio.to_thread(_kg_lines, symptoms, kg_cache),
+    )
+    pools = dict(zip(distinct, results[:len(distinct)]))
+    prev_cases, kg_lines = results[len(distinct)], results[len(distinct) + 1]
+    return RetrievalBundle(queries=queries, pools=pools, prev_cases=prev_cases, kg_lines=kg_lines)
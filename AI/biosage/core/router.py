@@ -0,0 +1,162 @@
+import os
+import time
+import random
+import threading
+from collections import deque
+from typing import Deque, Dict, List, Optional, Tuple
+
+from .metrics import LLM_BACKEND_STATE, LLM_BACKEND_LATENCY
+
+# Latency-aware routing of chat completions across the configured backends
+# (provider + deployment). Each backend has a circuit breaker:
+#   closed    - serving traffic; opens after LLM_BREAKER_FAILURES consecutive failures,
+#               or when the error rate of the last LLM_ROUTER_WINDOW calls reaches
+#               LLM_BREAKER_ERROR_RATE (once LLM_BREAKER_MIN_CALLS have been seen)
+#   open      - skipped for LLM_BREAKER_COOLDOWN_SECONDS
+#   half_open - one probe call is let through; success closes, failure re-opens
+LLM_ROUTER_WINDOW = int(os.getenv('LLM_ROUTER_WINDOW', '20'))
+LLM_ROUTER_EWMA_ALPHA = float(os.getenv('LLM_ROUTER_EWMA_ALPHA', '0.2'))
+# Share of calls sent to a random healthy backend so stale latencies get refreshed
+LLM_ROUTER_EXPLORE = float(os.getenv('LLM_ROUTER_EXPLORE', '0.05'))
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '3'))
+LLM_BREAKER_ERROR_RATE = float(os.getenv('LLM_BREAKER_ERROR_RATE', '0.5'))
+LLM_BREAKER_MIN_CALLS = int(os.getenv('LLM_BREAKER_MIN_CALLS', '5'))
+LLM_BREAKER_COOLDOWN_SECONDS = float(os.getenv('LLM_BREAKER_COOLDOWN_SECONDS', '30'))
+
+CLOSED, HALF_OPEN, OPEN = 'closed', 'half_open', 'open'
+_STATE_VALUE = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class LLMUnavailableError(RuntimeError):
+    """No backend could serve the call (all failed, or every circuit is open)."""
+
+
+class Backend:
+    """Rolling latency, outcomes and breaker state of one provider/deployment."""
+
+    def __init__(self, provider: str, deployment: str, window: int = LLM_ROUTER_WINDOW):
+        self.provider = provider
+        self.deployment = deployment
+        self.name = f"{provider}/{deployment}"
+        self.latency: Optional[float] = None  # EWMA of successful calls, seconds
+        self.outcomes: Deque[bool] = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.state = CLOSED
+        self.opened_at = 0.0
+        self.probing = False
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return sum(1 for ok in self.outcomes if not ok) / len(self.outcomes)
+
+    def expected_latency(self) -> float:
+        """Smoothed latency inflated by the error rate; 0 for an untried backend."""
+        if self.latency is None:
+            return float('inf') if self.outcomes else 0.0
+        return self.latency / max(0.1, 1.0 - self.error_rate())
+
+    def snapshot(self) -> Dict[str, object]:
+        return {'state': self.state, 'latency': None if self.latency is None else round(self.latency, 3),
+                'error_rate': round(self.error_rate(), 3), 'calls': len(self.outcomes)}
+
+
+class ProviderRouter:
+    """Orders backends fastest-healthy-first and trips breakers on failing ones.
+
+    order() ranks candidates; allow() is asked right before a call (it hands
+    out the single half-open probe); record() reports the outcome.
+    """
+
+    def __init__(self, alpha: float = LLM_ROUTER_EWMA_ALPHA, explore: float = LLM_ROUTER_EXPLORE,
+                 failures: int = LLM_BREAKER_FAILURES, error_rate: float = LLM_BREAKER_ERROR_RATE,
+                 min_calls: int = LLM_BREAKER_MIN_CALLS, cooldown: float = LLM_BREAKER_COOLDOWN_SECONDS):
+        self.alpha = alpha
+        self.explore = explore
+        self.failures = failures
+        self.error_rate = error_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._lock = threading.Lock()
+        self._backends: Dict[Tuple[str, str], Backend] = {}
+
+    def _backend(self, provider: str, deployment: str) -> Backend:
+        # Caller holds the lock
+        b = self._backends.get((provider, deployment))
+        if b is None:
+            b = self._backends[(provider, deployment)] = Backend(provider, deployment)
+        return b
+
+    def _set_state(self, b: Backend, state: str) -> None:
+        b.state = state
+        if state == OPEN:
+            b.opened_at = time.monotonic()
+        LLM_BACKEND_STATE.set(_STATE_VALUE[state], backend=b.name)
+
+    def _available(self, b: Backend, now: float) -> bool:
+        if b.state == OPEN:
+            return now - b.opened_at >= self.cooldown and not b.probing
+        if b.state == HALF_OPEN:
+            return not b.probing
+        return True
+
+    def order(self, candidates: List[Tuple[str, str]]) -> List[Tuple[str, str]]:
+        """Available candidates, fastest first (untried backends first, so each gets measured)."""
+        now = time.monotonic()
+        with self._lock:
+            ranked = [(p, d) for p, d in candidates if self._available(self._backend(p, d), now)]
+            ranked.sort(key=lambda c: (self._backends[c].state != CLOSED, self._backends[c].expected_latency()))
+        if len(ranked) > 1 and self.explore > 0 and random.random() < self.explore:
+            ranked.insert(0, ranked.pop(random.randrange(1, len(ranked))))
+        return ranked
+
+    def allow(self, provider: str, deployment: str) -> bool:
+        """Whether a call may go to this backend now; takes the probe of a cooled-down breaker."""
+        now = time.monotonic()
+        with self._lock:
+            b = self._backend(provider, deployment)
+            if b.state == CLOSED:
+                return True
+            if not self._available(b, now):
+                return False
+            b.probing = True
+            self._set_state(b, HALF_OPEN)
+            return True
+
+    def record(self, provider: str, deployment: str, ok: Optional[bool], seconds: Optional[float] = None) -> None:
+        """Report a call: ok=True/False, or None if it was abandoned (cancelled) without an outcome.
+
+        `seconds` (successful calls) feeds the latency average; streams the
+        caller closed early pass None.
+        """
+        with self._lock:
+            b = self._backend(provider, deployment)
+            probe = b.probing
+            b.probing = False
+            if ok is None:
+                return
+            b.outcomes.append(ok)
+            if ok:
+                b.consecutive_failures = 0
+                if seconds is not None:
+                    b.latency = seconds if b.latency is None else (1 - self.alpha) * b.latency + self.alpha * seconds
+                    LLM_BACKEND_LATENCY.set(b.latency, backend=b.name)
+                if b.state != CLOSED:
+                    b.outcomes.clear()
+                    b.outcomes.append(True)
+                    self._set_state(b, CLOSED)
+                return
+            b.consecutive_failures += 1
+            tripped = (b.consecutive_failures >= self.failures
+                       or (len(b.outcomes) >= self.min_calls and b.error_rate() >= self.error_rate))
+            if probe or (b.state == CLOSED and tripped):
+                if b.state != OPEN:
+                    print(f"Circuit open for LLM backend {b.name} (error rate {b.error_rate():.0%})")
+                self._set_state(b, OPEN)
+
+    def stats(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            return {b.name: b.snapshot() for b in self._backends.values()}
+
+
+ROUTER = ProviderRouter()
@@ -56,6 +56,8 @@ class AgentResult(BaseModel):
         "toxicology",
     ]
     candidates: List[Candidate]
+    # Model tier that produced the answer ("fast" or "reasoning", see CASCADE_MODE)
+    tier: Optional[str] = None
 
 class DifferentialItem(BaseModel):
     diagnosis: str
@@ -85,12 +87,18 @@ class FusedOutput(BaseModel):
     differential: List[DifferentialItem]
     next_best_test: NextBestTest
     disagreement_score: Optional[float] = None
+    # score_global gap between the top two differential items
+    top_margin: Optional[float] = None
     test_plans: List[TestPlanItem] = []
 
 class DiagnoseResult(BaseModel):
     agents: List[AgentResult]
     fused: FusedOutput
     recommendations: List["Recommendation"] = []
+    # Specialists that missed their time budget and were left out of the fusion
+    missing_domains: List[str] = []
+    # Specialists the KG triage router judged irrelevant and did not call
+    skipped_domains: List[str] = []
 
 
 # PatientData (incoming schema derived from misc/patient_data.txt)
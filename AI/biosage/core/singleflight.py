@@ -0,0 +1,120 @@
+import os
+import json
+import asyncio
+import hashlib
+import threading
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+from .metrics import SINGLEFLIGHT_CALLS
+
+# Coalesce identical in-flight calls (LLM chat, embeddings, hybrid search): set to off
+# to let every caller do its own work
+SINGLEFLIGHT = os.getenv('SINGLEFLIGHT', 'on').lower() in ('1', 'on', 'true', 'yes')
+
+
+def flight_key(*parts: Any) -> str:
+    """Stable hash of a call's identifying arguments."""
+    blob = json.dumps(parts, sort_keys=True, ensure_ascii=False, separators=(',', ':'), default=str)
+    return hashlib.sha256(blob.encode('utf-8')).hexdigest()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error', 'waiters')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+        self.waiters = 0
+
+
+class _Flight:
+    __slots__ = ('task', 'waiters')
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Keyed deduplication of concurrent identical calls.
+
+    The first caller for a key runs the work; callers arriving while it is in
+    flight wait for and share its result (or exception). Nothing is kept once
+    the call finishes, so this is not a cache: it only removes the duplicate
+    work of requests that overlap in time. do() serves threads, ado() coroutines
+    on the running loop; the shared coroutine runs as its own task, so one
+    caller timing out does not cancel the others (it is cancelled once every
+    caller has given up).
+    """
+
+    def __init__(self, enabled: bool = SINGLEFLIGHT):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._calls: Dict[str, _Call] = {}
+        self._flights: Dict[Tuple[Any, str], _Flight] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def _count(self, kind: str, outcome: str) -> None:
+        SINGLEFLIGHT_CALLS.inc(kind=kind, outcome=outcome)
+        with self._lock:
+            by_kind = self.stats.setdefault(kind, {'leader': 0, 'shared': 0})
+            by_kind[outcome] += 1
+
+    def do(self, kind: str, key: str, fn: Callable[[], Any]) -> Any:
+        if not self.enabled:
+            return fn()
+        key = f"{kind}:{key}"
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            call.waiters += 1
+        if not leader:
+            self._count(kind, 'shared')
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        self._count(kind, 'leader')
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+            call.done.set()
+
+    async def ado(self, kind: str, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        if not self.enabled:
+            return await fn()
+        loop = asyncio.get_running_loop()
+        fkey = (loop, f"{kind}:{key}")
+        flight = self._flights.get(fkey)
+        if flight is None:
+            self._count(kind, 'leader')
+            flight = self._flights[fkey] = _Flight(asyncio.ensure_future(fn()))
+            flight.task.add_done_callback(lambda _t: self._flights.pop(fkey, None))
+        else:
+            self._count(kind, 'shared')
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if not flight.task.done() and flight.waiters == 1:
+                flight.task.cancel()  # last interested caller left
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def saved(self) -> Dict[str, int]:
+        """Calls served from another caller's in-flight work, by kind."""
+        with self._lock:
+            return {kind: s['shared'] for kind, s in self.stats.items()}
+
+
+FLIGHTS = SingleFlight()
@@ -0,0 +1,170 @@
+import os
+import re
+from typing import Dict, List, Optional, Sequence, Tuple
+
+try:
+    import tiktoken  # type: ignore
+except Exception:  # pragma: no cover - optional dependency
+    tiktoken = None
+
+from .metrics import PROMPT_TOKENS
+
+# Token budget for the retrieved context sections of a specialist prompt
+# (literature, previous cases, KG facts); 0 disables budgeting. The case
+# context and instructions are always sent in full.
+PROMPT_TOKEN_BUDGET = int(os.getenv('PROMPT_TOKEN_BUDGET', '3000'))
+# Section priority (first = filled first when shares leave tokens over) and the
+# share of the budget each section is guaranteed before leftovers are handed out
+PROMPT_SECTION_PRIORITY = [s.strip() for s in os.getenv('PROMPT_SECTION_PRIORITY', 'literature,kg,cases').split(',') if s.strip()]
+PROMPT_SECTION_SHARES: Dict[str, float] = {
+    name: float(share)
+    for name, share in (item.split(':') for item in os.getenv('PROMPT_SECTION_SHARES', 'literature:0.5,cases:0.3,kg:0.2').split(',') if ':' in item)
+}
+# Tokenizer encoding (tiktoken when installed, ~4 chars/token otherwise)
+PROMPT_TOKENIZER = os.getenv('PROMPT_TOKENIZER', 'o200k_base')
+# Print each prompt's per-section token usage
+PROMPT_BUDGET_LOG = os.getenv('PROMPT_BUDGET_LOG', 'off').lower() in ('1', 'on', 'true', 'yes')
+
+# A truncated item shorter than this is dropped instead
+MIN_ITEM_TOKENS = 16
+
+_SENTENCE_RE = re.compile(r'(?<=[.!?;])\s+')
+_encoding = None
+
+
+def _get_encoding():
+    global _encoding
+    if _encoding is None and tiktoken is not None:
+        try:
+            _encoding = tiktoken.get_encoding(PROMPT_TOKENIZER)
+        except Exception as e:
+            print(f"tiktoken encoding {PROMPT_TOKENIZER} unavailable, estimating tokens: {e}")
+            _encoding = False
+    return _encoding or None
+
+
+def count_tokens(text: str) -> int:
+    if not text:
+        return 0
+    enc = _get_encoding()
+    if enc is not None:
+        return len(enc.encode(text, disallowed_special=()))
+    # ~4 characters per token for English/clinical text
+    return max(1, len(text) // 4)
+
+
+def _norm_sentence(s: str) -> str:
+    return re.sub(r'\W+', ' ', s.lower()).strip()
+
+
+def _truncate(item: str, max_tokens: int) -> str:
+    """Longest prefix of whole sentences that fits; a single over-long first sentence is cut on a word."""
+    if count_tokens(item) <= max_tokens:
+        return item
+    out = ''
+    for sentence in _SENTENCE_RE.split(item):
+        candidate = f"{out} {sentence}" if out else sentence
+        if count_tokens(candidate) > max_tokens:
+            break
+        out = candidate
+    if out:
+        return out
+    words = item.split()
+    while words and count_tokens(' '.join(words) + ' …') > max_tokens:
+        words = words[:max(0, int(len(words) * 0.8))]
+    return ' '.join(words) + ' …' if words else ''
+
+
+def _dedupe(items: Sequence[str], seen: set) -> List[str]:
+    # Drop sentences already present in a higher-priority item (overlapping chunks,
+    # the same passage cited in literature and in a previous case)
+    out = []
+    for item in items:
+        prefix, body = '', item
+        m = re.match(r'(- [^:\n]{0,80}: )', item)
+        if m:
+            prefix, body = m.group(1), item[m.end():]
+        kept = []
+        for sentence in _SENTENCE_RE.split(body):
+            key = _norm_sentence(sentence)
+            if not key:
+                continue
+            if key in seen:
+                continue
+            seen.add(key)
+            kept.append(sentence)
+        if kept:
+            out.append(prefix + ' '.join(kept))
+    return out
+
+
+def split_items(text: str) -> List[str]:
+    """Items of a formatted section: '- id: text' bullets, or one item per line."""
+    if not text:
+        return []
+    if text.lstrip().startswith('- '):
+        return [s.strip() for s in re.split(r'\n(?=- )', text) if s.strip()]
+    return [line for line in text.splitlines() if line.strip()]
+
+
+def allocate(sections: Dict[str, List[str]], budget: int = PROMPT_TOKEN_BUDGET,
+             label: str = '') -> Tuple[Dict[str, List[str]], Dict[str, int]]:
+    """Fit the sections' items into `budget` tokens; returns (kept items, tokens used) per section.
+
+    Items are deduplicated across sections in priority order. Each section is
+    first filled up to its share of the budget, then what is left goes to the
+    sections in priority order. Within a section items keep their (relevance)
+    order; the first item that does not fit is cut on a sentence boundary and
+    the rest are dropped.
+    """
+    order = [s for s in PROMPT_SECTION_PRIORITY if s in sections] + [s for s in sections if s not in PROMPT_SECTION_PRIORITY]
+    seen: set = set()
+    items = {name: _dedupe(sections[name], seen) for name in order}
+    if budget <= 0:
+        used = {name: sum(count_tokens(i) for i in items[name]) for name in order}
+        _report(label, used)
+        return items, used
+
+    kept: Dict[str, List[str]] = {name: [] for name in order}
+    used: Dict[str, int] = {name: 0 for name in order}
+    cursor: Dict[str, int] = {name: 0 for name in order}
+    cut: Dict[str, bool] = {name: False for name in order}
+
+    def fill(name: str, limit: int) -> None:
+        while cursor[name] < len(items[name]) and not cut[name]:
+            item = items[name][cursor[name]]
+            n = count_tokens(item) + 1  # + newline
+            if used[name] + n <= limit:
+                kept[name].append(item)
+                used[name] += n
+                cursor[name] += 1
+                continue
+            room = limit - used[name] - 1
+            if room >= MIN_ITEM_TOKENS:
+                short = _truncate(item, room)
+                if short:
+                    kept[name].append(short)
+                    used[name] += count_tokens(short) + 1
+            cut[name] = True
+
+    total_share = sum(PROMPT_SECTION_SHARES.get(name, 0.0) for name in order) or 1.0
+    for name in order:
+        fill(name, int(budget * PROMPT_SECTION_SHARES.get(name, 0.0) / total_share))
+    for name in order:
+        # Leftovers: sections stopped at their share may continue past it
+        if cut[name] and len(kept[name]) > cursor[name]:
+            # last kept item was a truncation; give it another chance with the extra room
+            kept[name].pop()
+            used[name] = sum(count_tokens(i) + 1 for i in kept[name])
+        cut[name] = False
+        fill(name, used[name] + budget - sum(used.values()))
+    _report(label, used)
+    return kept, used
+
+
+def _report(label: str, used: Dict[str, int]) -> None:
+    for name, n in used.items():
+        PROMPT_TOKENS.inc(n, agent=label, section=name)
+    if PROMPT_BUDGET_LOG:
+        parts = ', '.join(f"{name}={n}" for name, n in used.items())
+        print(f"Prompt tokens [{label}]: {parts} (budget {PROMPT_TOKEN_BUDGET})")
@@ -0,0 +1,179 @@
+import os
+import threading
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+import networkx as nx
+from scipy import sparse
+
+from .kg import to_networkx, kg_index
+from .retrieval import AGENTS
+
+# Triage modes: 'rank' (default) runs all specialists but launches the relevant
+# ones first, 'skip' runs only the relevant ones (opt-in: the KG misses some
+# presentations, e.g. joint pain + rash scores no autoimmune disease), 'all'
+# disables triage.
+TRIAGE_MODE = os.getenv('TRIAGE_MODE', 'rank').lower()
+# Specialists whose domain relevance is below the threshold are skipped
+TRIAGE_THRESHOLD = float(os.getenv('TRIAGE_THRESHOLD', '0.15'))
+# ...but the top TRIAGE_MIN_AGENTS domains always run
+TRIAGE_MIN_AGENTS = int(os.getenv('TRIAGE_MIN_AGENTS', '2'))
+
+# Finding edges scored by the router (Disease -> Symptom / Lab)
+FINDING_RELS = ('has_symptom', 'associated_with_lab_pattern')
+
+# Specialist owning each KG disease (mirrors the sections of scripts/build_kg.py).
+# A Disease -[in_domain]-> <agent name> edge in the KG overrides this table.
+DISEASE_DOMAINS: Dict[str, str] = {
+    'Dengue': 'infectious',
+    'Malaria (P. falciparum/vivax)': 'infectious',
+    'Influenza': 'infectious',
+    'COVID-19': 'infectious',
+    'Tuberculosis': 'infectious',
+    'Enteric fever (Typhoid/Paratyphoid)': 'infectious',
+    'Community-acquired pneumonia': 'infectious',
+    'Urinary tract infection': 'infectious',
+    'Systemic lupus erythematosus': 'autoimmune',
+    'Rheumatoid arthritis': 'autoimmune',
+    'Axial spondyloarthritis': 'autoimmune',
+    "Sjögren's syndrome": 'autoimmune',
+    'ANCA-associated vasculitis': 'autoimmune',
+    'Inflammatory bowel disease (UC/Crohn’s)': 'autoimmune',
+    'Autoimmune thyroid disease': 'autoimmune',
+    "Adult-onset Still's disease": 'autoimmune',
+    'Acute coronary syndrome': 'cardiology',
+    'Atrial fibrillation': 'cardiology',
+    'Heart failure (HFrEF/HFpEF)': 'cardiology',
+    'Aortic stenosis': 'cardiology',
+    'Acute pericarditis': 'cardiology',
+    'Ischemic stroke': 'neurology',
+    'Transient ischemic attack': 'neurology',
+    'Generalized seizure': 'neurology',
+    'Migraine with aura': 'neurology',
+    'Guillain-Barré syndrome': 'neurology',
+    'Lung cancer (NSCLC/SCLC)': 'oncology',
+    'Non-Hodgkin lymphoma': 'oncology',
+    'Acute myeloid leukemia': 'oncology',
+    'Opioid overdose': 'toxicology',
+    'Organophosphate poisoning': 'toxicology',
+    'Acetaminophen toxicity': 'toxicology',
+    'Acute hepatitis': 'toxicology',
+}
+
+
+class TriageMatrix:
+    """Sparse finding x disease weight matrix built from the KG's finding edges.
+
+    Column d is normalized by disease d's total finding weight, so x @ W for a
+    0/1 vector x of observed findings gives the fraction of each disease's
+    finding weight the patient matches.
+    """
+
+    def __init__(self, G: nx.Graph):
+        rows: List[int] = []
+        cols: List[int] = []
+        vals: List[float] = []
+        self.findings: Dict[Any, int] = {}
+        self.diseases: Dict[Any, int] = {}
+        for u, v, edata in G.edges(data=True):
+            if edata.get('rel') not in FINDING_RELS:
+                continue
+            rows.append(self.findings.setdefault(v, len(self.findings)))
+            cols.append(self.diseases.setdefault(u, len(self.diseases)))
+            vals.append(float(edata.get('weight') or 1.0))
+        W = sparse.csr_matrix((np.asarray(vals, dtype='float32'), (rows, cols)),
+                              shape=(len(self.findings), len(self.diseases)))
+        W.sum_duplicates()
+        totals = np.asarray(W.sum(axis=0)).ravel()
+        self.weights = (W @ sparse.diags(1.0 / np.where(totals > 0, totals, 1.0))).tocsr()
+
+        in_domain: Dict[Any, str] = {}
+        for u, v, edata in G.edges(data=True):
+            if edata.get('rel') == 'in_domain':
+                in_domain[u] = str(G.nodes[v].get('name', '')).lower()
+        # Column -> agent name (None for diseases no specialist owns)
+        self.domain_of: List[Optional[str]] = [None] * len(self.diseases)
+        for node, col in self.diseases.items():
+            domain = in_domain.get(node) or DISEASE_DOMAINS.get(G.nodes[node].get('name'))
+            self.domain_of[col] = domain if domain in AGENTS else None
+
+    def score(self, finding_nodes: Sequence[Any]) -> np.ndarray:
+        x = np.zeros(len(self.findings), dtype='float32')
+        for n in finding_nodes:
+            i = self.findings.get(n)
+            if i is not None:
+                x[i] = 1.0
+        return np.asarray(self.weights.T @ x).ravel()
+
+
+_matrix_cache: Dict[str, Any] = {'graph': None, 'matrix': None}
+_matrix_lock = threading.Lock()
+
+
+def triage_matrix(G: Optional[nx.Graph] = None) -> TriageMatrix:
+    """TriageMatrix for G (defaults to the cached KG); rebuilt only when the graph changes."""
+    if G is None:
+        G = to_networkx()
+    with _matrix_lock:
+        if _matrix_cache['graph'] is not G:
+            _matrix_cache['matrix'] = TriageMatrix(G)
+            _matrix_cache['graph'] = G
+        return _matrix_cache['matrix']
+
+
+class TriageResult:
+    def __init__(self, relevance: Dict[str, float], matched: List[str], selected: List[str], skipped: List[str]):
+        self.relevance = relevance
+        self.matched = matched
+        self.selected = selected  # specialists to run, most relevant first
+        self.skipped = skipped
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'relevance': self.relevance, 'matched': self.matched,
+                'selected': self.selected, 'skipped': self.skipped}
+
+
+def domain_relevance(symptoms: Sequence[str], G: Optional[nx.Graph] = None):
+    """(relevance per agent in [0, 1], symptoms that matched a KG finding).
+
+    A domain's relevance is its best-matching disease's share of finding weight.
+    """
+    if G is None:
+        G = to_networkx()
+    index = kg_index(G)
+    matrix = triage_matrix(G)
+    nodes: List[Any] = []
+    matched: List[str] = []
+    for s in symptoms:
+        hits = [n for n in index.nodes_by_name(s) if n in matrix.findings]
+        if hits:
+            nodes.extend(hits)
+            matched.append(s)
+    scores = matrix.score(nodes)
+    relevance = {a: 0.0 for a in AGENTS}
+    for col, domain in enumerate(matrix.domain_of):
+        if domain is not None and scores[col] > relevance[domain]:
+            relevance[domain] = float(scores[col])
+    return {a: round(v, 3) for a, v in relevance.items()}, matched
+
+
+def triage(symptoms: Sequence[str], mode: str = TRIAGE_MODE, threshold: float = TRIAGE_THRESHOLD,
+           min_agents: int = TRIAGE_MIN_AGENTS) -> TriageResult:
+    """Pick the specialists to run for these normalized symptoms.
+
+    Falls back to every specialist when triage is off ('all'), the KG is
+    unavailable, or none of the symptoms matched a KG finding.
+    """
+    everyone = list(AGENTS)
+    if mode == 'all':
+        return TriageResult({}, [], everyone, [])
+    try:
+        relevance, matched = domain_relevance(symptoms)
+    except Exception as e:
+        print(f"Triage failed: {e}")
+        return TriageResult({}, [], everyone, [])
+    ranked = sorted(everyone, key=lambda a: -relevance[a])  # stable: ties keep AGENTS order
+    if not matched or mode != 'skip':
+        return TriageResult(relevance, matched, ranked, [])
+    selected = [a for i, a in enumerate(ranked) if i < min_agents or relevance[a] >= threshold]
+    return TriageResult(relevance, matched, selected, [a for a in ranked if a not in selected])
@@ -1,6 +1,8 @@
 import os
 import json
-from typing import List, Dict, Any, Tuple
+import time
+import threading
+from typing import List, Dict, Any, Tuple, Optional
 import numpy as np
 
 try:
@@ -8,8 +10,9 @@ try:
 except Exception:
     faiss = None
 
-from rank_bm25 import BM25Okapi
 from .embeddings import embed_texts
+from .bm25 import load_or_build as load_or_build_bm25, tokenize
+from .singleflight import FLIGHTS
 
 ROOT = os.path.dirname(os.path.dirname(__file__))
 LIT_DIR = os.path.join(ROOT, 'data', 'literature')
@@ -17,23 +20,25 @@ LIT_PATH = os.path.join(LIT_DIR, 'corpus.jsonl')
 VEC_DIR = os.path.join(ROOT, 'storage', 'vector')
 INDEX_FILE = os.path.join(VEC_DIR, 'faiss.index')
 META_FILE = os.path.join(VEC_DIR, 'meta.jsonl')
+BM25_DIR = os.getenv('BM25_DIR', os.path.join(VEC_DIR, 'bm25'))
+# Seconds between on-disk change checks for the shared retriever
+RETRIEVER_CHECK_INTERVAL = float(os.getenv('RETRIEVER_CHECK_INTERVAL', '2.0'))
 
 # Cache for search results
 _search_cache: Dict[str, List[Dict[str, Any]]] = {}
 
 
+def _literature_files() -> List[str]:
+    if os.path.isdir(LIT_DIR):
+        return [os.path.join(LIT_DIR, n) for n in sorted(os.listdir(LIT_DIR)) if n.endswith('.jsonl')]
+    return [LIT_PATH] if os.path.exists(LIT_PATH) else []
+
+
 def load_corpus_chunks() -> Tuple[List[str], List[Dict[str, Any]]]:
     texts: List[str] = []
     meta: List[Dict[str, Any]] = []
     seen_ids = set()
-    files: List[str] = []
-    if os.path.isdir(LIT_DIR):
-        for name in sorted(os.listdir(LIT_DIR)):
-            if name.endswith('.jsonl'):
-                files.append(os.path.join(LIT_DIR, name))
-    elif os.path.exists(LIT_PATH):
-        files.append(LIT_PATH)
-    for path in files:
+    for path in _literature_files():
         try:
             with open(path, 'r', encoding='utf-8') as f:
                 for raw_line in f:
@@ -63,10 +68,71 @@ def load_corpus_chunks() -> Tuple[List[str], List[Dict[str, Any]]]:
     return texts, meta
 
 
-# Load corpus for BM25 (after function definition)
-_texts, _metas = load_corpus_chunks()
-_tokenized_corpus = [t.split() for t in _texts]  # naive tokenization
-_bm25 = BM25Okapi(_tokenized_corpus) if _texts else None
+def _manifest() -> Tuple:
+    """(path, mtime_ns, size) for every file the retriever state is built from."""
+    out = []
+    for path in [INDEX_FILE, META_FILE] + _literature_files():
+        try:
+            st = os.stat(path)
+            out.append((path, st.st_mtime_ns, st.st_size))
+        except OSError:
+            out.append((path, None, None))
+    return tuple(out)
+
+
+class _RetrieverState:
+    """Immutable snapshot of the corpus, BM25 model and FAISS index."""
+
+    def __init__(self, manifest: Tuple):
+        self.manifest = manifest
+        self.texts, self.metas = load_corpus_chunks()
+        # Sparse BM25 matrix persisted next to faiss.index; memory-mapped when it matches the corpus
+        self.bm25 = load_or_build_bm25(BM25_DIR, self.texts)
+        self.index = None
+        if faiss is not None and os.path.exists(INDEX_FILE):
+            try:
+                self.index = faiss.read_index(INDEX_FILE)
+            except Exception as e:
+                print(f"Failed to load FAISS index: {e}")
+        if self.index is not None and self.index.ntotal != len(self.texts):
+            print(f"FAISS index has {self.index.ntotal} vectors but corpus has {len(self.texts)} chunks; rebuild vectors")
+
+
+class Retriever:
+    """Process-wide holder of the retrieval state, shared across requests.
+
+    The state is loaded once and swapped atomically when the index or corpus
+    files change on disk (checked at most every RETRIEVER_CHECK_INTERVAL seconds).
+    """
+
+    def __init__(self, check_interval: float = RETRIEVER_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._state: Optional[_RetrieverState] = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def state(self) -> _RetrieverState:
+        state = self._state
+        now = time.monotonic()
+        if state is not None and now - self._checked_at < self.check_interval:
+            return state
+        with self._lock:
+            self._checked_at = time.monotonic()
+            manifest = _manifest()
+            if self._state is None or self._state.manifest != manifest:
+                self._state = _RetrieverState(manifest)
+                _search_cache.clear()
+            return self._state
+
+    def reload(self) -> _RetrieverState:
+        with self._lock:
+            self._state = _RetrieverState(_manifest())
+            self._checked_at = time.monotonic()
+            _search_cache.clear()
+            return self._state
+
+
+RETRIEVER = Retriever()
 
 
 def build_faiss_index():
@@ -86,6 +152,7 @@ def build_faiss_index():
     with open(META_FILE, 'w', encoding='utf-8') as f:
         for m in meta:
             f.write(json.dumps(m) + '\n')
+    RETRIEVER.reload()
 
 
 def load_index():
@@ -113,21 +180,28 @@ def _load_meta_only() -> List[Dict[str, Any]]:
     return items
 
 
-def search(query: str, k: int = 8) -> List[Dict[str, Any]]:
-    """Return top-k passages with metadata and text: [{doc_id,title,year,tags,score,text}]"""
+def search(query: str, k: int = 8, query_vec: Optional[List[float]] = None) -> List[Dict[str, Any]]:
+    """Return top-k passages with metadata and text: [{doc_id,title,year,tags,score,text}]
+
+    Pass query_vec to reuse an embedding of `query` computed by the caller.
+    """
     if faiss is None:
         raise RuntimeError('faiss-cpu not installed')
-    index = load_index()
-    # load full corpus to map indices -> text/meta (same order used at build time)
-    texts, metas = load_corpus_chunks()
+    state = RETRIEVER.state()
+    if state.index is None:
+        raise RuntimeError('Vector index not built')
+    # corpus order matches the order used at build time
+    texts, metas = state.texts, state.metas
     if not texts:
         return []
-    qv = np.array(embed_texts([query])[0], dtype='float32')[None, :]
+    if query_vec is None:
+        query_vec = embed_texts([query])[0]
+    qv = np.array(query_vec, dtype='float32')[None, :]
     faiss.normalize_L2(qv)
-    D, I = index.search(qv, min(k, len(metas)))
+    D, I = state.index.search(qv, min(k, len(metas)))
     out: List[Dict[str, Any]] = []
     for score, idx in zip(D[0].tolist(), I[0].tolist()):
-        if idx == -1:
+        if idx == -1 or idx >= len(metas):
             continue
         m = dict(metas[idx])
         m['score'] = float(score)
@@ -139,23 +213,21 @@ def search(query: str, k: int = 8) -> List[Dict[str, Any]]:
 
 
 def bm25_search(query: str, k: int = 10) -> List[Dict[str, Any]]:
-    if _bm25 is None:
+    state = RETRIEVER.state()
+    if state.bm25 is None:
         return []
-    query_tokens = query.split()
-    scores = _bm25.get_scores(query_tokens)
-    top_indices = np.argsort(scores)[::-1][:k]
     results = []
-    for idx in top_indices:
-        if scores[idx] > 0:
-            m = dict(_metas[idx])
-            m['score'] = float(scores[idx])
-            m['text'] = _texts[idx][:800] + '...' if len(_texts[idx]) > 800 else _texts[idx]
-            results.append(m)
+    for idx, score in state.bm25.top_k(tokenize(query), k):
+        m = dict(state.metas[idx])
+        m['score'] = score
+        m['text'] = state.texts[idx][:800] + '...' if len(state.texts[idx]) > 800 else state.texts[idx]
+        results.append(m)
     return results
 
-def hybrid_search(query: str, k_dense: int = 8, k_sparse: int = 8, k_final: int = 8) -> List[Dict[str, Any]]:
+def hybrid_search(query: str, k_dense: int = 8, k_sparse: int = 8, k_final: int = 8,
+                  query_vec: Optional[List[float]] = None) -> List[Dict[str, Any]]:
     # Dense retrieval
-    dense_results = search(query, k_dense)
+    dense_results = search(query, k_dense, query_vec=query_vec)
     # Sparse retrieval
     sparse_results = bm25_search(query, k_sparse)
     # Combine and dedupe by doc_id
@@ -168,10 +240,13 @@ def hybrid_search(query: str, k_dense: int = 8, k_sparse: int = 8, k_final: int
     sorted_results = sorted(combined.values(), key=lambda x: x['score'], reverse=True)[:k_final]
     return sorted_results
 
-def search_hybrid(query: str, k_dense: int = 8, k_sparse: int = 8, k_final: int = 8) -> List[Dict[str, Any]]:
+def search_hybrid(query: str, k_dense: int = 8, k_sparse: int = 8, k_final: int = 8,
+                  query_vec: Optional[List[float]] = None) -> List[Dict[str, Any]]:
     cache_key = f"{query}_{k_dense}_{k_sparse}_{k_final}"
     if cache_key in _search_cache:
         return _search_cache[cache_key]
-    result = hybrid_search(query, k_dense, k_sparse, k_final)
+    # Concurrent searches for the same query (duplicate cases in a batch) run once
+    result = FLIGHTS.do('search', cache_key,
+                        lambda: hybrid_search(query, k_dense, k_sparse, k_final, query_vec=query_vec))
     _search_cache[cache_key] = result
     return result
@@ -0,0 +1,112 @@
+import queue
+import threading
+import time
+from typing import Any, Callable, List, Optional
+
+
+class WriteBehindQueue:
+    """Bounded in-process queue drained by one background writer thread.
+
+    submit() enqueues an item and returns immediately (or waits for its batch
+    to be written when wait=True). The writer collects up to `batch_max` items,
+    waiting at most `linger` seconds for more after the first, and hands them
+    to `write_batch` in one call. When the queue is full, submit() blocks for
+    up to `put_timeout` seconds and then writes the item inline, so memory
+    stays bounded and nothing is dropped.
+    """
+
+    def __init__(self, write_batch: Callable[[List[Any]], None], max_items: int = 1000,
+                 batch_max: int = 64, linger: float = 0.05, put_timeout: float = 1.0,
+                 name: str = 'write-behind'):
+        self.write_batch = write_batch
+        self.batch_max = max(1, batch_max)
+        self.linger = max(0.0, linger)
+        self.put_timeout = put_timeout
+        self.name = name
+        self._queue: 'queue.Queue' = queue.Queue(maxsize=max(1, max_items))
+        self._cond = threading.Condition()
+        self._pending = 0
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+
+    def _ensure_thread(self) -> None:
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            self._thread.start()
+
+    def submit(self, item: Any, wait: bool = False, timeout: Optional[float] = None) -> bool:
+        """Queue an item; with wait=True return only once its batch was written (False on timeout)."""
+        if self._closed:
+            self._write([item])
+            return True
+        done = threading.Event() if wait else None
+        with self._cond:
+            self._pending += 1
+            self._ensure_thread()
+        try:
+            self._queue.put((item, done), timeout=self.put_timeout)
+        except queue.Full:
+            # Back-pressure: the caller pays for its own write instead of growing the queue
+            try:
+                self._write([item])
+            finally:
+                self._done(1)
+            return True
+        if done is not None:
+            return done.wait(timeout)
+        return True
+
+    def _write(self, items: List[Any]) -> None:
+        try:
+            self.write_batch(items)
+        except Exception as e:
+            print(f"{self.name} batch write failed: {e}")
+
+    def _done(self, n: int) -> None:
+        with self._cond:
+            self._pending -= n
+            if self._pending <= 0:
+                self._cond.notify_all()
+
+    def _run(self) -> None:
+        while True:
+            first = self._queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.linger
+            while len(batch) < self.batch_max:
+                try:
+                    remaining = deadline - time.monotonic()
+                    nxt = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is None:
+                    # Stop marker: write what we have, then exit
+                    self._queue.put(None)
+                    break
+                batch.append(nxt)
+            self._write([item for item, _ in batch])
+            for _, done in batch:
+                if done is not None:
+                    done.set()
+            self._done(len(batch))
+
+    def pending(self) -> int:
+        with self._cond:
+            return self._pending
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Block until every queued item has been written. Returns False on timeout."""
+        with self._cond:
+            return self._cond.wait_for(lambda: self._pending <= 0, timeout)
+
+    def close(self, timeout: Optional[float] = 10.0) -> None:
+        """Flush outstanding writes and stop the writer; later submits write inline."""
+        if self._closed:
+            return
+        self.flush(timeout)
+        self._closed = True
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
@@ -0,0 +1,92 @@
+# End-to-end latency/throughput benchmark of diagnose_patient over the golden cases.
+# Runs offline against a cassette (LLM_CASSETTE_MODE=replay) or the fake server
+# (OPENAI_BASE_URL=http://127.0.0.1:8089/v1, see scripts/fake_openai_server.py).
+#
+# Usage: python -m biosage.scripts.bench_diagnose --requests 50 --concurrency 8
+import os
+import json
+import time
+import asyncio
+import argparse
+from typing import Dict, List
+
+from biosage.core.schemas import PatientData
+from biosage.core.orchestrator import diagnose_patient
+from biosage.core.metrics import LLM_CALLS
+from biosage.core.evidence import EVIDENCE
+from biosage.core.cassette import CASSETTE
+from biosage.core.singleflight import FLIGHTS
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'tests', 'golden')
+
+
+def load_patients() -> List[PatientData]:
+    patients = []
+    for name in sorted(os.listdir(GOLDEN_DIR)):
+        if not name.endswith('.json'):
+            continue
+        with open(os.path.join(GOLDEN_DIR, name), 'r') as f:
+            case = json.load(f)
+        intake = case['intake']
+        temp = intake.get('vitals', {}).get('temperature')
+        patients.append(PatientData.model_validate({
+            'basic': {'mrn': case['case_id']},
+            'case': {'case_id': case['case_id'], 'patient_id': case['case_id'],
+                     'chief_complaint': ', '.join(intake.get('symptoms', []))},
+            'vitals': {'temperature': str(temp) if temp is not None else None},
+        }))
+    return patients
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+async def run(requests: int, concurrency: int) -> Dict[str, float]:
+    patients = load_patients()
+    sem = asyncio.Semaphore(max(1, concurrency))
+    latencies: List[float] = []
+    failures = 0
+
+    async def one(i: int) -> None:
+        nonlocal failures
+        async with sem:
+            start = time.perf_counter()
+            try:
+                await diagnose_patient(patients[i % len(patients)])
+            except Exception as e:
+                failures += 1
+                print(f"Request {i} failed: {e}")
+                return
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[one(i) for i in range(requests)])
+    wall = time.perf_counter() - start
+    return {
+        'requests': requests,
+        'failures': failures,
+        'wall_s': round(wall, 3),
+        'throughput_rps': round(len(latencies) / wall, 3) if wall > 0 else 0.0,
+        'p50_s': round(percentile(latencies, 0.50), 3),
+        'p95_s': round(percentile(latencies, 0.95), 3),
+        'p99_s': round(percentile(latencies, 0.99), 3),
+        'max_s': round(max(latencies, default=0.0), 3),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark diagnose_patient over the golden cases')
+    parser.add_argument('--requests', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    args = parser.parse_args()
+    summary = asyncio.run(run(args.requests, args.concurrency))
+    EVIDENCE.close()
+    print(json.dumps(summary, indent=2))
+    print('\n'.join(line for line in LLM_CALLS.render() if not line.startswith('#')))
+    print(f"singleflight saved: {FLIGHTS.saved()}")
+    if CASSETTE.enabled:
+        print(f"cassette {CASSETTE.mode}: {CASSETTE.stats}")
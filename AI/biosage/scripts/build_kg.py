@@ -424,7 +424,7 @@ if __name__ == '__main__':
         c.commit()
 
     # Export/inspect
-    G = to_networkx()
+    G = to_networkx(export=True)
     print(f'KG nodes: {G.number_of_nodes()}, edges: {G.number_of_edges()}')
     # Tip: you can serialize for Gephi/Neo4j exploration:
     # import networkx as nx
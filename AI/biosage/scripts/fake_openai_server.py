@@ -0,0 +1,211 @@
+# Fake OpenAI-compatible server for offline benchmarks and CI.
+# Serves /v1/chat/completions and /v1/embeddings with deterministic answers shaped
+# like the ones BioSage expects (specialist candidates, panel sections,
+# recommendations, clarifying questions) and a configurable synthetic latency.
+# With --cassette, recorded responses (LLM_CASSETTE_MODE=record) are served first.
+# --error-rate makes a share of chat calls fail with HTTP 500, to exercise provider
+# failover and circuit breakers. Chat calls with "stream": true are answered as
+# server-sent chat.completion.chunk events, the latency spread across the chunks.
+#
+# Usage:
+#   python -m biosage.scripts.fake_openai_server --port 8089 --latency-ms 800 --jitter-ms 200
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=fake uvicorn biosage.app.main:app
+#
+# Two backends, a flaky primary and a slower local fallback:
+#   python -m biosage.scripts.fake_openai_server --port 8089 --latency-ms 300 --error-rate 0.5
+#   python -m biosage.scripts.fake_openai_server --port 8090 --latency-ms 900
+#   OPENAI_BASE_URL=http://127.0.0.1:8089/v1 VLLM_BASE_URL=http://127.0.0.1:8090/v1 \
+#     LLM_PROVIDERS=openai,vllm_local uvicorn biosage.app.main:app
+import re
+import json
+import time
+import random
+import asyncio
+import hashlib
+import argparse
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+from biosage.core.cassette import Cassette, CassetteMiss, chat_key, chat_family, embed_key, embed_family
+
+AGENTS = ["infectious", "autoimmune", "cardiology", "neurology", "oncology", "toxicology"]
+
+# Deterministic answer pool per specialty (picked by hashing the prompt)
+DOMAIN_DIAGNOSES: Dict[str, List[str]] = {
+    "infectious": ["Dengue", "Malaria", "Influenza", "Enteric fever", "COVID-19", "Community-acquired pneumonia"],
+    "autoimmune": ["Systemic lupus erythematosus", "Rheumatoid arthritis", "Adult-onset Still's disease",
+                   "ANCA-associated vasculitis"],
+    "cardiology": ["Acute coronary syndrome", "Atrial fibrillation", "Acute pericarditis", "Heart failure"],
+    "neurology": ["Migraine with aura", "Transient ischemic attack", "Generalized seizure", "Guillain-Barré syndrome"],
+    "oncology": ["Non-Hodgkin lymphoma", "Acute myeloid leukemia", "Lung cancer"],
+    "toxicology": ["Acetaminophen toxicity", "Opioid overdose", "Organophosphate poisoning"],
+}
+# System prompt scope header -> specialty. The prompts reach us after redact_phi, which
+# rewrites Title Case word pairs ("Infectious Disease attending" becomes "[REDACTED NAME]
+# attending"), so match on the upper-case scope lines it leaves alone.
+DOMAIN_MARKERS = {
+    "INFECTIOUS ETIOLOGIES": "infectious",
+    "AUTOIMMUNE/INFLAMMATORY ETIOLOGIES": "autoimmune",
+    "CARDIOVASCULAR ETIOLOGIES": "cardiology",
+    "NEUROLOGIC ETIOLOGIES": "neurology",
+    "ONCOLOGIC ETIOLOGIES": "oncology",
+    "TOXICOLOGIC ETIOLOGIES": "toxicology",
+}
+
+
+def _rng(*parts: str) -> random.Random:
+    return random.Random(hashlib.sha256("\x00".join(parts).encode("utf-8")).hexdigest())
+
+
+def _candidates(domain: str, seed: str) -> Dict[str, Any]:
+    rng = _rng(domain, seed)
+    pool = DOMAIN_DIAGNOSES[domain]
+    picks = rng.sample(pool, k=min(len(pool), rng.randint(1, 3)))
+    doc_ids = re.findall(r"^- ([\w.\-:]+):", seed, flags=re.M) or ["default"]
+    return {"candidates": [{
+        "diagnosis": dx,
+        "rationale": f"FOR: fits the presenting findings. AGAINST: not yet confirmed. Next test: targeted workup for {dx}.",
+        "citations": [{"doc_id": rng.choice(doc_ids), "span": "0-120"}],
+        "graph_paths": [],
+        "confidence_qual": rng.choice(["low", "medium", "high"]),
+    } for dx in picks]}
+
+
+def synthetic_chat(messages: List[Dict[str, str]]) -> str:
+    system = next((m.get("content", "") for m in messages if m.get("role") == "system"), "")
+    user = "\n".join(m.get("content", "") for m in messages if m.get("role") == "user")
+    if "panel of specialist" in system:
+        asked = [a for a in AGENTS if f'"{a}" (' in user] or AGENTS
+        return json.dumps({a: _candidates(a, user) for a in asked})
+    if "recommendations assistant" in system:
+        return json.dumps({"recommendations": [
+            {"title": "Order the next best test", "rationale": "Highest information gain.", "priority": "high"},
+            {"title": "Monitor vitals", "rationale": "Detect deterioration early.", "priority": "medium"},
+            {"title": "Review medications", "rationale": "Exclude drug-related causes.", "priority": "low"},
+        ]})
+    if "elicitation assistant" in system:
+        return json.dumps({"questions": ["Any recent travel?", "Any new medications?"]})
+    for marker, domain in DOMAIN_MARKERS.items():
+        if marker in system:
+            return json.dumps(_candidates(domain, user))
+    return json.dumps({"candidates": []})
+
+
+def synthetic_embedding(text: str, dim: int) -> List[float]:
+    rng = _rng("embed", text)
+    vec = [rng.gauss(0.0, 1.0) for _ in range(dim)]
+    norm = sum(v * v for v in vec) ** 0.5 or 1.0
+    return [v / norm for v in vec]
+
+
+async def _chunks(model: str, content: str, spread: float, size: int = 16):
+    pieces = [content[i:i + size] for i in range(0, len(content), size)] or [""]
+    created = int(time.time())
+
+    def event(delta: Dict[str, Any], finish: Optional[str] = None) -> str:
+        chunk = {"id": "chatcmpl-fake", "object": "chat.completion.chunk", "created": created, "model": model,
+                 "choices": [{"index": 0, "delta": delta, "finish_reason": finish}]}
+        return f"data: {json.dumps(chunk)}\n\n"
+
+    yield event({"role": "assistant", "content": ""})
+    for piece in pieces:
+        await asyncio.sleep(spread / len(pieces))
+        yield event({"content": piece})
+    yield event({}, "stop")
+    yield "data: [DONE]\n\n"
+
+
+def create_app(latency_ms: float = 0.0, jitter_ms: float = 0.0, embed_latency_ms: float = 0.0,
+               dim: int = 3072, cassette: Optional[str] = None, error_rate: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake OpenAI")
+    failures = random.Random(0)
+    recorded = Cassette(cassette, mode="replay") if cassette else None
+
+    def delay(base_ms: float, key: str) -> float:
+        jitter = _rng("latency", key).uniform(-1.0, 1.0) * jitter_ms if jitter_ms else 0.0
+        return max(0.0, base_ms + jitter) / 1000.0
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": []}
+
+    @app.post("/v1/chat/completions")
+    async def chat(request: Request):
+        body = await request.json()
+        model = body.pop("model", "fake")
+        messages = body.pop("messages", [])
+        stream = bool(body.pop("stream", False))
+        body.pop("stream_options", None)
+        content = None
+        if recorded is not None:
+            try:
+                content = recorded.lookup(chat_key(model, messages, body), chat_family(model, messages, body))["content"]
+            except CassetteMiss:
+                pass
+        if content is None:
+            content = synthetic_chat(messages)
+        wait = delay(latency_ms, json.dumps(messages))
+        if stream:
+            # Time to first token is a fifth of the latency, the rest is spread over the chunks
+            await asyncio.sleep(wait / 5)
+        else:
+            await asyncio.sleep(wait)
+        if error_rate > 0 and failures.random() < error_rate:
+            return JSONResponse(status_code=500, content={"error": {"message": "fake upstream failure",
+                                                                    "type": "server_error"}})
+        if stream:
+            return StreamingResponse(_chunks(model, content, wait * 4 / 5), media_type="text/event-stream")
+        prompt_tokens = sum(len(m.get("content", "")) for m in messages) // 4
+        completion_tokens = len(content) // 4
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "finish_reason": "stop",
+                         "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                      "total_tokens": prompt_tokens + completion_tokens},
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        model = body.get("model", "fake")
+        texts = body.get("input", [])
+        if isinstance(texts, str):
+            texts = [texts]
+        data = []
+        for i, text in enumerate(texts):
+            vec = None
+            if recorded is not None:
+                try:
+                    vec = recorded.lookup(embed_key(model, text), embed_family(model))["embedding"]
+                except CassetteMiss:
+                    pass
+            data.append({"object": "embedding", "index": i, "embedding": vec or synthetic_embedding(text, dim)})
+        await asyncio.sleep(delay(embed_latency_ms, "\x00".join(texts)))
+        tokens = sum(len(t) for t in texts) // 4
+        return {"object": "list", "model": model, "data": data,
+                "usage": {"prompt_tokens": tokens, "total_tokens": tokens}}
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake OpenAI-compatible server for offline benchmarks")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Chat completion latency")
+    parser.add_argument("--jitter-ms", type=float, default=0.0, help="Deterministic +/- jitter per request")
+    parser.add_argument("--embed-latency-ms", type=float, default=0.0, help="Embedding request latency")
+    parser.add_argument("--dim", type=int, default=3072, help="Embedding dimension (text-embedding-3-large: 3072)")
+    parser.add_argument("--cassette", default=None, help="Serve recorded responses from this cassette first")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of chat calls answered with HTTP 500")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency_ms, args.jitter_ms, args.embed_latency_ms, args.dim, args.cassette,
+                           args.error_rate),
+                host=args.host, port=args.port, log_level="warning")
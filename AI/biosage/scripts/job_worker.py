@@ -0,0 +1,30 @@
+# Standalone diagnosis job worker: pulls jobs from storage/jobs.db (shared with the API).
+# Usage: python -m biosage.scripts.job_worker [num_workers]
+# Run the API with JOB_WORKERS=0 to leave all jobs to these processes.
+import sys
+import asyncio
+
+from biosage.core.jobs import JOBS, JobWorkerPool
+from biosage.core.evidence import EVIDENCE
+from biosage.core.casebase import CASE_INDEX
+from biosage.app.main import diagnose_job
+
+
+async def main(workers: int):
+    CASE_INDEX.start_sync()
+    pool = JobWorkerPool(diagnose_job, queue=JOBS, workers=workers)
+    pool.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await pool.stop()
+        EVIDENCE.close()
+
+
+if __name__ == '__main__':
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 2
+    print(f'Starting {n} diagnosis job worker(s) on {JOBS.path}')
+    try:
+        asyncio.run(main(n))
+    except KeyboardInterrupt:
+        pass
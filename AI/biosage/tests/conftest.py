@@ -0,0 +1,29 @@
+import os
+import shutil
+import tempfile
+
+# Point every on-disk store at a scratch directory before biosage is imported, so
+# the suite never writes to biosage/storage. The seeded app.db and kg.db are
+# copied in, so tests still see the bundled cases and knowledge graph.
+STORAGE = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'storage')
+SCRATCH = tempfile.mkdtemp(prefix='biosage-tests-')
+
+for name in ('app.db', 'kg.db', 'kg.graphml'):
+    if os.path.exists(os.path.join(STORAGE, name)):
+        shutil.copy2(os.path.join(STORAGE, name), os.path.join(SCRATCH, name))
+
+os.environ.update({
+    'APP_DB_PATH': os.path.join(SCRATCH, 'app.db'),
+    'KG_DB_PATH': os.path.join(SCRATCH, 'kg.db'),
+    'KG_GRAPHML_PATH': os.path.join(SCRATCH, 'kg.graphml'),
+    'LLM_CACHE_PATH': os.path.join(SCRATCH, 'llm_cache.db'),
+    'EMBED_CACHE_DIR': os.path.join(SCRATCH, 'embeddings'),
+    'CASE_INDEX_DIR': os.path.join(SCRATCH, 'case_index'),
+    'BM25_DIR': os.path.join(SCRATCH, 'bm25'),
+    'JOBS_DB_PATH': os.path.join(SCRATCH, 'jobs.db'),
+    'LLM_CASSETTE_PATH': os.path.join(SCRATCH, 'cassettes', 'llm.jsonl'),
+})
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SCRATCH, ignore_errors=True)
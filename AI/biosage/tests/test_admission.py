@@ -0,0 +1,53 @@
+import time
+import asyncio
+
+from biosage.core.admission import AdmissionController, llm_priority
+
+
+def test_waiting_calls_are_granted_in_priority_order():
+    ctl = AdmissionController(max_concurrency=1, aging_seconds=0)
+    order = []
+
+    async def call(name, priority):
+        with llm_priority(priority):
+            async with ctl.slot(10):
+                order.append(name)
+                await asyncio.sleep(0.01)
+
+    async def main():
+        async with ctl.slot(10):
+            # queued while the only slot is busy, lowest class first
+            tasks = [asyncio.create_task(call("recs", "recommendations")),
+                     asyncio.create_task(call("batch", "batch")),
+                     asyncio.create_task(call("ui", "interactive"))]
+            await asyncio.sleep(0.01)
+            assert ctl.depth() == {"interactive": 1, "batch": 1, "recommendations": 1}
+        await asyncio.gather(*tasks)
+
+    asyncio.run(main())
+    assert order == ["ui", "batch", "recs"]
+
+
+def test_rpm_bucket_delays_calls_beyond_the_burst():
+    # 60 RPM with a 2 s burst: two calls go straight through, the third waits ~1 s
+    ctl = AdmissionController(rpm=60, aging_seconds=0)
+    ctl.rpm.capacity = ctl.rpm.level = 2.0
+    stamps = []
+
+    async def main():
+        start = time.monotonic()
+        for _ in range(3):
+            async with ctl.slot(1):
+                stamps.append(time.monotonic() - start)
+
+    asyncio.run(main())
+    assert stamps[1] < 0.2
+    assert 0.8 < stamps[2] < 1.5
+
+
+def test_release_settles_tokens_against_reported_usage():
+    ctl = AdmissionController(tpm=6000, aging_seconds=0)
+    full = ctl.tpm.level
+    with ctl.slot_sync(500) as ticket:
+        ticket.used_tokens = 120
+    assert abs(ctl.tpm.level - (full - 120)) < 5
@@ -0,0 +1,29 @@
+import numpy as np
+from biosage.core.bm25 import SparseBM25, load_or_build, tokenize
+
+DOCS = [
+    "dengue presents with fever rash and myalgia",
+    "malaria presents with fever chills and anemia",
+    "influenza presents with fever cough and myalgia",
+    "acute coronary syndrome presents with chest pain",
+]
+
+
+def test_top_k_ranks_matching_documents():
+    engine = SparseBM25.build([tokenize(d) for d in DOCS])
+    hits = engine.top_k(tokenize("chest pain"), 3)
+    assert [i for i, _ in hits] == [3]
+    hits = engine.top_k(tokenize("fever cough"), 4)
+    assert hits[0][0] == 2
+    assert hits[0][1] > hits[1][1]
+    assert engine.top_k(tokenize("unknown term"), 5) == []
+
+
+def test_persisted_matrix_round_trips(tmp_path):
+    built = load_or_build(str(tmp_path), DOCS)
+    loaded = load_or_build(str(tmp_path), DOCS)
+    q = tokenize("fever chills")
+    assert np.allclose(built.get_scores(q), loaded.get_scores(q))
+    # A changed corpus must not reuse the stale matrix
+    changed = load_or_build(str(tmp_path), DOCS + ["sepsis presents with fever"])
+    assert changed.n_docs == len(DOCS) + 1
@@ -0,0 +1,28 @@
+from biosage.core.schemas import AgentResult, Candidate, FusedOutput, NextBestTest, DifferentialItem
+from biosage.core.orchestrator import contested_agents
+
+
+def _result(agent, *diagnoses):
+    return AgentResult(agent=agent, candidates=[
+        Candidate(diagnosis=d, rationale='', citations=[], confidence_qual='medium') for d in diagnoses])
+
+
+def _fused(disagreement, margin, *diagnoses):
+    return FusedOutput(
+        differential=[DifferentialItem(diagnosis=d, score_global=0.5, why_top='') for d in diagnoses],
+        next_best_test=NextBestTest(name='CBC', why='', linked_hypotheses=[]),
+        disagreement_score=disagreement, top_margin=margin)
+
+
+def test_only_agents_backing_the_leaders_escalate():
+    results = [_result('infectious', 'Dengue'), _result('autoimmune', 'SLE', 'Dengue'),
+               _result('cardiology', 'Myocarditis'), _result('neurology', 'Migraine'), _result('oncology')]
+    assert contested_agents(results, _fused(0.1, 0.3, 'Dengue', 'Myocarditis')) == []
+    # in-domain picks other than the winner (neurology) and empty answers (oncology) are not dissent
+    assert contested_agents(results, _fused(0.6, 0.3, 'Myocarditis', 'Dengue')) == \
+        ['infectious', 'autoimmune', 'cardiology']
+    assert contested_agents(results, _fused(0.1, 0.01, 'Migraine', 'SLE')) == ['autoimmune', 'neurology']
+    # nobody backs the leaders: every specialist that answered is re-asked
+    assert contested_agents(results, _fused(0.6, 0.3, 'Sepsis', 'Malaria')) == \
+        ['infectious', 'autoimmune', 'cardiology', 'neurology']
+    assert contested_agents([_result('oncology')], _fused(0.6, 0.01, 'Dengue')) == []
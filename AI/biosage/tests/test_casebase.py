@@ -0,0 +1,87 @@
+import threading
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from biosage.core import casebase
+from biosage.core.casebase import CaseIndex
+
+DIM = 4
+
+
+def _unit(i: int) -> list:
+    v = np.zeros(DIM, dtype='float32')
+    v[i % DIM] = 1.0
+    return v.tolist()
+
+
+def _add(directory: str, prefix: str, n: int):
+    index = CaseIndex(directory)
+    for i in range(n):
+        index.add_many([(f"{prefix}{i}", f"{prefix} case {i}")], [_unit(i)])
+
+
+def test_search_reindex_and_reopen(tmp_path):
+    index = CaseIndex(str(tmp_path))
+    index.add_many([("c1", "fever"), ("c2", "rash")], [_unit(0), _unit(1)])
+    assert index.search(_unit(1), k=1)[0]["doc_id"] == "case:c2"
+    index.add_many([("c2", "rash, updated")], [_unit(2)])  # supersedes c2's first row
+    assert len(index) == 2
+    top = index.search(_unit(2), k=2)
+    assert top[0]["text"] == "rash, updated" and {r["doc_id"] for r in top} == {"case:c1", "case:c2"}
+
+    reopened = CaseIndex(str(tmp_path))
+    assert len(reopened) == 2
+    assert reopened.search(_unit(2), k=1)[0]["text"] == "rash, updated"
+
+
+def test_rows_from_another_writer_become_visible(tmp_path):
+    api, worker = CaseIndex(str(tmp_path)), CaseIndex(str(tmp_path))
+    api.add_many([("a1", "api case")], [_unit(0)])
+    worker.add_many([("w1", "worker case")], [_unit(1)])
+    api.add_many([("a2", "api case 2")], [_unit(2)])
+    for index in (api, worker):
+        assert len(index) == 3
+        assert index.search(_unit(1), k=1)[0]["doc_id"] == "case:w1"
+        assert index.search(_unit(2), k=1)[0]["doc_id"] == "case:a2"
+
+
+def test_two_processes_append_concurrently(tmp_path):
+    try:
+        ctx = multiprocessing.get_context('fork')
+    except ValueError:
+        pytest.skip('needs fork')
+    procs = [ctx.Process(target=_add, args=(str(tmp_path), prefix, 40)) for prefix in ("a", "b")]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+        assert p.exitcode == 0
+    index = CaseIndex(str(tmp_path))
+    assert len(index) == 80
+    # every row still carries its own vector
+    for row, vec in zip(index._rows, index._buf[:index._n]):
+        i = int(row["case_id"][1:])
+        assert np.allclose(vec, _unit(i))
+
+
+def test_initial_sync_runs_in_the_background(tmp_path, monkeypatch):
+    index = CaseIndex(str(tmp_path))
+    release = threading.Event()
+
+    def slow_embed(texts):
+        release.wait(5)
+        return [_unit(i) for i in range(len(texts))]
+
+    monkeypatch.setattr(casebase, "CASE_INDEX", index)
+    monkeypatch.setattr(casebase, "embed_texts", slow_embed)
+    monkeypatch.setattr(casebase, "_fetch_case_ids", lambda: ["old1", "old2"])
+    monkeypatch.setattr(casebase, "_fetch_cases", lambda ids: [{"case_id": cid, "intake": {}, "normalized": {}} for cid in ids])
+
+    # The first search does not wait for the stored cases to be embedded
+    assert casebase.search_previous_cases(["fever"], query_vec=_unit(0)) == []
+    release.set()
+    index._sync_thread.join(5)
+    assert index.synced
+    assert {r["doc_id"] for r in casebase.search_previous_cases(["fever"], query_vec=_unit(0))} == {"case:old1", "case:old2"}
@@ -0,0 +1,40 @@
+from types import SimpleNamespace as NS
+
+from biosage.core.cassette import Cassette, CassetteMiss
+
+
+class _Client:
+    def __init__(self):
+        self.calls = 0
+        self.chat = NS(completions=NS(create=self._chat))
+        self.embeddings = NS(create=self._embed)
+
+    def _chat(self, model, messages, **params):
+        self.calls += 1
+        return NS(choices=[NS(message=NS(content='{"candidates": []}'))])
+
+    def _embed(self, model, input, **params):
+        self.calls += 1
+        return NS(data=[NS(embedding=[float(len(t)), 1.0]) for t in input])
+
+
+def test_record_then_replay_without_provider(tmp_path):
+    path = str(tmp_path / 'llm.jsonl')
+    messages = [{'role': 'system', 'content': 'sys'}, {'role': 'user', 'content': 'case 1'}]
+    recorder = Cassette(path, mode='record').wrap(_Client())
+    recorder.chat.completions.create(model='m', messages=messages, temperature=0.2, timeout=30.0)
+    recorder.embeddings.create(model='e', input=['fever', 'rash'])
+
+    replay = Cassette(path, mode='replay').wrap()
+    resp = replay.chat.completions.create(model='m', messages=messages, temperature=0.2, timeout=5.0)
+    assert resp.choices[0].message.content == '{"candidates": []}'
+    # embeddings are matched per text, whatever the batching
+    assert [d.embedding for d in replay.embeddings.create(model='e', input=['rash']).data] == [[4.0, 1.0]]
+    # a new user prompt falls back to a recording with the same system prompt and params
+    other = [{'role': 'system', 'content': 'sys'}, {'role': 'user', 'content': 'case 2'}]
+    assert replay.chat.completions.create(model='m', messages=other, temperature=0.2).choices[0].message.content
+    try:
+        replay.chat.completions.create(model='m', messages=other, temperature=0.9)
+        assert False, 'expected a miss'
+    except CassetteMiss:
+        pass
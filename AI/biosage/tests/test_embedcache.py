@@ -0,0 +1,64 @@
+import zlib
+import multiprocessing
+
+import numpy as np
+import pytest
+
+from biosage.core.embedcache import EmbeddingCache
+
+MODEL = 'text-embedding-3-large'
+
+
+def _vec(text: str, dim: int = 8) -> np.ndarray:
+    rng = np.random.default_rng(zlib.crc32(text.encode()))
+    return rng.standard_normal(dim).astype('float32')
+
+
+def _put(directory: str, texts):
+    cache = EmbeddingCache(directory, enabled=True)
+    for i in range(0, len(texts), 5):
+        batch = texts[i:i + 5]
+        cache.put_many(MODEL, batch, np.stack([_vec(t) for t in batch]))
+
+
+def test_hit_miss_and_reopen(tmp_path):
+    cache = EmbeddingCache(str(tmp_path), enabled=True)
+    assert cache.get_many(MODEL, ['fever']) == [None]
+    cache.put_many(MODEL, ['fever', 'rash'], np.stack([_vec('fever'), _vec('rash')]))
+    hit, miss = cache.get_many(MODEL, ['rash', 'cough'])
+    assert np.allclose(hit, _vec('rash')) and miss is None
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 2
+
+    reopened = EmbeddingCache(str(tmp_path), enabled=True)
+    assert np.allclose(reopened.get_many(MODEL, ['fever'])[0], _vec('fever'))
+    assert reopened.get_many('other-model', ['fever']) == [None]
+
+
+def test_interleaved_writers_keep_every_row(tmp_path):
+    # Two processes' views of one store (API + job worker): neither may cut off the other's rows
+    a = EmbeddingCache(str(tmp_path), enabled=True)
+    b = EmbeddingCache(str(tmp_path), enabled=True)
+    a.put_many(MODEL, ['a1'], _vec('a1')[None])
+    b.put_many(MODEL, ['b1', 'b2'], np.stack([_vec('b1'), _vec('b2')]))
+    a.put_many(MODEL, ['a2'], _vec('a2')[None])
+    for cache in (a, b, EmbeddingCache(str(tmp_path), enabled=True)):
+        got = cache.get_many(MODEL, ['a1', 'b1', 'b2', 'a2'])
+        assert all(np.allclose(v, _vec(t)) for v, t in zip(got, ['a1', 'b1', 'b2', 'a2']))
+
+
+def test_two_processes_append_concurrently(tmp_path):
+    try:
+        ctx = multiprocessing.get_context('fork')
+    except ValueError:
+        pytest.skip('needs fork')
+    texts = [[f"p{p}-{i}" for i in range(60)] for p in range(2)]
+    procs = [ctx.Process(target=_put, args=(str(tmp_path), t)) for t in texts]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join(30)
+        assert p.exitcode == 0
+    cache = EmbeddingCache(str(tmp_path), enabled=True)
+    every = texts[0] + texts[1]
+    got = cache.get_many(MODEL, every)
+    assert all(v is not None and np.allclose(v, _vec(t)) for v, t in zip(got, every))
@@ -0,0 +1,33 @@
+import json
+
+import pytest
+
+from biosage.core import prompts
+from biosage.core.llm import _redact_messages
+from biosage.scripts.fake_openai_server import AGENTS, synthetic_chat
+
+CONTEXT = {"demographics": {"age": 34, "sex": "F"}, "symptoms_normalized": ["fever", "rash"], "duration_days": 4}
+USER = "CASE CONTEXT:\n- Normalized symptoms: ['fever', 'rash']\n\nLOCAL LITERATURE (top 1):\n- pubmed:1: fever and rash"
+
+
+def _chat(system: str, user: str) -> dict:
+    # The fake server only ever sees prompts after PHI redaction, as llm.areason sends them
+    return json.loads(synthetic_chat(_redact_messages([
+        {"role": "system", "content": system},
+        {"role": "user", "content": user},
+    ])))
+
+
+@pytest.mark.parametrize("agent", AGENTS)
+def test_every_specialist_gets_candidates(agent):
+    data = _chat(getattr(prompts, f"{agent.upper()}_SYSTEM_PROMPT"), USER)
+    assert data["candidates"]
+
+
+def test_panel_answers_every_asked_domain():
+    asked = ["infectious", "cardiology", "toxicology"]
+    user = prompts.build_panel_user_prompt(agents=asked, context=CONTEXT, doc_snips="- pubmed:1: fever and rash",
+                                           kg_snips="", case_snips="", k_docs=1, k_cases=0)
+    data = _chat(prompts.PANEL_SYSTEM_PROMPT, user)
+    assert sorted(data) == sorted(asked)
+    assert all(data[a]["candidates"] for a in asked)
@@ -0,0 +1,79 @@
+import asyncio
+from types import SimpleNamespace
+
+from biosage.core import llm
+from biosage.core.hedge import HedgeBudget, HedgePolicy
+from biosage.core.router import ProviderRouter
+
+
+class SlowThenFast:
+    """First call hangs (a tail-latency outlier), later calls answer at once."""
+
+    def __init__(self):
+        self.calls = 0
+        self.cancelled = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, **kwargs):
+        self.calls += 1
+        delay = 5.0 if self.calls == 1 else 0.01
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            self.cancelled += 1
+            raise
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"answer {self.calls}"))],
+                               usage=None)
+
+
+def test_budget_caps_hedges_to_a_fraction_of_calls():
+    budget = HedgeBudget(ratio=0.1, burst=5)
+    spent = 0
+    for _ in range(100):
+        budget.earn()
+        spent += budget.spend()
+    assert spent == 10
+
+
+def test_slow_call_is_hedged_and_the_loser_cancelled(monkeypatch):
+    policy = HedgePolicy(enabled=True, percentile=0.9, min_samples=5, min_delay=0.0)
+    for _ in range(10):
+        policy.latency.observe("openai", "m", 0.05)
+    policy.budget.credits = 1.0
+    client = SlowThenFast()
+    monkeypatch.setattr(llm, "HEDGE", policy)
+    monkeypatch.setattr(llm, "_get_async_client", lambda provider: client)
+
+    async def main():
+        resp = await asyncio.wait_for(llm._ahedged("openai", "m", [{"role": "user", "content": "x"}], {}), 1.0)
+        await asyncio.sleep(0)
+        return resp
+
+    resp = asyncio.run(main())
+    assert resp.choices[0].message.content == "answer 2"
+    assert client.calls == 2 and client.cancelled == 1
+    assert policy.budget.hedges == 1
+
+
+def test_refused_hedge_hands_back_the_probe(monkeypatch):
+    policy = HedgePolicy(enabled=True, percentile=0.9, min_samples=5, min_delay=0.0, providers=["vllm_local"])
+    for _ in range(10):
+        policy.latency.observe("openai", "m", 0.01)
+    policy.budget.credits = 0.0  # no credit left for a duplicate
+    router = ProviderRouter(explore=0.0, failures=1, cooldown=0.0)
+    target = ("vllm_local", llm._deployment("vllm_local", "m"))
+    router.record(*target, False)  # breaker open and already cooled down
+
+    async def create(model, messages, **kwargs):
+        await asyncio.sleep(0.1)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content="answer"))], usage=None)
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm, "HEDGE", policy)
+    monkeypatch.setattr(llm, "ROUTER", router)
+    monkeypatch.setattr(llm, "_get_async_client", lambda provider: client)
+
+    resp = asyncio.run(llm._ahedged("openai", "m", [{"role": "user", "content": "x"}], {}))
+    assert resp.choices[0].message.content == "answer" and policy.budget.hedges == 0
+    # the probe allow() handed out for the refused hedge was released, so the backend is still tried
+    assert router.order([target]) == [target]
@@ -0,0 +1,106 @@
+import os
+import time
+import asyncio
+import sqlite3
+import threading
+
+import pytest
+
+from biosage.core.jobs import JobQueue, JobWorkerPool
+
+
+def test_claim_retry_and_visibility_timeout(tmp_path):
+    q = JobQueue(path=os.path.join(tmp_path, 'jobs.db'), visibility_timeout=0.0, max_attempts=2)
+    job_id = q.enqueue({'case': 1})
+
+    job = q.claim('w1')
+    assert job['id'] == job_id and job['attempts'] == 1
+    assert q.save_partial(job_id, 'w1', 'cardiology', {'candidates': []})
+    assert q.get(job_id)['partial'] == {'cardiology': {'candidates': []}}
+
+    # Lease lapsed (timeout 0): another worker reclaims it and the stale owner is fenced off
+    job = q.claim('w2')
+    assert job['attempts'] == 2
+    assert not q.complete(job_id, 'w1', {'stale': True})
+    assert q.complete(job_id, 'w2', {'ok': True})
+    done = q.get(job_id)
+    assert done['status'] == 'done' and done['result'] == {'ok': True}
+    assert q.claim('w3') is None
+
+
+def test_partials_are_saved_off_the_event_loop_in_order(tmp_path):
+    q = JobQueue(path=os.path.join(tmp_path, 'jobs.db'))
+    job_id = q.enqueue({'case': 1})
+    loop_thread = threading.get_ident()
+    saves = []
+    save_partial = q.save_partial
+
+    def slow_save(job, owner, key, value):
+        time.sleep(0.05)  # another process holds the SQLite write lock
+        saves.append((key, threading.get_ident() != loop_thread))
+        return save_partial(job, owner, key, value)
+
+    q.save_partial = slow_save
+
+    async def handler(payload, on_partial):
+        start = time.monotonic()
+        for agent in ('infectious', 'cardiology', 'neurology'):
+            on_partial(agent, {'candidates': []})
+        assert time.monotonic() - start < 0.05  # the handler never waited on a write
+        return {'ok': True}
+
+    async def main():
+        pool = JobWorkerPool(handler, queue=q, workers=0)
+        await pool.run_job(q.claim('w1'), 'w1')
+
+    asyncio.run(main())
+    assert saves == [('infectious', True), ('cardiology', True), ('neurology', True)]
+    done = q.get(job_id)
+    assert done['status'] == 'done' and set(done['partial']) == {'infectious', 'cardiology', 'neurology'}
+
+
+def test_claim_keeps_the_error_when_begin_fails(tmp_path):
+    q = JobQueue(path=os.path.join(tmp_path, 'jobs.db'))
+    q.enqueue({'case': 1})
+    holder = sqlite3.connect(q.path, isolation_level=None)
+    holder.execute('BEGIN IMMEDIATE')  # another worker holds the write lock
+    connect = q._conn
+
+    def impatient():
+        conn = connect()
+        conn.execute('PRAGMA busy_timeout=50')
+        return conn
+
+    q._conn = impatient
+    try:
+        with pytest.raises(sqlite3.OperationalError, match='locked'):
+            q.claim('w1')
+    finally:
+        holder.execute('ROLLBACK')
+        holder.close()
+
+
+def test_heartbeat_survives_a_failed_renewal(tmp_path):
+    q = JobQueue(path=os.path.join(tmp_path, 'jobs.db'), visibility_timeout=0.06)
+    q.enqueue({'case': 1})
+    beats = []
+    heartbeat = q.heartbeat
+
+    def flaky_heartbeat(job, owner):
+        beats.append(job)
+        if len(beats) == 1:
+            raise sqlite3.OperationalError('database is locked')
+        return heartbeat(job, owner)
+
+    q.heartbeat = flaky_heartbeat
+
+    async def handler(payload, on_partial):
+        await asyncio.sleep(0.15)
+        return {'ok': True}
+
+    async def main():
+        pool = JobWorkerPool(handler, queue=q, workers=0)
+        await pool.run_job(q.claim('w1'), 'w1')
+
+    asyncio.run(main())
+    assert len(beats) >= 3  # kept renewing after the first failure
@@ -0,0 +1,46 @@
+import time
+from biosage.core.llmcache import ResponseCache
+
+
+def _cache(tmp_path, **kwargs):
+    return ResponseCache(path=str(tmp_path / 'llm_cache.db'), **kwargs)
+
+
+def test_key_depends_on_sampling_params_not_timeout():
+    msgs = [{'role': 'user', 'content': 'fever, myalgia'}]
+    k1 = ResponseCache.make_key('openai', 'gpt-4o', msgs, {'temperature': 0.2, 'timeout': 30.0})
+    k2 = ResponseCache.make_key('openai', 'gpt-4o', msgs, {'temperature': 0.2, 'timeout': 5.0})
+    k3 = ResponseCache.make_key('openai', 'gpt-4o', msgs, {'temperature': 0.7})
+    assert k1 == k2
+    assert k1 != k3
+
+
+def test_hit_miss_and_ttl(tmp_path):
+    cache = _cache(tmp_path, ttl_seconds=0.05)
+    assert cache.get('k') is None
+    cache.put('k', 'gpt-4o', '{"candidates": []}')
+    assert cache.get('k') == '{"candidates": []}'
+    time.sleep(0.1)
+    assert cache.get('k') is None
+    stats = cache.stats()
+    assert stats['hits'] == 1 and stats['misses'] == 2 and stats['expired'] == 1
+
+
+def test_lru_eviction_and_empty_values(tmp_path):
+    cache = _cache(tmp_path, max_bytes=25)
+    cache.put('a', 'm', 'x' * 10)
+    cache.put('b', 'm', 'y' * 10)
+    cache.get('a')  # 'b' becomes least recently used
+    cache.put('c', 'm', 'z' * 10)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'x' * 10
+    assert cache.get('c') == 'z' * 10
+    cache.put('d', 'm', '')
+    assert cache.get('d') is None
+
+
+def test_disabled_cache_bypasses(tmp_path):
+    cache = _cache(tmp_path, enabled=False)
+    cache.put('k', 'm', 'v')
+    assert cache.get('k') is None
+    assert cache.stats()['bypassed'] == 1
@@ -0,0 +1,29 @@
+from biosage.core.metrics import (
+    Histogram,
+    span,
+    start_request_timings,
+    end_request_timings,
+    server_timing_header,
+    STAGE_SECONDS,
+)
+
+
+def test_histogram_renders_cumulative_buckets():
+    h = Histogram('t_seconds', 'test', buckets=(0.1, 1.0))
+    h.observe(0.05, stage='a')
+    h.observe(0.5, stage='a')
+    lines = h.render()
+    assert 't_seconds_bucket{stage="a",le="0.1"} 1' in lines
+    assert 't_seconds_bucket{stage="a",le="1.0"} 2' in lines
+    assert 't_seconds_bucket{stage="a",le="+Inf"} 2' in lines
+    assert 't_seconds_count{stage="a"} 2' in lines
+
+
+def test_span_collects_request_timings():
+    token = start_request_timings()
+    with span('unit_stage', agent='cardiology'):
+        pass
+    timings = end_request_timings(token)
+    assert [name for name, _ in timings] == ['unit_stage.cardiology']
+    assert server_timing_header(timings).startswith('unit_stage.cardiology;dur=')
+    assert any('stage="unit_stage"' in line for line in STAGE_SECONDS.render())
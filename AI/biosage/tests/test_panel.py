@@ -0,0 +1,30 @@
+import json
+import asyncio
+
+from biosage.agents import panel
+from biosage.core.retrieval import RetrievalBundle
+
+
+def test_panel_parses_one_call_into_agent_results(monkeypatch):
+    prompts = []
+
+    async def fake_areason(messages, **kwargs):
+        prompts.append(messages[1]['content'])
+        return json.dumps({
+            'infectious': {'candidates': [{'diagnosis': 'Dengue', 'rationale': 'r', 'citations': [],
+                                           'confidence_qual': 'high'}]},
+            'cardiology': {'candidates': 'not a list'},
+        })
+
+    monkeypatch.setattr(panel, 'areason', fake_areason)
+    bundle = RetrievalBundle(queries={'infectious': 'fever', 'cardiology': 'fever'},
+                             pools={'fever': [{'doc_id': 'd1', 'text': 'dengue fever'}]},
+                             prev_cases=[], kg_lines=[])
+    ctx = {'norm': {'symptoms_normalized': ['fever']}}
+    results = asyncio.run(panel.run_panel(ctx, bundle, ['infectious', 'cardiology']))
+
+    assert len(prompts) == 1 and prompts[0].count('d1:') == 1
+    assert [r.agent for r in results] == ['infectious', 'cardiology']
+    assert results[0].candidates[0].diagnosis == 'Dengue'
+    assert results[0].candidates[0].score_local == 0.925
+    assert results[1].candidates == []
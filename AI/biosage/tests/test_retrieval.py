@@ -0,0 +1,18 @@
+from biosage.core import retrieval
+
+
+def test_overlapping_symptom_lists_share_kg_lookups(monkeypatch):
+    looked_up = []
+
+    def neighbors(name, G=None, limit=5):
+        looked_up.append(name)
+        return [(name, "suggests", f"{name}-dx")]
+
+    monkeypatch.setattr(retrieval, "to_networkx", lambda: None)
+    monkeypatch.setattr(retrieval, "neighbors_by_name", neighbors)
+    kg_cache = {}
+    first = retrieval._kg_lines(["fever", "rash"], kg_cache)
+    second = retrieval._kg_lines(["fever", "arthralgia"], kg_cache)
+    assert first == ["fever -[suggests]-> fever-dx", "rash -[suggests]-> rash-dx"]
+    assert second == ["fever -[suggests]-> fever-dx", "arthralgia -[suggests]-> arthralgia-dx"]
+    assert looked_up == ["fever", "rash", "arthralgia"]
@@ -0,0 +1,66 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from biosage.core import llm
+from biosage.core.router import ProviderRouter, LLMUnavailableError, CLOSED, HALF_OPEN, OPEN
+
+BACKENDS = [("openai", "gpt-4o"), ("vllm_local", "llama")]
+
+
+def test_breaker_opens_fails_over_and_recovers_through_a_probe():
+    router = ProviderRouter(explore=0.0, failures=3, cooldown=0.05)
+    router.record("openai", "gpt-4o", True, 0.2)
+    router.record("vllm_local", "llama", True, 0.8)
+    assert router.order(BACKENDS)[0] == ("openai", "gpt-4o")  # fastest healthy first
+
+    for _ in range(3):
+        router.record("openai", "gpt-4o", False)
+    assert router.stats()["openai/gpt-4o"]["state"] == OPEN
+    assert router.order(BACKENDS) == [("vllm_local", "llama")]
+
+    asyncio.run(asyncio.sleep(0.06))
+    assert router.allow("openai", "gpt-4o")  # the single half-open probe
+    assert not router.allow("openai", "gpt-4o")
+    assert router.stats()["openai/gpt-4o"]["state"] == HALF_OPEN
+    router.record("openai", "gpt-4o", True, 0.2)
+    assert router.stats()["openai/gpt-4o"]["state"] == CLOSED
+
+
+def test_areason_fails_over_to_the_next_provider(monkeypatch):
+    calls = []
+
+    def client(provider, fail):
+        async def create(model, messages, **kwargs):
+            calls.append(provider)
+            if fail:
+                raise ConnectionError("upstream down")
+            return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=f"from {provider}"))],
+                                   usage=None)
+        return SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+
+    clients = {"openai": client("openai", True), "vllm_local": client("vllm_local", False)}
+    monkeypatch.setattr(llm, "ROUTER", ProviderRouter(explore=0.0, failures=2, cooldown=60))
+    monkeypatch.setattr(llm, "LLM_PROVIDERS", ["openai", "vllm_local"])
+    monkeypatch.setattr(llm, "_get_async_client", lambda provider: clients[provider])
+
+    async def main():
+        return [await llm.areason([{"role": "user", "content": f"q{i}"}], cache=False) for i in range(4)]
+
+    assert asyncio.run(main()) == ["from vllm_local"] * 4
+    # openai failed once, and is ranked behind the healthy backend from then on
+    assert calls.count("openai") == 1
+    assert llm.ROUTER.order([("openai", "gpt-4o"), ("vllm_local", "gpt-4o")])[0][0] == "vllm_local"
+
+
+def test_areason_raises_instead_of_answering_empty(monkeypatch):
+    async def create(model, messages, **kwargs):
+        return SimpleNamespace(choices=[], usage=None)  # malformed reply: not a backend failure
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm, "ROUTER", ProviderRouter(explore=0.0))
+    monkeypatch.setattr(llm, "_get_async_client", lambda provider: client)
+
+    with pytest.raises(LLMUnavailableError):
+        asyncio.run(llm.areason([{"role": "user", "content": "q"}], cache=False))
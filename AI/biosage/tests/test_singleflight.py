@@ -0,0 +1,56 @@
+import time
+import asyncio
+import threading
+
+from biosage.core.singleflight import SingleFlight
+
+
+def test_concurrent_threads_share_one_call():
+    sf = SingleFlight(enabled=True)
+    calls = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.1)
+        return "answer"
+
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(sf.do("chat", "k", work))) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == ["answer"] * 4
+    assert len(calls) == 1
+    assert sf.saved() == {"chat": 3}
+    # nothing is kept once the call finishes
+    assert sf.do("chat", "k", work) == "answer" and len(calls) == 2
+
+
+def test_async_callers_share_errors_and_survive_a_cancelled_peer():
+    sf = SingleFlight(enabled=True)
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return [1.0, 2.0]
+
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise ValueError("boom")
+
+    async def main():
+        impatient = asyncio.create_task(sf.ado("embed", "k", work))
+        patient = asyncio.create_task(sf.ado("embed", "k", work))
+        await asyncio.sleep(0.01)
+        impatient.cancel()
+        assert await patient == [1.0, 2.0]
+
+        outcomes = await asyncio.gather(sf.ado("embed", "bad", failing), sf.ado("embed", "bad", failing),
+                                        return_exceptions=True)
+        assert all(isinstance(o, ValueError) for o in outcomes)
+
+    asyncio.run(main())
+    assert len(calls) == 1
+    assert sf.saved() == {"embed": 2}
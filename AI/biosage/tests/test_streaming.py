@@ -0,0 +1,86 @@
+import json
+import asyncio
+from types import SimpleNamespace
+
+from biosage.core import llm
+from biosage.core.jsonstream import CandidateStream
+from biosage.core.router import ProviderRouter
+from biosage.core.retrieval import RetrievalBundle
+from biosage.agents import streaming, cardiology
+
+ANSWER = {"candidates": [{"diagnosis": f"Dx {i}", "rationale": 'FOR "quoted" {braces} [and] \\ slashes',
+                          "citations": [{"doc_id": f"d{i}", "span": "s"}], "confidence_qual": "high"}
+                         for i in range(5)]}
+
+
+def test_candidates_close_as_the_chunks_arrive():
+    text = json.dumps(ANSWER)
+    parser = CandidateStream()
+    seen = []
+    for i, ch in enumerate(text):  # worst case: one character per chunk
+        for owner, item in parser.feed(ch):
+            seen.append((owner, item["diagnosis"]))
+            # each object is handed on right at its closing brace, not at the end of the document
+            assert text[i] == "}"
+    assert seen == [(None, f"Dx {i}") for i in range(5)]
+    assert parser.text == text
+
+    panel = json.dumps({"infectious": {"candidates": ANSWER["candidates"][:2]},
+                        "cardiology": {"candidates": ANSWER["candidates"][2:3]}})
+    parser = CandidateStream()
+    owners = [owner for part in (panel[:40], panel[40:]) for owner, _ in parser.feed(part)]
+    assert owners == ["infectious", "infectious", "cardiology"]
+
+
+def test_request_candidates_stops_the_stream_early(monkeypatch):
+    text = json.dumps(ANSWER)
+    state = {"sent": 0, "closed": False}
+
+    class Stream:
+        def __init__(self):
+            self.chunks = iter([text[i:i + 8] for i in range(0, len(text), 8)])
+
+        def __aiter__(self):
+            return self
+
+        async def __anext__(self):
+            piece = next(self.chunks, None)
+            if piece is None:
+                raise StopAsyncIteration
+            state["sent"] += 1
+            return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=piece))])
+
+        async def close(self):
+            state["closed"] = True
+
+    async def create(model, messages, stream=False, **kwargs):
+        assert stream
+        return Stream()
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm, "_get_async_client", lambda provider: client)
+    monkeypatch.setattr(llm, "ROUTER", ProviderRouter(explore=0.0))
+    monkeypatch.setattr(streaming, "AGENT_STREAMING", True)
+
+    found = []
+    data = asyncio.run(streaming.request_candidates([{"role": "user", "content": "q"}], "gpt-4o",
+                                                    on_candidate=found.append, max_candidates=2, cache=False))
+    assert [c["diagnosis"] for c in data["candidates"]] == ["Dx 0", "Dx 1"]
+    assert [c.diagnosis for c in found] == ["Dx 0", "Dx 1"]
+    assert found[0].score_local > found[1].score_local
+    # the provider stream was closed partway through the answer
+    assert state["closed"] and state["sent"] < len(text) // 8
+
+
+def test_agent_result_matches_the_streamed_candidates(monkeypatch):
+    async def areason(messages, model=None, **kwargs):
+        return json.dumps({"candidates": [{"diagnosis": "Pericarditis", "confidence_qual": "high"},
+                                          {"diagnosis": "Myocarditis", "citations": [{"doc_id": "d1", "span": "s"}]}]})
+
+    monkeypatch.setattr(streaming, "areason", areason)
+    monkeypatch.setattr(streaming, "AGENT_STREAMING", False)
+    found = []
+    result = asyncio.run(cardiology.run_agent({"norm": {}}, RetrievalBundle({}, {}, [], []), on_candidate=found.append))
+    # the callback and the final result are built by the same parser, defaults included
+    assert [c.model_dump() for c in found] == [c.model_dump() for c in result.candidates]
+    assert result.candidates[0].citations[0].doc_id == "default" and result.candidates[1].score_local == 0.725
@@ -0,0 +1,17 @@
+from biosage.core.tokenbudget import allocate, count_tokens
+
+
+def test_allocate_dedupes_and_cuts_on_sentence_boundaries():
+    literature = ["- d1: Dengue presents with fever and rash. Thrombocytopenia is common.",
+                  "- d2: Thrombocytopenia is common. " + "Malaria causes cyclic fevers in returning travellers. " * 30]
+    cases = ["- c1: Fever and rash after travel. Dengue presents with fever and rash."]
+    kg = ["Dengue -[has_symptom]-> Fever", "Dengue -[has_symptom]-> Fever"]
+    kept, used = allocate({"literature": literature, "cases": cases, "kg": kg}, budget=150, label="test")
+
+    assert sum(used.values()) <= 150
+    assert kept["kg"] == ["Dengue -[has_symptom]-> Fever"]
+    assert kept["cases"] == ["- c1: Fever and rash after travel."]
+    assert kept["literature"][0] == literature[0]
+    # the long passage loses its duplicate first sentence and is cut after a whole sentence
+    assert kept["literature"][1].startswith("- d2: Malaria") and kept["literature"][1].endswith(".")
+    assert count_tokens(kept["literature"][1]) < count_tokens(literature[1])
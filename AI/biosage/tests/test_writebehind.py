@@ -0,0 +1,46 @@
+import threading
+from biosage.core.writebehind import WriteBehindQueue
+
+
+def test_batches_and_flushes_all_items():
+    batches = []
+    gate = threading.Event()
+
+    def write(items):
+        gate.wait(5)
+        batches.append(list(items))
+
+    q = WriteBehindQueue(write, max_items=100, batch_max=10, linger=0.01)
+    for i in range(25):
+        q.submit(i)
+    gate.set()
+    assert q.flush(5)
+    assert sorted(x for b in batches for x in b) == list(range(25))
+    assert all(len(b) <= 10 for b in batches)
+    # durable submit returns once its batch is written
+    assert q.submit(99, wait=True, timeout=5)
+    assert batches[-1] == [99]
+    q.close()
+    q.submit(100)  # after close, writes inline
+    assert batches[-1] == [100]
+
+
+def test_case_embedding_does_not_hold_up_persistence(monkeypatch):
+    from biosage.core import evidence
+
+    gate = threading.Event()
+    indexed = []
+
+    def slow_index(items):
+        gate.wait(5)  # an embedding call stuck on the provider
+        indexed.extend(case_id for case_id, _ in items)
+
+    monkeypatch.setattr(evidence, "index_cases", slow_index)
+    store = evidence.EvidenceStore(write_behind=True)
+    store.put("wb-case-1", {"intake": {"patient_id": "wb-case-1"}, "normalized": {}, "fused": {"differential": []}})
+    assert store.flush(2)  # committed while the embedding is still pending
+    assert store.get("wb-case-1")["intake"] == {"patient_id": "wb-case-1"}
+    assert indexed == []
+    gate.set()
+    store.close()
+    assert len(indexed) == 1